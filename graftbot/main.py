@@ -39,6 +39,14 @@ def main(world: World) -> int:
             "The password of the user on mastodon.social."
         ),
     )
+    argparser.add_argument(
+        '--workers',
+        type=int,
+        help=(
+            "How many programs to render at the same time.  Defaults to " +
+            "the number of CPUs."
+        ),
+    )
     argparser.add_argument(
         '--toot',
         help=(
@@ -66,4 +74,4 @@ def main(world: World) -> int:
     if args.toot:
         return toot(api_base_url, args.toot)
 
-    return sit_waiting(world, api_base_url)
+    return sit_waiting(world, api_base_url, args.workers)
@@ -0,0 +1,371 @@
+import asyncio
+from datetime import datetime, timezone
+import functools
+import os
+from typing import Dict, List, Optional
+
+import graftbot.dirs
+from graftbot.render_cache import RenderCache
+from graftbot.render_pool import RenderPool
+from graftbot.render_settings import render_key
+from graftbot.strip_html import strip_html
+
+
+# Functions for answering mentions.  mastodon may be a mastodon.Mastodon
+# or anything else with the same methods, e.g. a fake for testing.
+
+
+def _read_last_notif(world):
+    return world.fs.read_file_or_none(graftbot.dirs.last_notif_file())
+
+
+def _update_last_notif(world, id_):
+    world.fs.write_file(graftbot.dirs.last_notif_file(), str(id_))
+
+
+def _follow(world, mastodon, acct_dict):
+    if "#nobot" in acct_dict["note"]:
+        world.stdout.write(
+            "User {acct} has #nobot in bio, so not following.".format(
+                acct=acct_dict["acct"]
+            )
+        )
+        return
+    else:
+        mastodon.account_follow(acct_dict["id"])
+
+
+def _post_gif(mastodon, gif_file, program, acct):
+    media = mastodon.media_post(
+        gif_file,
+        description="Graft program '{program}' by @{acct}".format(
+            program=program,
+            acct=acct,
+        ),
+    )
+    return media["id"]
+
+
+def _post_toot(mastodon, status_id, media_id, program, acct):
+    new_status = mastodon.status_post(
+        status="'{program}' by @{acct}".format(
+            program=program,
+            acct=acct,
+        ),
+        in_reply_to_id=status_id,
+        media_ids=[media_id],
+    )
+    return new_status["id"]
+
+
+def _post_error_toot(mastodon, status_id, error, program, acct):
+    new_status = mastodon.status_post(
+        status="@{acct} Error: '{error}' in program '{program}'".format(
+            acct=acct,
+            error=error,
+            program=program,
+        ),
+        in_reply_to_id=status_id,
+    )
+    return new_status["id"]
+
+
+def _media_rejected(e: Exception) -> bool:
+    """
+    Whether e is the server refusing to attach media to a toot, e.g.
+    because it is already attached to another one.  Mastodon.py gives
+    the HTTP status as the second argument of its errors, and this is
+    422 Unprocessable Entity.
+    """
+    return e.args[1:2] == (422,)
+
+
+def _program(n) -> str:
+    return strip_html(n["status"]["content"]).replace("@graft", "")
+
+
+async def _done(reply: Optional[asyncio.Future]):
+    """Wait until reply is done, if there is one."""
+    if reply is not None:
+        await reply
+
+
+class MentionAnswerer:
+    """
+    Polls for notifications and renders the programs in all the mentions
+    at the same time, replying to each one, oldest first, so that replies
+    appear in the same order as the mentions they answer.
+
+    The Mastodon API is blocking, so each call runs in a thread.  At most
+    max_api_calls calls run at the same time, and calls that fail are
+    retried up to retries times, waiting backoff_seconds, then twice as
+    long, and so on, in between.  Rendering happens in pool, unless the
+    GIF is already in cache, or is being rendered for another mention.
+
+    last_notif is only moved past a notification once it and all the
+    notifications before it have been answered, so if the bot stops, no
+    mention is forgotten.  A mention we could not reply to, even with an
+    error message, is tried again on the next poll, then after 2 more
+    polls, then 4, and so on, and after max_attempts tries we give up on
+    it, so that it doesn't hold back last_notif for ever.
+    """
+
+    def __init__(
+            self,
+            world,
+            mastodon,
+            pool: RenderPool,
+            cache: RenderCache,
+            max_api_calls: int = 4,
+            max_attempts: int = 3,
+            retries: int = 3,
+            backoff_seconds: float = 1.0,
+            sleep=asyncio.sleep,
+    ):
+        self.world = world
+        self.mastodon = mastodon
+        self.pool = pool
+        self.cache = cache
+        self.retries = retries
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+        self._api_calls = asyncio.Semaphore(max_api_calls)
+        self._since_id = _read_last_notif(world)
+        # [notification id, finished?] for every notification we have
+        # started on but not yet recorded in last_notif, oldest first.
+        self._unrecorded: List = []
+        # How many times we have polled
+        self._polls = 0
+        # [poll to try again on, attempts so far, notification, entry] for
+        # each mention we failed to answer
+        self._failed: List = []
+        # Done once the newest mention started so far has been replied
+        # to, or given up on.  The next mention waits for it.
+        self._previous_reply: Optional[asyncio.Future] = None
+        self._tasks = set()
+        # The renders and uploads in progress, by cache key
+        self._renders: Dict[str, asyncio.Future] = {}
+        self._uploads: Dict[str, asyncio.Future] = {}
+
+    async def _call(
+            self, fn, *args, retries=None, give_up=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) in a thread, retrying if it fails, at most
+        retries times if supplied, or self.retries if not.  Errors for
+        which give_up(error) is true are raised without retrying.
+        """
+        loop = asyncio.get_running_loop()
+        retries = self.retries if retries is None else retries
+        delay = self.backoff_seconds
+        for attempt in range(retries + 1):
+            try:
+                async with self._api_calls:
+                    return await loop.run_in_executor(
+                        None, functools.partial(fn, *args, **kwargs))
+            except Exception as e:
+                if attempt == retries or (
+                        give_up is not None and give_up(e)):
+                    raise
+                self.world.stderr.write(
+                    "{fn} failed: {error}.  Retrying in {delay}s.\n".format(
+                        fn=fn.__name__, error=str(e), delay=delay))
+                await self.sleep(delay)
+                delay *= 2
+
+    async def poll(self) -> List[asyncio.Task]:
+        """
+        Fetch new notifications and start answering the mentions among
+        them.  Return the tasks answering them.
+        """
+        self._polls += 1
+        notifs = await self._call(
+            self.mastodon.notifications, since_id=self._since_id)
+        notifs = sorted(notifs, key=lambda n: int(n["id"]))
+        started = []
+        failed, self._failed = self._failed, []
+        for retry in failed:
+            poll, attempts, n, entry = retry
+            if poll <= self._polls:
+                started.append(self._start(n, entry, attempts))
+            else:
+                self._failed.append(retry)
+        for n in notifs:
+            self._since_id = n["id"]
+            entry = [n["id"], n["type"] != "mention"]
+            self._unrecorded.append(entry)
+            if n["type"] == "mention":
+                started.append(self._start(n, entry, 0))
+        self._record_finished()
+        return started
+
+    def _start(self, n, entry, attempts: int) -> asyncio.Task:
+        previous = self._previous_reply
+        replied = asyncio.get_running_loop().create_future()
+        self._previous_reply = replied
+        task = asyncio.ensure_future(
+            self._answer(n, entry, attempts, previous, replied))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run_forever(self, poll_seconds: float):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                self.world.stderr.write(
+                    "{datetime} {error}\n\n".format(
+                        datetime=datetime.now(tz=timezone.utc).isoformat(),
+                        error=str(e),
+                    )
+                )
+            await self.sleep(poll_seconds)
+
+    def _record_finished(self):
+        last = None
+        while self._unrecorded and self._unrecorded[0][1]:
+            last = self._unrecorded.pop(0)[0]
+        if last is not None:
+            _update_last_notif(self.world, last)
+
+    async def _answer(self, n, entry, attempts, previous, replied):
+        """
+        Answer n, replying only once previous is done, and marking
+        replied done once we have.  If we can't reply, leave entry
+        unfinished and try again later, unless this was our last try.
+        """
+        # Keep the GIF in the cache until we have finished with it
+        key = render_key(_program(n))
+        self.cache.pin(key)
+        try:
+            await self._render_and_toot(n, key, previous)
+        except Exception as e:
+            attempts += 1
+            if attempts < self.max_attempts:
+                self.world.stderr.write(
+                    "Failed to answer notification {}: {}.  Will try "
+                    "again.\n".format(n["id"], str(e)))
+                self._failed.append(
+                    [self._polls + 2 ** (attempts - 1), attempts, n, entry])
+            else:
+                self.world.stderr.write(
+                    "Failed to answer notification {}: {}.  Giving up "
+                    "after {} tries.\n".format(n["id"], str(e), attempts))
+                entry[1] = True
+                self._record_finished()
+        else:
+            entry[1] = True
+            self._record_finished()
+        finally:
+            self.cache.unpin(key)
+            await _done(previous)
+            replied.set_result(None)
+
+    async def _render_and_toot(self, n, key, previous):
+        acct_dict = n["account"]
+        acct = acct_dict["acct"]
+        status_id = n["status"]["id"]
+        program = _program(n)
+
+        self.world.stdout.write(
+            "Processing notification {notif_id} from @{acct}: "
+            "'{toot}'\n".format(
+                notif_id=n["id"],
+                acct=acct,
+                toot=strip_html(n["status"]["content"]),
+            )
+        )
+
+        render = asyncio.ensure_future(self._gif(key, program))
+
+        await self._call(_follow, self.world, self.mastodon, acct_dict)
+
+        try:
+            gif_file = await render
+        except Exception as e:
+            self.world.stdout.write(
+                "Error running program: {}\n".format(str(e)))
+            self.world.stdout.write("Tooting error back.\n")
+            await _done(previous)
+            new_status_id = await self._call(
+                _post_error_toot,
+                self.mastodon, status_id, str(e), program, acct)
+            self.world.stdout.write("Toot {} posted.\n\n".format(
+                new_status_id))
+            return
+
+        media_id = self.cache.media_id(key)
+        if media_id is None:
+            media_id = await self._upload(key, gif_file, program, acct)
+        else:
+            self.world.stdout.write("Reusing media id {}\n".format(media_id))
+
+        await _done(previous)
+        self.world.stdout.write("Tooting media id {}\n".format(media_id))
+        try:
+            new_status_id = await self._call(
+                _post_toot,
+                self.mastodon, status_id, media_id, program, acct,
+                give_up=_media_rejected,
+            )
+        except Exception as e:
+            if not _media_rejected(e):
+                raise
+            # The server doesn't allow media to be in two toots.  Upload
+            # it again just for this toot.
+            media_id = await self._upload_now(key, gif_file, program, acct)
+            self.world.stdout.write(
+                "Tooting media id {}\n".format(media_id))
+            new_status_id = await self._call(
+                _post_toot,
+                self.mastodon, status_id, media_id, program, acct,
+            )
+
+        self.world.stdout.write("Toot {} posted.\n\n".format(new_status_id))
+
+    async def _upload(self, key, gif_file, program, acct) -> str:
+        """
+        Upload gif_file and return its media id, unless it is already
+        being uploaded for another mention, in which case wait for that.
+        """
+        if key not in self._uploads:
+            self._uploads[key] = asyncio.ensure_future(
+                self._upload_now(key, gif_file, program, acct))
+        try:
+            return await self._uploads[key]
+        finally:
+            self._uploads.pop(key, None)
+
+    async def _upload_now(self, key, gif_file, program, acct) -> str:
+        self.world.stdout.write("Uploading {}\n".format(gif_file))
+        media_id = await self._call(
+            _post_gif, self.mastodon, gif_file, program, acct)
+        self.cache.set_media_id(key, media_id)
+        return media_id
+
+    async def _gif(self, key: str, program: str) -> str:
+        """Return the path of the GIF of program, rendering it if needed."""
+        gif_file = self.cache.get(key)
+        if gif_file is not None:
+            self.world.stdout.write("Using cached {}\n".format(gif_file))
+            return gif_file
+        if key not in self._renders:
+            self._renders[key] = asyncio.ensure_future(
+                self._render(key, program))
+        return await self._renders[key]
+
+    async def _render(self, key: str, program: str) -> str:
+        tmp_file = self.cache.tmp_path(key)
+        try:
+            await asyncio.wrap_future(self.pool.submit(program, tmp_file))
+            return self.cache.add(key, tmp_file)
+        finally:
+            del self._renders[key]
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    async def finish(self):
+        """Wait until every mention we have started on is answered."""
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
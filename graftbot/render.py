@@ -0,0 +1,52 @@
+import random
+import sys
+
+from graftbot.render_settings import frames, height, seed, syntax, width
+import graftlib.main
+from graftlib.realfs import RealFs
+from graftlib.world import World
+
+
+# Limits on how much work a tooted program may do, so that one program
+# can't stop the bot from answering anyone else.
+max_steps = 10000000
+max_seconds = 120
+max_memory_mb = 200
+
+
+def render_argv(program: str, gif_file: str):
+    return [
+        "./graft",
+        "--gif", gif_file,
+        "--frames", str(frames),
+        "--width", str(width),
+        "--height", str(height),
+        "--syntax", syntax,
+        "--seed", str(seed),
+        "--max-steps", str(max_steps),
+        "--max-seconds", str(max_seconds),
+        "--max-memory", str(max_memory_mb),
+        program
+    ]
+
+
+def render_gif(program: str, gif_file: str) -> str:
+    """
+    Render program into gif_file and return gif_file.  Raise an
+    Exception if the program fails.  This runs in a render worker
+    process, so it makes its own World.
+    """
+    argv = render_argv(program, gif_file)
+    sys.stdout.write(" ".join(argv) + "\n")
+    lib_world = World(
+        argv=argv,
+        stdin=None,
+        stdout=sys.stdout,
+        stderr=sys.stderr,
+        random=random,
+        fs=RealFs(),
+    )
+    ret = graftlib.main.main(lib_world)
+    if ret:
+        raise Exception("Rendering failed with status %d." % ret)
+    return gif_file
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+
+# How much disk space rendered GIFs may take before we delete the ones
+# that were used least recently.
+default_max_bytes = 500 * 1024 * 1024
+
+
+def cache_key(
+        program: str,
+        syntax: str,
+        frames: int,
+        width: int,
+        height: int,
+        seed: int,
+) -> str:
+    """
+    Return a name for the GIF made by rendering program with these
+    settings.  Rendering is deterministic given the seed, so the same
+    key always means the same GIF.
+    """
+    settings = json.dumps(
+        [program, syntax, frames, width, height, seed]).encode("utf-8")
+    return hashlib.sha256(settings).hexdigest()
+
+
+class RenderCache:
+    """
+    A directory of rendered GIFs named by cache_key.  When the GIFs take
+    more than max_bytes, the least recently used are deleted.
+
+    GIFs that are pinned with pin() are never deleted, nor is the one
+    that was just added, so GIFs we are about to upload stay around.
+
+    We also remember the id Mastodon gave each GIF when we uploaded it,
+    so that it can be attached to another toot without uploading it again.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = default_max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._media_ids_file = os.path.join(cache_dir, "media_ids.json")
+        self._media_ids: Dict[str, str] = {}
+        if os.path.exists(self._media_ids_file):
+            with open(self._media_ids_file) as f:
+                self._media_ids = json.load(f)
+        # How many times each pinned key has been pinned
+        self._pinned: Dict[str, int] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".gif")
+
+    def tmp_path(self, key: str) -> str:
+        """Where to render a GIF before it is added with add()."""
+        return self.path(key) + ".tmp"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of the GIF for key, or None if we don't have it."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def add(self, key: str, rendered_file: str) -> str:
+        """
+        Move rendered_file into the cache as the GIF for key, delete old
+        GIFs if we are now too big, and return the new path.
+        """
+        path = self.path(key)
+        os.replace(rendered_file, path)
+        self._evict(key)
+        return path
+
+    def pin(self, key: str):
+        """
+        Don't delete the GIF for key (if there is one, or when it is
+        added) until unpin(key) has been called as many times as this.
+        """
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, key: str):
+        self._pinned[key] -= 1
+        if self._pinned[key] == 0:
+            del self._pinned[key]
+
+    def media_id(self, key: str) -> Optional[str]:
+        return self._media_ids.get(key)
+
+    def set_media_id(self, key: str, media_id: Optional[str]):
+        if media_id is None:
+            self._media_ids.pop(key, None)
+        else:
+            self._media_ids[key] = media_id
+        self._save_media_ids()
+
+    def _save_media_ids(self):
+        with open(self._media_ids_file, "w") as f:
+            json.dump(self._media_ids, f)
+
+    def _evict(self, added_key: str):
+        gifs = []
+        total = 0
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".gif"):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                total += stat.st_size
+                key = file_name[:-len(".gif")]
+                if key != added_key and key not in self._pinned:
+                    gifs.append((stat.st_mtime, stat.st_size, key))
+        gifs.sort()
+        evicted = False
+        for _, size, key in gifs:
+            if total <= self.max_bytes:
+                break
+            os.remove(self.path(key))
+            self._media_ids.pop(key, None)
+            total -= size
+            evicted = True
+        if evicted:
+            self._save_media_ids()
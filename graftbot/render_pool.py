@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from graftlib.warm_pool import warm_pool
+
+
+class RenderPool:
+    """
+    A pool of worker processes that render programs into GIFs, so that
+    several programs can be rendered at the same time.
+
+    render_fn(program, gif_file) does the rendering in a worker.  It must
+    be a top-level function so it can be sent to another process.  By
+    default it is graftbot.render.render_gif, which is imported only when
+    needed, since it needs GTK.
+    """
+
+    def __init__(
+            self,
+            num_workers: Optional[int] = None,
+            render_fn: Optional[Callable[[str, str], str]] = None,
+    ):
+        if render_fn is None:
+            from graftbot.render import render_gif
+            render_fn = render_gif
+        self.render_fn = render_fn
+        self.executor = warm_pool(num_workers, render_fn)
+
+    def submit(self, program: str, gif_file: str) -> Future:
+        """
+        Start rendering program into gif_file.  The returned Future's
+        result is gif_file, or it raises the error the program caused.
+        """
+        return self.executor.submit(self.render_fn, program, gif_file)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.shutdown()
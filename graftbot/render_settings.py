@@ -0,0 +1,14 @@
+from graftbot.render_cache import cache_key
+
+
+# How we render tooted programs.  We always use the same seed, so the
+# same program always makes the same GIF, and we can use a cached one.
+frames = 100
+width = 227
+height = 127
+syntax = "cell"
+seed = 0
+
+
+def render_key(program: str) -> str:
+    return cache_key(program, syntax, frames, width, height, seed)
@@ -1,166 +1,38 @@
-from datetime import datetime, timezone
-import os
-import time
+import asyncio
+from typing import Optional
 
 from mastodon import Mastodon
 
 import graftbot.dirs
-from graftbot.strip_html import strip_html
-import graftlib
+from graftbot.mentions import MentionAnswerer
+from graftbot.render_cache import RenderCache
+from graftbot.render_pool import RenderPool
 from graftlib.world import World
 
 
-def _check_for_unseen_notifications(world, mastodon):
-    last_notif = world.fs.read_file_or_none(graftbot.dirs.last_notif_file())
-    return mastodon.notifications(since_id=last_notif)
+# How often we look for new mentions.  Well within mastodon.social's
+# limit of 300 API calls every 5 minutes.
+poll_seconds = 5
 
 
-def _update_last_notif(world, id_):
-    world.fs.write_file(graftbot.dirs.last_notif_file(), str(id_))
-
-
-def _make_gif(world, program):
-    world.fs.makedirs("bot-gifs")
-
-    gif_file = os.path.join("bot-gifs", "gif-{}.gif".format(
-        datetime.now(tz=timezone.utc).isoformat()))
-
-    argv = [
-        "./graft",
-        "--gif", gif_file,
-        "--frames", "100",
-        "--width", "227",
-        "--height", "127",
-        program
-    ]
-    world.stdout.write(" ".join(argv) + "\n")
-
-    lib_world = World(
-        argv=argv,
-        stdin=None,
-        stdout=world.stdout,
-        stderr=world.stderr,
-        random=world.random,
-        fs=world.fs
-    )
-    graftlib.main.main(lib_world)
-    return gif_file
-
-
-def _follow(world, mastodon, acct_dict):
-    if "#nobot" in acct_dict["note"]:
-        world.stdout.write(
-            "User {acct} has #nobot in bio, so not following.".format(
-                acct=acct_dict["acct"]
-            )
-        )
-        return
-    else:
-        mastodon.account_follow(acct_dict["id"])
-
-
-def _post_gif(mastodon, gif_file, program, acct):
-    media = mastodon.media_post(
-        gif_file,
-        description="Graft program '{program}' by @{acct}".format(
-            program=program,
-            acct=acct,
-        ),
-    )
-    return media["id"]
-
-
-def _post_toot(mastodon, status_id, media_id, program, acct):
-    new_status = mastodon.status_post(
-        status="'{program}' by @{acct}".format(
-            program=program,
-            acct=acct,
-        ),
-        in_reply_to_id=status_id,
-        media_ids=[media_id],
-    )
-    return new_status["id"]
-
-
-def _post_error_toot(mastodon, status_id, error, program, acct):
-    new_status = mastodon.status_post(
-        status="@{acct} Error: '{error}' in program '{program}'".format(
-            acct=acct,
-            error=error,
-            program=program,
-        ),
-        in_reply_to_id=status_id,
-    )
-    return new_status["id"]
-
-
-def _run_and_toot(world, mastodon, n):
-    acct_dict = n["account"]
-    acct = acct_dict["acct"]
-    toot = strip_html(n["status"]["content"])
-    status_id = n["status"]["id"]
-    program = toot.replace("@graft", "")
-
-    _follow(world, mastodon, acct_dict)
-
-    world.stdout.write(
-        "Processing notification {notif_id} from @{acct}: '{toot}'\n".format(
-            notif_id=n["id"],
-            acct=acct,
-            toot=toot,
-        )
-    )
-
-    try:
-        gif_file = _make_gif(world, program)
-    except Exception as e:
-        world.stdout.write("Error running program: {}\n".format(str(e)))
-        world.stdout.write("Tooting error back.\n")
-        new_status_id = _post_error_toot(
-            mastodon, status_id, str(e), program, acct)
-        world.stdout.write("Toot {} posted.\n\n".format(new_status_id))
-        return
-
-    world.stdout.write("Uploading {}\n".format(gif_file))
-
-    media_id = _post_gif(mastodon, gif_file, program, acct)
-
-    world.stdout.write("Tooting media id {}\n".format(media_id))
-
-    new_status_id = _post_toot(mastodon, status_id, media_id, program, acct)
-
-    world.stdout.write("Toot {} posted.\n\n".format(new_status_id))
-
-
-def _run_and_toot_first(world, mastodon, notifs):
-    for n in notifs:
-        if n["type"] != "mention":
-            _update_last_notif(world, n["id"])
-        else:
-            _run_and_toot(world, mastodon, n)
-            _update_last_notif(world, n["id"])
-            break  # Only do one at a time
-
-
-def sit_waiting(world: World, api_base_url: str) -> int:
+def sit_waiting(
+        world: World,
+        api_base_url: str,
+        num_workers: Optional[int] = None,
+) -> int:
     mastodon = Mastodon(
         client_id=graftbot.dirs.client_file(),
         access_token=graftbot.dirs.user_file(),
         api_base_url=api_base_url,
     )
 
-    while True:
-        try:
-            notifs = _check_for_unseen_notifications(world, mastodon)
-            if notifs:
-                _run_and_toot_first(world, mastodon, notifs)
-        except Exception as e:
-            world.stderr.write(
-                "{datetime} {error}\n\n".format(
-                    datetime=datetime.now(tz=timezone.utc).isoformat(),
-                    error=str(e),
-                )
-            )
-        time.sleep(60)
+    cache = RenderCache("bot-gifs")
+
+    async def run(pool):
+        answerer = MentionAnswerer(world, mastodon, pool, cache)
+        await answerer.run_forever(poll_seconds)
+
+    with RenderPool(num_workers) as pool:
+        asyncio.run(run(pool))
 
     return 0
@@ -0,0 +1,53 @@
+import operator
+from typing import List
+
+import attr
+
+from graftlib.numberarray import apply, numbers
+
+
+def _operand(value):
+    """
+    value as something graftlib.numberarray.apply() understands, or None
+    if it can't do arithmetic with an array.
+    """
+    typ = type(value)
+    if typ == ArrayValue:
+        return numbers(value.value)
+    elif typ in (float, int):
+        return value
+    else:
+        return None
+
+
+def _elementwise(op):
+    """
+    Arithmetic between an array and a number or another array of the
+    same length, done on each number in turn, making a new array.
+    """
+    def forward(self, other):
+        other = _operand(other)
+        if other is None:
+            return NotImplemented
+        return ArrayValue(apply(op, numbers(self.value), other))
+
+    def reflected(self, other):
+        other = _operand(other)
+        if other is None:
+            return NotImplemented
+        return ArrayValue(apply(op, other, numbers(self.value)))
+
+    return forward, reflected
+
+
+@attr.s
+class ArrayValue:
+    value: List = attr.ib()
+
+    __add__, __radd__ = _elementwise(operator.add)
+    __sub__, __rsub__ = _elementwise(operator.sub)
+    __mul__, __rmul__ = _elementwise(operator.mul)
+    __truediv__, __rtruediv__ = _elementwise(operator.truediv)
+
+    def __neg__(self):
+        return ArrayValue(apply(operator.neg, numbers(self.value)))
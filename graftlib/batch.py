@@ -0,0 +1,158 @@
+from argparse import ArgumentParser
+import json
+import time
+from typing import Callable, List, Optional
+
+import attr
+
+from graftlib.defaults import (
+    default_height,
+    default_max_forks,
+    default_width,
+)
+from graftlib.warm_pool import warm_pool
+from graftlib.world import World
+
+
+@attr.s
+class BatchJob:
+    """A program to render into a GIF, and how to render it."""
+    program: str = attr.ib()
+    gif: str = attr.ib()
+    frames: int = attr.ib(default=100)
+    width: int = attr.ib(default=default_width)
+    height: int = attr.ib(default=default_height)
+    syntax: str = attr.ib(default="cell")
+    seed: Optional[int] = attr.ib(default=None)
+    max_forks: int = attr.ib(default=default_max_forks)
+
+
+@attr.s
+class JobResult:
+    """
+    What happened when we rendered a job: how long it took, the status
+    ./graft would have exited with, and what it said if that wasn't 0.
+    """
+    gif: str = attr.ib()
+    seconds: float = attr.ib()
+    status: int = attr.ib()
+    error: Optional[str] = attr.ib(default=None)
+
+
+def load_manifest(text: str) -> List[BatchJob]:
+    """
+    Read a manifest: a JSON list of objects, each with a "program" and
+    a "gif" file name, and optionally any of the other BatchJob fields.
+    """
+    ret = []
+    for i, item in enumerate(json.loads(text)):
+        try:
+            ret.append(BatchJob(**item))
+        except TypeError as e:
+            raise ValueError("Job %d in the manifest: %s" % (i, e))
+    return ret
+
+
+def job_argv(job: BatchJob) -> List[str]:
+    argv = [
+        "./graft",
+        "--gif", job.gif,
+        "--frames", str(job.frames),
+        "--width", str(job.width),
+        "--height", str(job.height),
+        "--syntax", job.syntax,
+        "--max-forks", str(job.max_forks),
+    ]
+    if job.seed is not None:
+        argv += ["--seed", str(job.seed)]
+    return argv + ["--", job.program]
+
+
+def run_batch(
+        jobs: List[BatchJob],
+        num_workers: Optional[int] = None,
+        render_fn: Optional[Callable[[BatchJob], JobResult]] = None,
+) -> List[JobResult]:
+    """
+    Render all the jobs using a pool of num_workers processes (default:
+    one per CPU) and return their results in the same order.  render_fn
+    must be a top-level function so it can be sent to the workers.  By
+    default it is graftlib.batchrender.render_job, which is imported only
+    when needed, since it needs GTK.
+    """
+    if render_fn is None:
+        from graftlib.batchrender import render_job
+        render_fn = render_job
+
+    with warm_pool(num_workers, render_fn) as executor:
+        return list(executor.map(render_fn, jobs))
+
+
+def format_report(results: List[JobResult], seconds: float) -> str:
+    ret = "%10s %6s  %s\n" % ("ms", "status", "gif")
+    for result in results:
+        ret += "%10.2f %6d  %s\n" % (
+            result.seconds * 1000, result.status, result.gif)
+    failed = sum(1 for result in results if result.status)
+    ret += "%d jobs, %d failed, in %.2fs.\n" % (len(results), failed, seconds)
+    return ret
+
+
+def main(world: World, render_fn=None) -> int:
+    """
+    Run the batch renderer and return the status code to emit.  render_fn
+    is passed to run_batch.
+    """
+
+    argparser = ArgumentParser(prog='graft-batch')
+    argparser.add_argument(
+        '--workers',
+        type=int,
+        help=(
+            "How many programs to render at the same time.  Defaults to " +
+            "the number of CPUs."
+        ),
+    )
+    argparser.add_argument(
+        '--report',
+        metavar="JSON_FILENAME",
+        help="Write how long each job took, and any errors, to this file.",
+    )
+    argparser.add_argument(
+        'manifest',
+        help=(
+            "A JSON file containing a list of jobs like " +
+            '{"program": "S() d+=10", "gif": "circle.gif", ' +
+            '"frames": 100, "width": 200, "height": 200, ' +
+            '"syntax": "cell", "seed": 1, "max_forks": 20}, ' +
+            "where only program and gif are required."
+        ),
+    )
+
+    args = argparser.parse_args(world.argv[1:])
+
+    manifest = world.fs.read_file_or_none(args.manifest)
+    if manifest is None:
+        world.stderr.write("Manifest %s not found.\n" % args.manifest)
+        return 2
+    try:
+        jobs = load_manifest(manifest)
+    except ValueError as e:
+        world.stderr.write("%s\n" % e)
+        return 2
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.workers, render_fn)
+    world.stdout.write(format_report(results, time.perf_counter() - start))
+
+    for result in results:
+        if result.error:
+            world.stderr.write("%s:\n%s\n" % (result.gif, result.error))
+
+    if args.report:
+        world.fs.write_file(
+            args.report,
+            json.dumps([attr.asdict(result) for result in results], indent=4),
+        )
+
+    return 1 if any(result.status for result in results) else 0
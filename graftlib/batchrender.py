@@ -0,0 +1,25 @@
+from io import StringIO
+import random
+import time
+
+import graftlib.main
+from graftlib.batch import BatchJob, JobResult, job_argv
+from graftlib.realfs import RealFs
+from graftlib.world import World
+
+
+def render_job(job: BatchJob) -> JobResult:
+    """
+    Render job into its GIF, in a batch worker process.  Anything the
+    program writes is captured, and returned as the error if it fails.
+    """
+    out = StringIO()
+    start = time.perf_counter()
+    try:
+        status = graftlib.main.main(
+            World(job_argv(job), None, out, out, random, RealFs()))
+        error = out.getvalue() if status else None
+    except Exception as e:
+        status = 1
+        error = out.getvalue() + str(e)
+    return JobResult(job.gif, time.perf_counter() - start, status, error)
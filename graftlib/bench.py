@@ -0,0 +1,444 @@
+import functools
+import gc
+import json
+import os
+import shlex
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Callable, Dict, List, Optional
+
+import attr
+
+from graftlib.animation import Animation
+from graftlib.compile_cell import compile_cell
+from graftlib.compile_v1 import compile_v1
+from graftlib.defaults import (
+    default_height,
+    default_lookahead_steps,
+    default_max_forks,
+    default_max_strokes,
+    default_width,
+    dot_size,
+)
+from graftlib.eval_cell import eval_cell
+from graftlib.graftrun import graftrun
+from graftlib.lex_cell import lex_cell
+from graftlib.lex_v1 import lex_v1
+from graftlib.memo import Memo, default_max_entries
+from graftlib.parse_cell import parse_cell
+from graftlib.parse_v1 import parse_v1
+from graftlib.randomstream import RandomStream
+from graftlib.strokeoptimiser import StrokeOptimiser
+from graftlib.world import World
+
+try:
+    import cairo
+    from graftlib.ui.cairo_draw import cairo_draw
+except ImportError:
+    cairo = None
+
+
+# How many frames to run a program for if the corpus doesn't say.
+_default_frames = 100
+_image_size = (default_width, default_height)
+
+
+# How much slower than the baseline a stage must be before we call it a
+# regression.
+default_tolerance = 0.1
+
+
+@attr.s
+class BenchProgram:
+    name: str = attr.ib()
+    program: str = attr.ib()
+    frames: int = attr.ib(default=_default_frames)
+    max_forks: int = attr.ib(default=default_max_forks)
+    syntax: str = attr.ib(default="cell")
+
+
+# Programs that exercise different parts of the language and runtime.
+# The scripts in animations/ are added to these by load_corpus.
+builtin_corpus = [
+    BenchProgram("circle", "S() d+=10"),
+    BenchProgram("rough-circle", "r=100 z=10 d+=R()+10 S()"),
+    BenchProgram(
+        "spinning-box",
+        "s=100 J() d+=90 S() d+=90 S() d+=90 S() d+=90 d+=15",
+    ),
+    BenchProgram("tiddlers", "F() d+=R()+10 S()"),
+    BenchProgram(
+        "functions",
+        "sq={:(n) n*n} sp={:(x) d+=sq(x)/10 S()} ^ T(10,{sp(R())})",
+    ),
+    BenchProgram(
+        "arrays",
+        "arr=For(Range(50),{:(i) i*2}) For(arr,{:(v) d+=v S()})",
+    ),
+    BenchProgram("v1-circle", ":S+d", syntax="v1"),
+    BenchProgram("v1-tiddlers", ":F:R~+d+d:S", syntax="v1"),
+]
+
+
+def parse_animation_script(name: str, script: str) -> BenchProgram:
+    """
+    Read a shell script like the ones in animations/, which run ./graft
+    with a program and some command line options, and return the
+    equivalent BenchProgram.
+    """
+    ret = BenchProgram(name, "")
+    for word in shlex.split(script, comments=True):
+        if word in ("./graft", "$@", "--"):
+            continue
+        elif word.startswith("--"):
+            key, _, value = word[2:].partition("=")
+            if key == "frames":
+                ret.frames = int(value)
+            elif key == "max-forks":
+                ret.max_forks = int(value)
+            elif key == "syntax":
+                ret.syntax = value
+        else:
+            ret.program = word
+    return ret
+
+
+def load_corpus(animations_dir: Optional[str]) -> List[BenchProgram]:
+    ret = list(builtin_corpus)
+    if animations_dir is not None and os.path.isdir(animations_dir):
+        for file_name in sorted(os.listdir(animations_dir)):
+            if file_name.endswith(".sh"):
+                with open(os.path.join(animations_dir, file_name)) as f:
+                    ret.append(
+                        parse_animation_script(file_name[:-3], f.read()))
+    return ret
+
+
+@attr.s
+class StageResult:
+    """
+    How long a stage took (the fastest of several runs), how many items
+    (tokens, trees, frames...) it produced, how many strokes went through
+    it, the peak memory allocated while it ran, and how many blocks of
+    memory it allocated that were still in use when it finished (i.e.
+    the objects making up what it produced, not its temporary ones).
+    """
+    seconds: float = attr.ib()
+    items: int = attr.ib()
+    strokes: int = attr.ib()
+    peak_bytes: int = attr.ib()
+    # Baselines saved before this was measured don't have it
+    allocations: int = attr.ib(default=0)
+
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+    def strokes_per_second(self) -> float:
+        return self.strokes / self.seconds if self.seconds > 0 else 0.0
+
+
+class _NoDeletes:
+    def delete_stroke(self, _stroke):
+        pass
+
+
+def _count_strokes(frames) -> int:
+    return sum(1 for frame in frames for stroke in frame if stroke)
+
+
+def _measure(fn: Callable, repeat: int):
+    """
+    Run fn repeat times and return its last result, the fastest time it
+    took, and the peak memory and number of blocks it allocated
+    (measured on a separate run, since tracing memory slows everything
+    down).
+    """
+    best = None
+    ret = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        ret = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        traced = fn()  # Keep the result alive until after the snapshot
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del traced
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    allocations = sum(
+        stat.count_diff
+        for stat in after.filter_traces(ignore).compare_to(
+            before.filter_traces(ignore), "filename")
+    )
+
+    return ret, best, peak, max(allocations, 0)
+
+
+def _render(frames):
+    animation = Animation(
+        StrokeOptimiser(iter(frames)),
+        _NoDeletes(),
+        min(len(frames), default_lookahead_steps),
+        default_max_strokes,
+        dot_size,
+    )
+    n = 0
+    while animation.step():
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, *_image_size)
+        cairo_draw(animation, cairo.Context(surface), *_image_size)
+        n += 1
+    return n
+
+
+def bench_program(
+        prog: BenchProgram,
+        repeat: int,
+        seed: int,
+        memo_entries: int = default_max_entries,
+) -> Dict[str, StageResult]:
+    """
+    Run each stage of turning prog into pictures, feeding the output of
+    each stage into the next, and return the results keyed by stage name.
+    Like ./graft, the program remembers up to memo_entries results of
+    pure functions (see graftlib.memo) while it runs.
+    """
+    if prog.syntax == "v1":
+        lex, parse, compile_ = lex_v1, parse_v1, compile_v1
+    else:
+        lex, parse, compile_ = lex_cell, parse_cell, compile_cell
+
+    ret = {}
+
+    def stage(name, fn, count=len, strokes=lambda _: 0):
+        out, seconds, peak, allocations = _measure(fn, repeat)
+        ret[name] = StageResult(
+            seconds, count(out), strokes(out), peak, allocations)
+        return out
+
+    tokens = stage("lex", lambda: list(lex(prog.program)))
+    trees = stage("parse", lambda: list(parse(iter(tokens))))
+    code = stage("compile", lambda: list(compile_(trees)))
+
+    def run():
+        memo = Memo(memo_entries) if memo_entries > 0 else None
+        return list(graftrun(
+            code,
+            prog.frames,
+            RandomStream(seed),
+            prog.max_forks,
+            functools.partial(eval_cell, memo=memo),
+        ))
+    frames = stage("run", run, strokes=_count_strokes)
+
+    optimised = stage(
+        "optimise",
+        lambda: list(StrokeOptimiser(iter(frames))),
+        strokes=_count_strokes,
+    )
+
+    def animate():
+        animation = Animation(
+            iter(optimised),
+            _NoDeletes(),
+            min(len(optimised), default_lookahead_steps),
+            default_max_strokes,
+            dot_size,
+        )
+        n = 0
+        while animation.step():
+            n += 1
+        return n
+    stage("animate", animate, count=lambda n: n)
+
+    if cairo is not None:
+        stage("render", lambda: _render(frames), count=lambda n: n)
+
+    return ret
+
+
+def run_benchmarks(
+        corpus: List[BenchProgram],
+        repeat: int,
+        seed: int,
+        memo_entries: int = default_max_entries,
+) -> Dict[str, Dict[str, StageResult]]:
+    return {
+        prog.name: bench_program(prog, repeat, seed, memo_entries)
+        for prog in corpus
+    }
+
+
+def results_to_json(results) -> str:
+    return json.dumps(
+        {
+            name: {
+                stage: attr.asdict(result)
+                for stage, result in stages.items()
+            }
+            for name, stages in results.items()
+        },
+        indent=4,
+        sort_keys=True,
+    )
+
+
+def results_from_json(text: str) -> Dict[str, Dict[str, StageResult]]:
+    return {
+        name: {
+            stage: StageResult(**result)
+            for stage, result in stages.items()
+        }
+        for name, stages in json.loads(text).items()
+    }
+
+
+def format_results(results) -> str:
+    ret = "%-14s %-9s %10s %10s %12s %12s %10s %10s\n" % (
+        "program", "stage", "ms", "items", "items/s", "strokes/s",
+        "peak KiB", "allocs",
+    )
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            ret += "%-14s %-9s %10.2f %10d %12.0f %12.0f %10.1f %10d\n" % (
+                name,
+                stage,
+                result.seconds * 1000,
+                result.items,
+                result.items_per_second(),
+                result.strokes_per_second(),
+                result.peak_bytes / 1024,
+                result.allocations,
+            )
+    return ret
+
+
+def compare_to_baseline(results, baseline, tolerance: float) -> List[str]:
+    """
+    Return a description of each stage that is more than tolerance (e.g.
+    0.1 for 10%) slower, or uses more than tolerance more peak memory or
+    allocations, than the same stage in baseline.  Programs and stages
+    that are not in baseline are ignored.
+    """
+    ret = []
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(name, {}).get(stage)
+            if base is None:
+                continue
+            if result.seconds > base.seconds * (1 + tolerance):
+                ret.append(
+                    "%s %s: %.2fms is slower than baseline %.2fms" % (
+                        name, stage, result.seconds * 1000, base.seconds * 1000
+                    )
+                )
+            if result.peak_bytes > base.peak_bytes * (1 + tolerance):
+                ret.append(
+                    "%s %s: peak %d bytes is more than baseline %d bytes" % (
+                        name, stage, result.peak_bytes, base.peak_bytes
+                    )
+                )
+            if (
+                base.allocations > 0 and
+                result.allocations > base.allocations * (1 + tolerance)
+            ):
+                ret.append(
+                    "%s %s: %d allocations is more than baseline %d" % (
+                        name, stage, result.allocations, base.allocations
+                    )
+                )
+    return ret
+
+
+def main(world: World) -> int:
+    """Run the benchmarks and return the status code to emit"""
+
+    argparser = ArgumentParser(prog='graft-bench')
+    argparser.add_argument(
+        '--animations-dir',
+        default="animations",
+        help="Directory of animation scripts to add to the benchmarks.",
+    )
+    argparser.add_argument(
+        '--program',
+        action="append",
+        help="Only run the benchmark with this name (may be repeated).",
+    )
+    argparser.add_argument(
+        '--repeat',
+        default=3,
+        type=int,
+        help="Run each stage this many times and report the fastest.",
+    )
+    argparser.add_argument(
+        '--seed',
+        default=0,
+        type=int,
+        help="Seed for the random numbers used by the programs.",
+    )
+    argparser.add_argument(
+        '--memo-entries',
+        type=int,
+        default=default_max_entries,
+        help=(
+            "Remember up to this many results of pure functions, as " +
+            "./graft does.  0 means never remember."
+        ),
+    )
+    argparser.add_argument(
+        '--save',
+        metavar="JSON_FILENAME",
+        help="Save the results to this file, to use as a --baseline later.",
+    )
+    argparser.add_argument(
+        '--baseline',
+        metavar="JSON_FILENAME",
+        help=(
+            "Compare the results with ones saved with --save, and fail " +
+            "if any stage got slower or uses more memory."
+        ),
+    )
+    argparser.add_argument(
+        '--tolerance',
+        default=default_tolerance,
+        type=float,
+        help=(
+            "How much worse than the baseline a stage may be before we " +
+            "fail, e.g. 0.1 for 10%%."
+        ),
+    )
+
+    args = argparser.parse_args(world.argv[1:])
+
+    corpus = load_corpus(args.animations_dir)
+    if args.program:
+        corpus = [prog for prog in corpus if prog.name in args.program]
+
+    results = run_benchmarks(
+        corpus, args.repeat, args.seed, args.memo_entries)
+    world.stdout.write(format_results(results))
+
+    if args.save:
+        world.fs.write_file(args.save, results_to_json(results))
+
+    if args.baseline:
+        baseline_json = world.fs.read_file_or_none(args.baseline)
+        if baseline_json is None:
+            world.stderr.write("Baseline %s not found.\n" % args.baseline)
+            return 2
+        regressions = compare_to_baseline(
+            results, results_from_json(baseline_json), args.tolerance)
+        for regression in regressions:
+            world.stderr.write(regression + "\n")
+        if regressions:
+            return 1
+
+    return 0
@@ -0,0 +1,112 @@
+import time
+from typing import Callable, Iterable, List, Optional
+
+from graftlib.memory import approx_bytes
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# How many steps we take between looking at the clock
+check_every = 1000
+
+
+class Budget:
+    """
+    Limits how much work the evaluator may do, so that a program like
+    T(1000000000,{S()}) can't run forever without drawing anything.
+
+    The evaluator counts a step for every function call, every time round
+    a loop, and every array or function it makes.  If more than max_steps
+    steps are taken in total, or we are still running after max_seconds,
+    BudgetExceeded is raised.  Either limit may be None, meaning there is
+    no limit.
+
+    To keep the evaluator fast, it only decrements steps_until_check, and
+    calls check() when that goes below zero.
+
+    If max_bytes is not None, the memory held by the program is limited
+    too.  Things that allocate memory (see allocate()) add roughly how
+    much they allocate to bytes_allocated.  Nothing tells us when memory
+    is freed, so when held_bytes + bytes_allocated goes over max_bytes,
+    we measure what the program is really holding with measure(), and
+    only fail if that is over max_bytes.
+    """
+
+    def __init__(
+            self,
+            max_steps: Optional[int],
+            max_seconds: Optional[float],
+            max_bytes: Optional[int] = None,
+            clock=time.monotonic,
+    ):
+        self.max_steps = max_steps
+        self.clock = clock
+        self.deadline = None if max_seconds is None else clock() + max_seconds
+        self.max_seconds = max_seconds
+        self.steps_taken = 0
+        self._chunk = self._next_check()
+        self.steps_until_check = self._chunk
+
+        self.max_bytes = max_bytes
+        self.held_bytes = 0
+        self.bytes_allocated = 0
+        self._about_to_allocate = 0
+        # Returns the things that hold the program's memory, e.g. the Envs
+        # of all its forks.  Set by whoever is running the program.
+        self.roots: Callable[[], List] = list
+
+    def _next_check(self) -> int:
+        if self.max_steps is None:
+            return check_every
+        else:
+            return min(check_every, self.max_steps - self.steps_taken)
+
+    def check(self):
+        """
+        Called by the evaluator when steps_until_check goes below zero.
+        Raise BudgetExceeded if we have run out of steps or time.
+        """
+        self.steps_taken += self._chunk - self.steps_until_check
+        if self.max_steps is not None and self.steps_taken > self.max_steps:
+            raise BudgetExceeded(
+                "This program took more than %d steps.  " % self.max_steps +
+                "Does it contain a loop that goes on forever?"
+            )
+        if self.deadline is not None and self.clock() > self.deadline:
+            raise BudgetExceeded(
+                "This program ran for more than %g seconds." %
+                self.max_seconds
+            )
+        self._chunk = self._next_check()
+        self.steps_until_check = self._chunk
+
+    def allocate(self, num_bytes: int) -> bool:
+        """
+        Record that num_bytes are about to be allocated.  Return True if
+        the program might then be using more than max_bytes, in which case
+        the caller must call measure() before allocating.
+        """
+        if self.max_bytes is None:
+            return False
+        self.bytes_allocated += num_bytes
+        self._about_to_allocate = num_bytes
+        return self.held_bytes + self.bytes_allocated > self.max_bytes
+
+    def measure(self, extra_roots: Iterable = ()):
+        """
+        Find out how much memory is held by our roots and extra_roots (e.g.
+        the evaluator's stacks), plus what is about to be allocated, and
+        raise BudgetExceeded if it is more than max_bytes.
+        """
+        self.held_bytes = (
+            approx_bytes(list(self.roots()) + list(extra_roots)) +
+            self._about_to_allocate
+        )
+        self.bytes_allocated = 0
+        if self.held_bytes > self.max_bytes:
+            raise BudgetExceeded(
+                "This program used more than %d bytes of memory." %
+                self.max_bytes
+            )
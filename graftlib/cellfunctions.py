@@ -1,13 +1,19 @@
+from graftlib.arrayvalue import ArrayValue
 from graftlib.parse_cell import FunctionCallTree
-from graftlib.eval_cell import ArrayValue
-from graftlib.eval_cell import UserFunctionValue
 from graftlib.nativefunctionvalue import NativeFunctionValue
+from graftlib.numberarray import NumberArray, numbers
+from graftlib.numberrange import NumberRange
 from graftlib.numbervalue import NumberValue
+from graftlib.userfunctionvalue import UserFunctionValue
+
+
+# Note: eval_cell recognises times, for_ and if_ and runs them itself
+# without calling these functions, so that it can loop without
+# building a FunctionCallTree for every iteration.  These remain for
+# anyone calling them directly.
 
 
 def times(env, reps, fn):
-    # TODO: when we have "for" this should be written
-    #       in Cell, not Python.
     ret = None
     for i in range(int(reps.value)):
         ret = env.eval_expr(env, FunctionCallTree(fn, []))
@@ -56,9 +62,38 @@ def get(env, array, index):
 
 
 def add(env, array, item):
+    if type(array.value) == NumberArray and type(item) == NumberValue:
+        array.value.append(item)
+        return array
+    if type(array.value) != list:
+        # E.g. a Range - make a real list so we can add to it
+        array.value = list(array.value)
     array.value.append(item)
     return array
 
 
 def len_(env, array):
     return NumberValue(len(array.value))
+
+
+def range_(env, max_):
+    return ArrayValue(NumberRange(max_.value))
+
+
+def sum_(env, array):
+    return NumberValue(sum(numbers(array.value)))
+
+
+def _nonempty_numbers(fn_name, array):
+    ret = numbers(array.value)
+    if len(ret) == 0:
+        raise Exception("%s of an empty array." % fn_name)
+    return ret
+
+
+def min_(env, array):
+    return NumberValue(min(_nonempty_numbers("Min", array)))
+
+
+def max_(env, array):
+    return NumberValue(max(_nonempty_numbers("Max", array)))
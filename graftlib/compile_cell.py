@@ -0,0 +1,318 @@
+from typing import Iterable, List, Optional, Tuple
+import attr
+
+from graftlib.arrayvalue import ArrayValue
+from graftlib.labeltree import LabelTree
+from graftlib.nativefunctionvalue import NativeFunctionValue
+from graftlib.nonevalue import NoneValue
+from graftlib.numbervalue import NumberValue
+from graftlib.sourcepos import SourcePos
+from graftlib.parse_cell import (
+    ArrayTree,
+    AssignmentTree,
+    FunctionCallTree,
+    FunctionDefTree,
+    ModifyTree,
+    NegativeTree,
+    NumberTree,
+    OperationTree,
+    StringTree,
+    SymbolTree,
+)
+from graftlib.stringvalue import StringValue
+from graftlib.userfunctionvalue import UserFunctionValue
+
+
+# Opcodes.  A Code's ops are a flat tuple of (opcode, argument) pairs, so
+# the instruction at pc is ops[pc] and its argument is ops[pc + 1].  Opcodes
+# that take no argument have None in the argument position.
+
+CONST = 0          # Push arg.  (Numbers are pushed as plain floats.)
+LOAD = 1           # Push the value of the variable named arg
+STORE = 2          # Set the variable named arg to top of stack (not popped)
+MODIFY = 3         # Pop a value, apply arg=(operation, name), push result
+POP = 4            # Discard top of stack
+# arg=CallSite: pop num_args args and fn, and call it.  If result_unused,
+# the next op is POP.
+CALL = 5
+MAKE_CLOSURE = 6   # arg=FunctionCode: push a UserFunctionValue
+MAKE_ARRAY = 7     # Pop arg items, push an ArrayValue containing them
+NEG = 8            # Negate top of stack
+ADD = 9
+SUB = 10
+MUL = 11
+DIV = 12
+GT = 13
+LT = 14
+GE = 15
+LE = 16
+EQ = 17
+LABEL = 18         # A label ("^") - only allowed at the top level
+JUMP = 19          # Continue from pc=arg
+# If top of stack (an int) is 0, pop it and jump to pc=arg, otherwise
+# decrement it
+COUNT_DOWN = 20
+LOAD_SLOT = 21     # Push stack[arg]
+STORE_SLOT = 22    # Pop a value into stack[arg]
+APPEND_SLOT = 23   # Pop a value and append it to the ArrayValue in stack[arg]
+# arg=(slot, target): push next(stack[slot]), or jump to pc=target if the
+# iterator is exhausted
+FOR_ITER = 24
+JUMP_IF_END = 25   # If top of stack is endofloop, pop it and jump to pc=arg
+
+opcode_names = {
+    CONST: "CONST",
+    LOAD: "LOAD",
+    STORE: "STORE",
+    MODIFY: "MODIFY",
+    POP: "POP",
+    CALL: "CALL",
+    MAKE_CLOSURE: "MAKE_CLOSURE",
+    MAKE_ARRAY: "MAKE_ARRAY",
+    NEG: "NEG",
+    ADD: "ADD",
+    SUB: "SUB",
+    MUL: "MUL",
+    DIV: "DIV",
+    GT: "GT",
+    LT: "LT",
+    GE: "GE",
+    LE: "LE",
+    EQ: "EQ",
+    LABEL: "LABEL",
+    JUMP: "JUMP",
+    COUNT_DOWN: "COUNT_DOWN",
+    LOAD_SLOT: "LOAD_SLOT",
+    STORE_SLOT: "STORE_SLOT",
+    APPEND_SLOT: "APPEND_SLOT",
+    FOR_ITER: "FOR_ITER",
+    JUMP_IF_END: "JUMP_IF_END",
+}
+
+_operation_opcodes = {
+    "+": ADD,
+    "-": SUB,
+    "*": MUL,
+    "/": DIV,
+    ">": GT,
+    "<": LT,
+    ">=": GE,
+    "<=": LE,
+    "==": EQ,
+}
+
+_modify_operations = ("+=", "-=", "*=", "/=")
+
+_value_types = (
+    ArrayValue,
+    NativeFunctionValue,
+    NoneValue,
+    StringValue,
+    UserFunctionValue,
+)
+
+
+@attr.s(frozen=True)
+class Code:
+    """
+    A compiled block of bytecode.  Running it leaves the value of the
+    last expression in it on the stack (or nothing, if it was empty).
+    Code is immutable, so it can be shared between forks.
+
+    name and pos say where the code came from (e.g. the name of the
+    variable a function was assigned to, and where it was defined), so
+    that profiles can refer to it.  They do not affect equality.
+    """
+    ops: Tuple = attr.ib()
+    name: Optional[str] = attr.ib(default=None, cmp=False)
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False)
+
+    def description(self) -> str:
+        name = self.name if self.name is not None else "?"
+        if self.pos is None:
+            return name
+        else:
+            return "%s (%s)" % (name, self.pos)
+
+    def disassemble(self) -> List[Tuple[str, object]]:
+        return [
+            (opcode_names[self.ops[i]], self.ops[i + 1])
+            for i in range(0, len(self.ops), 2)
+        ]
+
+
+@attr.s(hash=True)
+class CallSite:
+    """
+    The arg of a CALL op.  callee and kind remember the last function
+    called from here and what sort of function it was (see eval_cell),
+    so that calling the same one again can skip checking what it is and
+    how many arguments it takes.  They do not affect equality.
+
+    For a user function, callee is its Code, not the function, so we
+    don't keep the Env it was defined in (and everything in it) alive.
+    """
+    num_args: int = attr.ib()
+    fn_tree = attr.ib()
+    result_unused: bool = attr.ib()
+    callee = attr.ib(default=None, cmp=False, repr=False)
+    kind = attr.ib(default=None, cmp=False, repr=False)
+
+    def __reduce__(self):
+        # Don't try to serialise the callee we remembered
+        return (CallSite, (self.num_args, self.fn_tree, self.result_unused))
+
+
+@attr.s(frozen=True)
+class FunctionCode:
+    """The compiled form of a function definition ({...})."""
+    params: List = attr.ib()
+    code: Code = attr.ib()
+    param_names: Tuple[str, ...] = attr.ib(
+        default=attr.Factory(
+            lambda self: tuple(p.value for p in self.params),
+            takes_self=True,
+        ),
+        cmp=False,
+    )
+
+
+class _Compiler:
+    def __init__(self):
+        self.ops = []
+
+    def emit(self, opcode, arg=None):
+        self.ops.append(opcode)
+        self.ops.append(arg)
+
+    def expression(self, expr):
+        typ = type(expr)
+        if typ == NumberTree:
+            self.emit(CONST, float(expr.value))
+        elif typ == NegativeTree:
+            if type(expr.value) == NumberTree:
+                self.emit(CONST, -float(expr.value.value))
+            else:
+                self.expression(expr.value)
+                self.emit(NEG)
+        elif typ == StringTree:
+            self.emit(CONST, StringValue(expr.value))
+        elif typ == OperationTree:
+            self.operation(expr)
+        elif typ == LabelTree:
+            self.emit(LABEL)
+        elif typ == SymbolTree:
+            self.emit(LOAD, expr.value)
+        elif typ == AssignmentTree:
+            if type(expr.value) == FunctionDefTree:
+                self.function_def(expr.value, expr.symbol.value)
+            else:
+                self.expression(expr.value)
+            self.emit(STORE, expr.symbol.value)
+        elif typ == ModifyTree:
+            if expr.operation not in _modify_operations:
+                raise Exception(
+                    "Unknown modify operation: " + expr.operation)
+            self.expression(expr.value)
+            self.emit(MODIFY, (expr.operation, expr.symbol.value))
+        elif typ == FunctionCallTree:
+            self.expression(expr.fn)
+            for arg in expr.args:
+                self.expression(arg)
+            self.emit(CALL, CallSite(len(expr.args), expr.fn, False))
+        elif typ == FunctionDefTree:
+            self.function_def(expr, "{...}")
+        elif typ == ArrayTree:
+            for item in expr.value:
+                self.expression(item)
+            self.emit(MAKE_ARRAY, len(expr.value))
+        elif typ == NumberValue:
+            self.emit(CONST, expr.value)
+        elif typ in _value_types:
+            self.emit(CONST, expr)
+        else:
+            raise Exception("Unknown expression type: " + str(expr))
+
+    def function_def(self, expr: FunctionDefTree, name: str):
+        self.emit(
+            MAKE_CLOSURE,
+            FunctionCode(
+                expr.params,
+                compile_body(expr.body, name, expr.pos),
+            )
+        )
+
+    def pop(self):
+        """
+        Discard the value of the expression just emitted.  If it was a
+        function call, mark it as having its result unused, so that e.g.
+        For can avoid building an array nobody will look at.
+        """
+        if self.ops and self.ops[-2] == CALL:
+            self.ops[-1].result_unused = True
+        self.emit(POP)
+
+    def operation(self, expr: OperationTree):
+        opcode = _operation_opcodes.get(expr.operation)
+        if opcode is None:
+            raise Exception("Unknown operation: " + expr.operation)
+        self.expression(expr.left)
+        self.expression(expr.right)
+        self.emit(opcode)
+
+    def code(self, name=None, pos=None) -> Code:
+        return Code(tuple(self.ops), name, pos)
+
+
+def _pos(expr) -> Optional[SourcePos]:
+    return getattr(expr, "pos", None)
+
+
+def compile_expr(expr) -> Code:
+    """Compile a single expression tree into Code."""
+    compiler = _Compiler()
+    compiler.expression(expr)
+    return compiler.code("expression", _pos(expr))
+
+
+def compile_body(
+        exprs: Iterable,
+        name: Optional[str] = None,
+        pos: Optional[SourcePos] = None,
+) -> Code:
+    """
+    Compile a list of expressions (e.g. a function body) into Code that
+    evaluates them in order, leaving only the value of the last one.
+    """
+    compiler = _Compiler()
+    first = True
+    for expr in exprs:
+        if not first:
+            compiler.pop()
+        compiler.expression(expr)
+        first = False
+    return compiler.code(name, pos)
+
+
+def compile_statement(expr) -> Code:
+    """
+    Compile a top-level statement into Code that discards its value,
+    since nothing looks at the values of top-level statements.
+    """
+    compiler = _Compiler()
+    compiler.expression(expr)
+    compiler.pop()
+    return compiler.code("statement", _pos(expr))
+
+
+def compile_cell(trees: Iterable) -> Iterable:
+    """
+    Compile each top-level statement of a parsed program into Code.
+    Labels are left as LabelTrees, since they are handled by the
+    RunningProgram and not the evaluator.
+    """
+    for tree in trees:
+        if type(tree) == LabelTree:
+            yield tree
+        else:
+            yield compile_statement(tree)
@@ -0,0 +1,170 @@
+from typing import Iterable
+
+from graftlib.compile_cell import (
+    CALL,
+    CONST,
+    COUNT_DOWN,
+    JUMP,
+    LABEL,
+    LOAD,
+    MODIFY,
+    POP,
+    STORE,
+    CallSite,
+    Code,
+)
+from graftlib.labeltree import LabelTree
+from graftlib.parse_v1 import (
+    FunctionCall,
+    FunctionDef,
+    Modify,
+    Number,
+    Symbol,
+)
+
+
+# v1 operators, and the cell modify operation each one becomes.  "=" is
+# special: it becomes a plain assignment.
+_modify_operations = {
+    "=": None,
+    "+": "+=",
+    "-": "-=",
+    "": "*=",
+    "/": "/=",
+}
+
+
+class _Compiler:
+    """
+    Translate v1 trees into the same Code that cell programs compile to.
+
+    v1 functions ({...}) do not have their own scope, so their bodies are
+    compiled inline, and repeated calls (e.g. 3:S) become a counted loop
+    instead of calling the function repeatedly from Python.
+    """
+
+    def __init__(self):
+        self.ops = []
+
+    def emit(self, opcode, arg=None):
+        self.ops.append(opcode)
+        self.ops.append(arg)
+
+    def here(self):
+        return len(self.ops)
+
+    def statement(self, statement):
+        """Emit code for statement, leaving nothing on the stack."""
+        stmt_type = type(statement)
+        if stmt_type == FunctionCall:
+            self.function_call(statement)
+        elif stmt_type == Modify:
+            self.modify(statement)
+        elif stmt_type in (Symbol, Number):
+            pass
+        elif stmt_type == LabelTree:
+            self.emit(LABEL)
+        elif stmt_type == FunctionDef:
+            raise Exception(
+                "You defined a function but didn't call it: " + str(statement))
+        else:
+            raise Exception("Unknown statement type: " + str(statement))
+
+    def value(self, value_expr):
+        """Emit code for value_expr, leaving its value on the stack."""
+        type_ = type(value_expr)
+        if type_ == Number:
+            neg = -1.0 if value_expr.negative else 1.0
+            self.emit(CONST, float(value_expr.value) * neg)
+        elif type_ == FunctionCall:
+            self.function_call_value(value_expr)
+        elif type_ == Symbol:
+            self.emit(LOAD, value_expr.value)
+        else:
+            raise Exception(
+                "I don't know how to evaluate a value like %s." %
+                str(value_expr)
+            )
+
+    def modify(self, modify_stmt: Modify):
+        if modify_stmt.op not in _modify_operations:
+            raise Exception("Unknown operator '%s'." % modify_stmt.op)
+        self.value(modify_stmt.value)
+        operation = _modify_operations[modify_stmt.op]
+        if operation is None:
+            self.emit(STORE, modify_stmt.sym)
+        else:
+            self.emit(MODIFY, (operation, modify_stmt.sym))
+        self.emit(POP)
+
+    def function_call(self, function_call_stmt: FunctionCall):
+        if function_call_stmt.repeat == 1:
+            self.function_call_once(function_call_stmt.fn)
+            return
+
+        self.emit(CONST, function_call_stmt.repeat)
+        start = self.here()
+        self.emit(COUNT_DOWN)
+        self.function_call_once(function_call_stmt.fn)
+        self.emit(JUMP, start)
+        self.ops[start + 1] = self.here()
+
+    def function_call_once(self, fn):
+        if type(fn) == Symbol:
+            self.emit(LOAD, fn.value)
+            self.emit(CALL, CallSite(0, fn, True))
+            self.emit(POP)
+        elif type(fn) == FunctionDef:
+            for stmt in fn.body:
+                self.statement(stmt)
+
+    def function_call_value(self, function_call_stmt: FunctionCall):
+        """
+        Emit a function call whose result is used as a value.  These are
+        (almost always) called once, so repeats are simply unrolled.
+        """
+        if function_call_stmt.repeat == 0:
+            self.emit(CONST, None)
+        for i in range(function_call_stmt.repeat):
+            if i > 0:
+                self.emit(POP)
+            self.function_call_once_value(function_call_stmt.fn)
+
+    def function_call_once_value(self, fn):
+        if type(fn) == Symbol:
+            self.emit(LOAD, fn.value)
+            self.emit(CALL, CallSite(0, fn, False))
+        elif type(fn) == FunctionDef and fn.body:
+            for stmt in fn.body[:-1]:
+                self.statement(stmt)
+            last = fn.body[-1]
+            if type(last) == FunctionCall:
+                self.function_call_value(last)
+            else:
+                self.statement(last)
+                self.emit(CONST, None)
+        else:
+            self.emit(CONST, None)
+
+    def code(self) -> Code:
+        return Code(tuple(self.ops))
+
+
+def compile_statement(statement) -> Code:
+    """Compile a single v1 statement into Code that leaves no value."""
+    compiler = _Compiler()
+    compiler.statement(statement)
+    return compiler.code()
+
+
+def compile_v1(trees: Iterable) -> Iterable:
+    """
+    Compile each top-level statement of a parsed v1 program into Code
+    that can be run by eval_cell.  Labels are left as LabelTrees, as in
+    compile_cell.
+    """
+    for tree in trees:
+        if type(tree) == LabelTree:
+            yield tree
+        else:
+            yield compile_statement(tree)
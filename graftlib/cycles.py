@@ -0,0 +1,268 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from graftlib.arrayvalue import ArrayValue
+from graftlib.endofloopvalue import EndOfLoopValue
+from graftlib.compile_cell import (
+    CONST,
+    LOAD,
+    MAKE_CLOSURE,
+    MODIFY,
+    Code,
+)
+from graftlib.labeltree import LabelTree
+from graftlib.nativefunctionvalue import NativeFunctionValue
+from graftlib.nonevalue import NoneValue
+from graftlib.numbervalue import NumberValue
+from graftlib.programenv import ProgramEnv
+from graftlib.stringvalue import StringValue
+from graftlib.userfunctionvalue import UserFunctionValue
+
+
+# How many frames we remember while looking for a cycle.  If a program
+# hasn't repeated itself by then, we stop looking.
+default_max_frames = 2000
+
+# The turtle's position and direction are rounded to this many places
+# when comparing states, if they are only used for drawing, so that e.g.
+# a turtle that goes round a circle counts as back where it started,
+# despite rounding errors.  Everything else must be exactly the same.
+_places = 9
+
+# Functions that tell a fork where the other forks are
+_position_fns = ("Centre", "Nearest", "Within")
+
+# The array length above which we don't bother comparing arrays.
+_max_array_len = 100
+
+
+class _Unhashable(Exception):
+    pass
+
+
+def _all_code(program: Iterable) -> Optional[List[Code]]:
+    """
+    Return every piece of Code in program, including the bodies of
+    functions, or None if program contains anything else (e.g. trees that
+    have not been compiled), which we can't look inside.
+    """
+    ret = []
+    todo = []
+    for statement in program:
+        if type(statement) == Code:
+            todo.append(statement)
+        elif type(statement) != LabelTree:
+            return None
+    while todo:
+        code = todo.pop()
+        ret.append(code)
+        for i in range(0, len(code.ops), 2):
+            op = code.ops[i]
+            arg = code.ops[i + 1]
+            if op == MAKE_CLOSURE:
+                todo.append(arg.code)
+            elif op == CONST and type(arg) == UserFunctionValue:
+                todo.append(arg.code)
+    return ret
+
+
+def _analyse(program: Iterable):
+    """
+    Return None if we can't detect cycles in program, because it uses
+    random numbers or can't be looked inside, or otherwise the names of
+    the turtle's variables that are only used for drawing.  Those are
+    the ones that are only ever assigned to, added to or subtracted
+    from, and never read by the program, so small rounding errors in
+    them can't change what it does, only where it draws.
+    """
+    codes = _all_code(program)
+    if codes is None:
+        return None
+    drawing_only = {"d", "x", "y", "xprev", "yprev"}
+    for code in codes:
+        for i in range(0, len(code.ops), 2):
+            op = code.ops[i]
+            arg = code.ops[i + 1]
+            if op == LOAD and arg == "R":
+                return None
+            elif op == LOAD and arg in _position_fns:
+                drawing_only -= {"x", "y", "xprev", "yprev"}
+            elif op == LOAD:
+                drawing_only.discard(arg)
+            elif op == MODIFY and arg[0] in ("*=", "/="):
+                drawing_only.discard(arg[1])
+    return frozenset(drawing_only)
+
+
+def _inner_env(env):
+    while type(env) == ProgramEnv:
+        env = env.env
+    return env
+
+
+class CycleDetector:
+    """
+    Notices when a program's forks all get back to exactly the same state
+    as they were in at the start of an earlier frame (allowing rounding
+    errors in where the turtles are, if nothing but drawing uses that).
+    From then on, the program will repeat the frames it drew since that
+    earlier frame forever, so they can be replayed instead of running
+    the program again.
+
+    The state of a fork is its variables, where it is in the program, and
+    the frames and stacks of the statement it has paused, if any.  We
+    can't compare states containing e.g. iterators or functions defined
+    in another fork, so we don't look for cycles then.  Programs that use
+    random numbers never repeat, so we don't look at them at all.
+
+    builtins are the names and values of the functions every fork starts
+    with, such as Sin and the ones in the standard library.  They never
+    change, so they are compared by identity, and left out of the state
+    while they still have the same names.
+    """
+
+    def __init__(
+            self,
+            program: Iterable,
+            max_frames=default_max_frames,
+            builtins: Optional[Dict] = None,
+    ):
+        self.max_frames = max_frames
+        analysis = _analyse(program)
+        self.enabled = analysis is not None
+        self._drawing_only = analysis or frozenset()
+        self._builtins = {} if builtins is None else builtins
+        self._builtin_ids = {id(value) for value in self._builtins.values()}
+        # The state at the start of each frame we remembered, and which
+        # frame that was
+        self._seen: Dict = {}
+        # The forks and where they were in the program at the start of
+        # each frame we remembered (see state())
+        self._places_seen: Set = set()
+        # The strokes drawn by each fork in each frame so far
+        self._frames: List[List] = []
+
+    def state(self, programs: List) -> Optional[tuple]:
+        """
+        Return something that is equal for equal states of programs (a
+        list of (RunningProgram, queue)), or None if we can't tell.
+        """
+        if not self.enabled:
+            return None
+        # Working out the whole state is slow, so only do it once we have
+        # seen the same forks at the same places in the program before.
+        # Programs that keep forking never do, since every fork has a new
+        # ID.  This means we notice a cycle one time round later.
+        places = tuple(
+            (prog.fork_id, prog.pc, prog.label) for prog, _ in programs)
+        if places not in self._places_seen:
+            self._places_seen.add(places)
+            return None
+        try:
+            return tuple(
+                self._fork_state(prog, queue) for prog, queue in programs)
+        except _Unhashable:
+            return None
+
+    def _fork_state(self, prog, queue) -> tuple:
+        if queue:
+            raise _Unhashable()
+        top = _inner_env(prog.env)
+        if top.parent() is not None:
+            raise _Unhashable()
+        execution = prog.execution
+        return (
+            prog.pc,
+            prog.label,
+            self._locals_state(top, top),
+            None if execution is None
+            else self._execution_state(execution, top),
+        )
+
+    def _execution_state(self, execution, top) -> tuple:
+        """The state of a statement that is paused part way through."""
+        frames = execution.frames + [(
+            execution.ops, execution.pc, execution.stack, execution.env)]
+        return tuple(
+            (
+                id(ops),
+                pc,
+                tuple(self._value_state(None, item, top) for item in stack),
+                self._env_state(env, top),
+            )
+            for ops, pc, stack, env in frames
+        )
+
+    def _env_state(self, env, top):
+        """
+        The state of env, which must be top (the fork's own Env) or one of
+        its descendants, e.g. the Env of a function call.
+        """
+        env = _inner_env(env)
+        if env is top:
+            return None
+        elif env.parent() is None:
+            raise _Unhashable()
+        return (
+            self._locals_state(env, top),
+            self._env_state(env.parent(), top),
+        )
+
+    def _locals_state(self, env, top) -> tuple:
+        builtins = self._builtins
+        return tuple(
+            (name, self._value_state(name, value, top))
+            for name, value in env.local_items().items()
+            if builtins.get(name) is not value
+        )
+
+    def _value_state(self, name, value, top):
+        typ = type(value)
+        if typ == NumberValue:
+            value = value.value
+            typ = type(value)
+        if typ in (float, int):
+            if name in self._drawing_only:
+                if name == "d":
+                    return round(value % 360, _places) % 360
+                return round(value, _places)
+            return value
+        elif typ == StringValue:
+            return value.value
+        elif typ == NativeFunctionValue or value is EndOfLoopValue:
+            return id(value)
+        elif typ == NoneValue or value is None:
+            return None
+        elif typ == ArrayValue and len(value.value) <= _max_array_len:
+            return tuple(
+                self._value_state(None, item, top) for item in value.value)
+        elif typ == UserFunctionValue and id(value) in self._builtin_ids:
+            return id(value)
+        elif typ == UserFunctionValue:
+            # Calling a function can only depend on its code and the
+            # Envs it can see.
+            return (id(value.code), self._env_state(value.env, top))
+        else:
+            raise _Unhashable()
+
+    def check(self, state: Optional[tuple]) -> Optional[List[List]]:
+        """
+        Given the state at the start of this frame, return the frames that
+        will now repeat forever, or None if we haven't been here before.
+        """
+        if state is None:
+            return None
+        start = self._seen.get(state)
+        if start is None:
+            self._seen[state] = len(self._frames)
+            return None
+        return self._frames[start:]
+
+    def record(self, strokes: List):
+        """Remember the strokes drawn in the frame we just ran."""
+        self._frames.append(strokes)
+        if len(self._frames) >= self.max_frames:
+            # Give up and forget everything
+            self.enabled = False
+            self._seen = {}
+            self._places_seen = set()
+            self._frames = []
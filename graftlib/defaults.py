@@ -0,0 +1,25 @@
+# Settings used by ./graft when they are not given on the command line.
+# They live here rather than in graftlib.main so that code that doesn't
+# need GTK (e.g. graftlib.bench and graftlib.batch) can use them too.
+
+
+# How many strokes we are allowed before we start deleting old ones.
+default_max_strokes = 200
+
+
+# Size of the dot indicating where we are.
+dot_size = 5
+
+
+# Default screen size in pixels if not overridden by --width, --height
+default_width = 200
+default_height = 200
+
+
+# Default number of parallel forks if not overridden by --max-forks
+default_max_forks = 20
+
+
+# How far to run the animation initially to decide what
+# our initial zoom level should be.
+default_lookahead_steps = 80
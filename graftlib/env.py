@@ -40,8 +40,15 @@ class Env:
             ret.set(k, v)
         return ret
 
-    def make_child(self):
-        return Env(parent=self)
+    def make_child(self, items=None):
+        """
+        Make an Env inside this one, e.g. for a function call.  If items
+        is supplied, it is a dict of the new Env's own variables.
+        """
+        ret = Env(parent=self)
+        if items is not None:
+            ret._items = items
+        return ret
 
     def get(self, name):
         if name in self._items:
@@ -83,7 +90,7 @@ class Env:
 
     def __str__(self):
         ret = ""
-        for k, v in self._items.items():
+        for k, v in self.local_items().items():
             ret += "%s=%s\n" % (k, v)
         ret += ".\n" + str(self._parent)
         return ret
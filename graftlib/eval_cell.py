@@ -1,96 +1,103 @@
-import inspect
-from typing import List
-import attr
-
-from graftlib.labeltree import LabelTree
-from graftlib.parse_cell import (
-    ArrayTree,
-    AssignmentTree,
-    FunctionCallTree,
-    FunctionDefTree,
-    ModifyTree,
-    NegativeTree,
-    NumberTree,
-    OperationTree,
-    StringTree,
-    SymbolTree,
+from graftlib import cellfunctions
+from graftlib import memory
+from graftlib.arrayvalue import ArrayValue
+from graftlib.compile_cell import (
+    ADD,
+    APPEND_SLOT,
+    CALL,
+    CONST,
+    COUNT_DOWN,
+    DIV,
+    EQ,
+    FOR_ITER,
+    GE,
+    GT,
+    JUMP,
+    JUMP_IF_END,
+    LABEL,
+    LE,
+    LOAD,
+    LOAD_SLOT,
+    LT,
+    MAKE_ARRAY,
+    MAKE_CLOSURE,
+    MODIFY,
+    MUL,
+    NEG,
+    POP,
+    STORE,
+    STORE_SLOT,
+    SUB,
+    CallSite,
+    Code,
+    compile_expr,
 )
-
-from graftlib.env import Env
+from graftlib.endofloopvalue import EndOfLoopValue
 from graftlib.nativefunctionvalue import NativeFunctionValue
+from graftlib.nonevalue import NoneValue
 from graftlib.numbervalue import NumberValue
+from graftlib.userfunctionvalue import UserFunctionValue
+
+
+# Inside the evaluator, numbers are plain Python floats (or ints) rather
+# than NumberValues, so that arithmetic does not allocate.  They are boxed
+# into NumberValues whenever they leave the evaluator: when stored in an
+# Env or an array, passed to a native function (unless it is marked as
+# unboxed), or returned from eval_cell.
+
+_raw_number_types = (float, int)
+
+
+def _box(val):
+    if type(val) in _raw_number_types:
+        return NumberValue(val)
+    else:
+        return val
 
 
-@attr.s
-class NoneValue:
-    pass
-
-
-@attr.s
-class ArrayValue:
-    value: List = attr.ib()
-
-
-@attr.s
-class StringValue:
-    value: str = attr.ib()
-
-
-@attr.s
-class UserFunctionValue:
-    params: List = attr.ib()
-    body: List = attr.ib()
-    env: Env = attr.ib()
-
-
-def _operation(expr, env):
-    arg1 = _eval(env, expr.left)
-    arg2 = _eval(env, expr.right)
-    if expr.operation == "+":
-        return NumberValue(arg1.value + arg2.value)
-    elif expr.operation == "-":
-        return NumberValue(arg1.value - arg2.value)
-    elif expr.operation == "*":
-        return NumberValue(arg1.value * arg2.value)
-    elif expr.operation == "/":
-        return NumberValue(arg1.value / arg2.value)
-    elif expr.operation == ">":
-        return NumberValue(1.0 if arg1.value > arg2.value else 0.0)
-    elif expr.operation == "<":
-        return NumberValue(1.0 if arg1.value < arg2.value else 0.0)
-    elif expr.operation == ">=":
-        return NumberValue(1.0 if arg1.value >= arg2.value else 0.0)
-    elif expr.operation == "<=":
-        return NumberValue(1.0 if arg1.value <= arg2.value else 0.0)
-    elif expr.operation == "==":
-        return NumberValue(1.0 if arg1.value == arg2.value else 0.0)
+def _unbox(val):
+    if type(val) == NumberValue:
+        return val.value
     else:
-        raise Exception("Unknown operation: " + expr.operation)
+        return val
+
+
+# Roughly how much memory making each of these allocates
+_item_bytes = memory.slot_bytes + memory.number_bytes
+_closure_bytes = memory.closure_bytes
 
 
-def _modify(expr: ModifyTree, env):
-    var_name = expr.symbol.value
-    val = _eval(env, expr.value)
+def _frame_roots(frames, stack, env):
+    """Everything the evaluator is holding that may use memory."""
+    return (
+        [stack, env] +
+        [frame[2] for frame in frames] +
+        [frame[3] for frame in frames]
+    )
+
+
+def _modify(operation, var_name, val, env):
     if type(val) is list:  # TODO strokes as a monad
         assert len(val) == 1
-        val = val[0]
+        val = _unbox(val[0])
 
-    val = val.value
-    prev_val = env.get(var_name).value
+    prev_val = env.get(var_name)
+    if type(prev_val) == NumberValue:
+        prev_val = prev_val.value
 
-    if expr.operation == "+=":
+    if operation == "+=":
         new_val = prev_val + val
-    elif expr.operation == "-=":
+    elif operation == "-=":
         new_val = prev_val - val
-    elif expr.operation == "*=":
+    elif operation == "*=":
         new_val = prev_val * val
-    elif expr.operation == "/=":
+    elif operation == "/=":
         new_val = prev_val / val
     else:
-        raise Exception("Unknown modify operation: " + expr.operation)
+        raise Exception("Unknown modify operation: " + operation)
 
-    env.set(var_name, NumberValue(new_val))
-    return env.get(var_name)
+    env.set(var_name, _box(new_val))
+    return new_val
 
 
 def fail_if_wrong_number_of_args(fn_name, params, args):
@@ -101,93 +108,503 @@ def fail_if_wrong_number_of_args(fn_name, params, args):
         ) % (len(args), fn_name, len(params)))
 
 
-def _function_call(expr, env):
-    fn = _eval(env, expr.fn)
-    args = list((_eval(env, a) for a in expr.args))
-    typ = type(fn)
+# The loops inside T and For are run as bytecode in a frame of their own,
+# so they never call back into the evaluator from Python.  Their state
+# lives in stack slots set up by _loop_frame.
 
+# Slots: 0=result, 1=fn, 2=repetitions remaining
+_times_code = Code((
+    COUNT_DOWN, 10,
+    LOAD_SLOT, 1,
+    CALL, CallSite(0, "given to T", False),
+    STORE_SLOT, 0,
+    JUMP, 0,
+    LOAD_SLOT, 0,
+))
+
+# Slots: 0=result array, 1=fn, 2=iterator over the input
+_for_iter_code = Code((
+    LOAD_SLOT, 1,
+    FOR_ITER, (2, 10),
+    CALL, CallSite(1, "given to For", False),
+    APPEND_SLOT, 0,
+    JUMP, 0,
+    POP, None,
+    LOAD_SLOT, 0,
+))
+
+# Slots: 0=result array, 1=fn, 2=function returning items until endofloop
+_for_call_code = Code((
+    LOAD_SLOT, 1,
+    LOAD_SLOT, 2,
+    CALL, CallSite(0, "given to For", False),
+    JUMP_IF_END, 14,
+    CALL, CallSite(1, "given to For", False),
+    APPEND_SLOT, 0,
+    JUMP, 0,
+    POP, None,
+    LOAD_SLOT, 0,
+))
+
+# Versions of the For loops for when the result is unused: they throw
+# away the body's values instead of collecting them into an array.
+
+# Slots: 0=unused, 1=fn, 2=iterator over the input
+_for_iter_discard_code = Code((
+    LOAD_SLOT, 1,
+    FOR_ITER, (2, 10),
+    CALL, CallSite(1, "given to For", True),
+    POP, None,
+    JUMP, 0,
+    POP, None,
+    CONST, NoneValue(),
+))
+
+# Slots: 0=unused, 1=fn, 2=function returning items until endofloop
+_for_call_discard_code = Code((
+    LOAD_SLOT, 1,
+    LOAD_SLOT, 2,
+    CALL, CallSite(0, "given to For", False),
+    JUMP_IF_END, 14,
+    CALL, CallSite(1, "given to For", True),
+    POP, None,
+    JUMP, 0,
+    POP, None,
+    CONST, NoneValue(),
+))
+
+_intrinsic_params = {
+    cellfunctions.times: ["reps", "fn"],
+    cellfunctions.for_: ["arr", "fn"],
+    cellfunctions.if_: ["condition", "then_fn", "else_fn"],
+}
+
+# The kinds of function CALL knows how to call
+_USER = 0    # A UserFunctionValue
+_NATIVE = 1  # A NativeFunctionValue
+_LOOP = 2    # T or For, which run as a frame of their own
+_IF = 3      # If, which calls one of its arguments instead
+
+
+def _call_kind(fn, fn_tree, args) -> int:
+    """
+    Check that fn is a function that can be called with args, and return
+    what kind of function it is.
+    """
+    typ = type(fn)
     if typ == UserFunctionValue:
-        fail_if_wrong_number_of_args(expr.fn, fn.params, args)
-        new_env = fn.env.make_child()
-        for p, a in zip(fn.params, args):
-            new_env.set_new(p.value, a)
-        return eval_cell_list(fn.body, new_env)
+        fail_if_wrong_number_of_args(fn_tree, fn.params, args)
+        return _USER
     elif typ == NativeFunctionValue:
-        params = inspect.getargspec(fn.py_fn).args
-        fail_if_wrong_number_of_args(expr.fn, params[1:], args)
-        return fn.py_fn(env, *args)
+        intrinsic_params = _intrinsic_params.get(fn.py_fn)
+        if intrinsic_params is not None:
+            fail_if_wrong_number_of_args(fn_tree, intrinsic_params, args)
+            return _IF if fn.py_fn == cellfunctions.if_ else _LOOP
+        fail_if_wrong_number_of_args(fn_tree, fn.params, args)
+        return _NATIVE
     else:
         raise Exception(
             "Attempted to call something that is not a function: " +
             "%s, which is %s" % (
-                str(expr.fn),
+                str(fn_tree),
                 str(fn),
             )
         )
 
 
-def eval_cell(env, expr):
-    return _eval(env, expr)
+_exhausted = object()
 
 
-def _eval(env, expr):
-    typ = type(expr)
-    if typ == NumberTree:
-        return NumberValue(float(expr.value))
-    elif typ == NegativeTree:
-        return NumberValue(-_eval(env, expr.value).value)
-    elif typ == StringTree:
-        return StringValue(expr.value)
-    elif typ in (NoneValue, NativeFunctionValue):
-        return expr
-    elif typ == OperationTree:
-        return _operation(expr, env)
-    elif typ == LabelTree:
-        raise Exception(
-            "You cannot (yet?) define labels inside functions.")
-    elif typ == SymbolTree:
-        ret = env.get(expr.value)
-        if ret is None:
-            raise Exception("Unknown symbol '%s'." % expr.value)
+def _native_until_endofloop(env, py_fn):
+    while True:
+        y = py_fn(env)
+        if y is EndOfLoopValue:
+            break
         else:
-            return ret
-    elif typ == AssignmentTree:
-        var_name = expr.symbol.value
-        val = _eval(env, expr.value)
-        env.set(var_name, val)
-        return val
-    elif typ == ModifyTree:
-        return _modify(expr, env)
-    elif typ == FunctionCallTree:
-        return _function_call(expr, env)
-    elif typ == FunctionDefTree:
-        return UserFunctionValue(
-            expr.params,
-            expr.body,
-            env.make_child()
+            yield y
+
+
+def _loop_frame(py_fn, args, env, result_unused):
+    """
+    Return the ops and initial stack of a frame that runs the loop
+    inside T or For.  If result_unused, For streams through its input
+    without building an array of results.
+    """
+    if py_fn == cellfunctions.times:
+        reps, fn = args
+        return _times_code.ops, [None, fn, int(_unbox(reps))]
+
+    arr, fn = args
+    typ = type(arr)
+    if result_unused:
+        iter_code = _for_iter_discard_code
+        call_code = _for_call_discard_code
+        result = None
+    else:
+        iter_code = _for_iter_code
+        call_code = _for_call_code
+        result = ArrayValue([])
+
+    if typ == ArrayValue:
+        return iter_code.ops, [result, fn, iter(arr.value)]
+    elif typ == NativeFunctionValue:
+        return (
+            iter_code.ops,
+            [result, fn, _native_until_endofloop(env, arr.py_fn)],
         )
-    elif typ == ArrayTree:
-        return ArrayValue([_eval(env, x) for x in expr.value])
-    elif typ in (
-        ArrayValue,
-        NativeFunctionValue,
-        NoneValue,
-        NumberValue,
-        StringValue,
-        UserFunctionValue
-    ):
-        return expr
+    elif typ == UserFunctionValue:
+        return call_code.ops, [result, fn, arr]
     else:
-        raise Exception("Unknown expression type: " + str(expr))
+        raise Exception(
+            "Unexpected first argument to For: expected an array or a " +
+            "function that eventually returns endofloop, but got: " +
+            "%s." % arr
+        )
 
 
-def _eval_iter(exprs, env):
-    for expr in exprs:
-        yield _eval(env, expr)
+_paused = object()
+
+
+class Execution:
+    """
+    Some Code being run by eval_cell.  If it was started with pause=True,
+    it stops after each native function that draws a stroke (see
+    NativeFunctionValue.draws), and carries on when resume() is called
+    again, so a long loop can hand out its strokes one at a time.
+    """
+
+    def __init__(self, code: Code, env, profiler, budget, memo=None):
+        self.frames = []
+        self.ops = code.ops
+        self.pc = 0
+        self.stack = []
+        self.env = env
+        self.profiler = profiler
+        self.budget = budget
+        self.memo = memo
+        # (depth, key) for each call whose result memo should remember
+        # when the frame at that depth returns
+        self.memo_pending = []
+        self.value = None
+        # The profiler's records of our frames, while we are paused
+        self._profiled = None
+        if profiler is not None:
+            self._depth = profiler.depth()
+            profiler.enter(code)
+
+    def resume(self, pause=True) -> bool:
+        """
+        Run until we finish, returning True, or until we draw something
+        and pause is True, returning False.  When we finish, value is the
+        value of the Code.
+        """
+        profiler = self.profiler
+        if profiler is not None and self._profiled is not None:
+            profiler.unsuspend(self._profiled)
+            self._profiled = None
+        try:
+            ret = _run(self, pause)
+        except BaseException:
+            if profiler is not None:
+                profiler.unwind(self._depth)
+            raise
+        if ret is _paused:
+            if profiler is not None:
+                self._profiled = profiler.suspend(self._depth)
+            return False
+        if profiler is not None:
+            profiler.leave()
+        self.value = ret
+        return True
+
+    def roots(self):
+        """Everything we are holding that may use memory."""
+        return _frame_roots(self.frames, self.stack, self.env)
+
+
+def _allocate_arithmetic(budget, frames, stack, env, left, right):
+    """
+    Tell budget about the array that arithmetic on left and right will
+    make, if either of them is an array.
+    """
+    num_bytes = memory.number_array(env, (left, right))
+    if num_bytes and budget.allocate(num_bytes):
+        budget.measure(_frame_roots(frames, stack + [right], env))
+
+
+def _run(ex: Execution, pause: bool):
+    """
+    Run the supplied Execution and return the value it leaves on the
+    stack, or _paused if pause is True and it drew something.
+
+    Calls to user-defined functions push a frame onto our own frame stack
+    rather than recursing in Python, and so do the loops in T and For, so
+    the only Python recursion is when some other native function calls
+    back into the evaluator.  Tail calls replace the calling function's
+    frame instead of pushing a new one.
+
+    If profiler is not None, it is told whenever we enter or leave a frame.
+    If budget is not None, calls, jumps back to the start of loops, and
+    making arrays and functions each use up one step from it, and we tell
+    it about memory we are about to allocate.  If memo is not None, calls
+    to pure functions whose results it remembers are not run again.
+    """
+    frames = ex.frames
+    ops = ex.ops
+    pc = ex.pc
+    stack = ex.stack
+    env = ex.env
+    profiler = ex.profiler
+    budget = ex.budget
+    memo = ex.memo
+    memo_pending = ex.memo_pending
+    while True:
+        if pc >= len(ops):
+            ret = stack[-1] if stack else NoneValue()
+            if not frames:
+                return _box(ret)
+            if memo_pending and memo_pending[-1][0] == len(frames):
+                memo.add(memo_pending.pop()[1], ret)
+            if profiler is not None:
+                profiler.leave()
+            ops, pc, stack, env = frames.pop()
+            stack.append(ret)
+            continue
+
+        op = ops[pc]
+        arg = ops[pc + 1]
+        pc += 2
+
+        if op == LOAD:
+            val = env.get(arg)
+            if type(val) == NumberValue:
+                stack.append(val.value)
+            elif val is None:
+                raise Exception("Unknown symbol '%s'." % arg)
+            else:
+                stack.append(val)
+        elif op == CONST:
+            stack.append(arg)
+        elif op == CALL:
+            if budget is not None:
+                budget.steps_until_check -= 1
+                if budget.steps_until_check < 0:
+                    budget.check()
+            num_args = arg.num_args
+            args = stack[len(stack) - num_args:]
+            del stack[len(stack) - num_args:]
+            fn = stack.pop()
+            # If we are calling the same function as last time (or a user
+            # function with the same code), we already know what it is,
+            # and that it takes this many arguments.
+            callee = fn.code if type(fn) == UserFunctionValue else fn
+            if callee is arg.callee:
+                kind = arg.kind
+            else:
+                kind = _call_kind(fn, arg.fn_tree, args)
+                arg.callee = callee
+                arg.kind = kind
+
+            if kind == _IF:
+                # Call then_fn or else_fn in place of If
+                fn = args[1] if args[0] != 0 else args[2]
+                args = []
+                kind = _call_kind(fn, "given to If", args)
+
+            if kind == _USER:
+                # A call that is the last thing a function does is a tail
+                # call: its result is the function's result, so we can
+                # replace the function's frame instead of pushing a new
+                # one, and tail recursion runs in constant space.
+                tail = pc >= len(ops) and len(frames) > 0
+                if memo is not None:
+                    key = memo.key(fn, args)
+                    if key is not None:
+                        ret = memo.get(key)
+                        if ret is not None:
+                            stack.append(ret)
+                            continue
+                        depth = len(frames) if tail else len(frames) + 1
+                        # If we are already waiting for this frame's result
+                        # (e.g. we are tail recursing), just remember the
+                        # first call, so we don't use up space per call.
+                        if not (
+                            memo_pending and memo_pending[-1][0] == depth
+                        ):
+                            memo_pending.append((depth, key))
+                if profiler is not None:
+                    if tail:
+                        profiler.leave()
+                    profiler.enter(fn.code)
+                if not tail:
+                    frames.append((ops, pc, stack, env))
+                ops = fn.code.ops
+                pc = 0
+                stack = []
+                env = fn.env.make_child(
+                    dict(zip(fn.param_names, map(_box, args))))
+            elif kind == _NATIVE:
+                if (
+                    budget is not None and
+                    fn.allocates is not None and
+                    budget.allocate(fn.allocates(env, args))
+                ):
+                    budget.measure(_frame_roots(frames, stack + args, env))
+                if fn.unboxed:
+                    ret = fn.py_fn(env, *args)
+                else:
+                    ret = fn.py_fn(env, *(_box(a) for a in args))
+                stack.append(_unbox(ret))
+                if pause and fn.draws:
+                    ex.ops = ops
+                    ex.pc = pc
+                    ex.stack = stack
+                    ex.env = env
+                    return _paused
+            else:
+                if profiler is not None:
+                    profiler.enter(None)
+                frames.append((ops, pc, stack, env))
+                ops, stack = _loop_frame(
+                    fn.py_fn, args, env, arg.result_unused)
+                pc = 0
+        elif op == POP:
+            stack.pop()
+        elif op == MODIFY:
+            if budget is not None:
+                _allocate_arithmetic(
+                    budget, frames, stack, env, env.get(arg[1]), stack[-1])
+            stack.append(_modify(arg[0], arg[1], stack.pop(), env))
+        elif op == STORE:
+            env.set(arg, _box(stack[-1]))
+        elif op == ADD:
+            right = stack.pop()
+            if budget is not None:
+                _allocate_arithmetic(
+                    budget, frames, stack, env, stack[-1], right)
+            stack[-1] += right
+        elif op == SUB:
+            right = stack.pop()
+            if budget is not None:
+                _allocate_arithmetic(
+                    budget, frames, stack, env, stack[-1], right)
+            stack[-1] -= right
+        elif op == MUL:
+            right = stack.pop()
+            if budget is not None:
+                _allocate_arithmetic(
+                    budget, frames, stack, env, stack[-1], right)
+            stack[-1] *= right
+        elif op == DIV:
+            right = stack.pop()
+            if budget is not None:
+                _allocate_arithmetic(
+                    budget, frames, stack, env, stack[-1], right)
+            stack[-1] /= right
+        elif op == GT:
+            right = stack.pop()
+            stack[-1] = 1.0 if stack[-1] > right else 0.0
+        elif op == LT:
+            right = stack.pop()
+            stack[-1] = 1.0 if stack[-1] < right else 0.0
+        elif op == GE:
+            right = stack.pop()
+            stack[-1] = 1.0 if stack[-1] >= right else 0.0
+        elif op == LE:
+            right = stack.pop()
+            stack[-1] = 1.0 if stack[-1] <= right else 0.0
+        elif op == EQ:
+            right = stack.pop()
+            stack[-1] = 1.0 if stack[-1] == right else 0.0
+        elif op == NEG:
+            if budget is not None:
+                _allocate_arithmetic(
+                    budget, frames, stack, env, stack[-1], None)
+            stack[-1] = -stack[-1]
+        elif op == MAKE_CLOSURE:
+            if budget is not None:
+                budget.steps_until_check -= 1
+                if budget.steps_until_check < 0:
+                    budget.check()
+                if budget.allocate(_closure_bytes):
+                    budget.measure(_frame_roots(frames, stack, env))
+            # Functions see the Env they were defined in, so they don't
+            # need one of their own until they are called.
+            stack.append(
+                UserFunctionValue(
+                    arg.params, arg.code, env, arg.param_names))
+        elif op == MAKE_ARRAY:
+            if budget is not None:
+                budget.steps_until_check -= 1
+                if budget.steps_until_check < 0:
+                    budget.check()
+                if budget.allocate(memory.array_bytes + arg * _item_bytes):
+                    budget.measure(_frame_roots(frames, stack, env))
+            items = [_box(item) for item in stack[len(stack) - arg:]]
+            del stack[len(stack) - arg:]
+            stack.append(ArrayValue(items))
+        elif op == LOAD_SLOT:
+            stack.append(stack[arg])
+        elif op == STORE_SLOT:
+            stack[arg] = stack.pop()
+        elif op == APPEND_SLOT:
+            if budget is not None and budget.allocate(_item_bytes):
+                budget.measure(_frame_roots(frames, stack, env))
+            stack[arg].value.append(_box(stack.pop()))
+        elif op == FOR_ITER:
+            slot, target = arg
+            item = next(stack[slot], _exhausted)
+            if item is _exhausted:
+                pc = target
+            else:
+                stack.append(_unbox(item))
+        elif op == JUMP_IF_END:
+            if stack[-1] is EndOfLoopValue:
+                stack.pop()
+                pc = arg
+        elif op == COUNT_DOWN:
+            if stack[-1] <= 0:
+                stack.pop()
+                pc = arg
+            else:
+                stack[-1] -= 1
+        elif op == JUMP:
+            if budget is not None:
+                budget.steps_until_check -= 1
+                if budget.steps_until_check < 0:
+                    budget.check()
+            pc = arg
+        elif op == LABEL:
+            raise Exception(
+                "You cannot (yet?) define labels inside functions.")
+        else:
+            raise Exception("Unknown opcode: " + str(op))
+
+
+def eval_cell(
+        env, expr, profiler=None, budget=None, pause=False, memo=None):
+    """
+    Evaluate expr, which may be a parsed tree or Code that was already
+    compiled with graftlib.compile_cell.  If a ProgramProfiler is
+    supplied, record expr and the user functions we call in it.  If a
+    Budget is supplied, raise BudgetExceeded if we use it up.  If a Memo
+    (see graftlib.memo) is supplied, remember the results of calls to
+    pure functions in it.
+
+    If pause is True, return an Execution that has not started yet:
+    call its resume() to run expr a stroke at a time.
+    """
+    if type(expr) != Code:
+        expr = compile_expr(expr)
+    ex = Execution(expr, env, profiler, budget, memo)
+    if pause:
+        return ex
+    ex.resume(pause=False)
+    return ex.value
 
 
 def eval_cell_list(exprs, env):
     ret = NoneValue()
-    for expr in _eval_iter(exprs, env):
-        ret = expr
+    for expr in exprs:
+        ret = eval_cell(env, expr)
     return ret
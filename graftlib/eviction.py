@@ -0,0 +1,187 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Set
+
+from graftlib.defaults import default_max_strokes
+from graftlib.dot import Dot
+from graftlib.extents import Extents
+from graftlib.line import Line
+from graftlib.round_ import round_stroke
+
+
+# Eviction policies decide which forks to stop running when there are
+# more than max_forks of them.  Each frame, observe() is told what each
+# running fork drew (None if nothing), and when there are too many forks,
+# evict() removes some.  Forks are (RunningProgram, queue) pairs, oldest
+# first, and must stay in that order.
+
+# How many frames a fork may go without drawing anything new before
+# it counts as idle.
+default_idle_frames = 10
+
+
+def _pos(stroke):
+    if type(stroke) == Line:
+        return stroke.end
+    elif type(stroke) == Dot:
+        return stroke.pos
+    else:
+        return None
+
+
+class DropOldest:
+    """Stop running the forks that were created first."""
+
+    def observe(self, programs, strokes):
+        pass
+
+    def evict(self, programs: Deque, num: int) -> Deque:
+        for _ in range(num):
+            programs.popleft()
+        return programs
+
+
+class _DropUnwanted(ABC):
+    """
+    Stop running the oldest forks for which unwanted() is true, and if
+    that isn't enough, the oldest of the rest.
+    """
+
+    @abstractmethod
+    def unwanted(self, fork_id: int) -> bool:
+        pass
+
+    def forget(self, fork_id: int):
+        pass
+
+    def evict(self, programs: Deque, num: int) -> Deque:
+        victims = [
+            i for i, (prog, _) in enumerate(programs)
+            if self.unwanted(prog.fork_id)
+        ][:num]
+        if len(victims) < num:
+            chosen = set(victims)
+            victims += [
+                i for i in range(len(programs)) if i not in chosen
+            ][:num - len(victims)]
+        victims = set(victims)
+        ret = deque()
+        for i, (prog, queue) in enumerate(programs):
+            if i in victims:
+                self.forget(prog.fork_id)
+            else:
+                ret.append((prog, queue))
+        return ret
+
+
+class DropIdle(_DropUnwanted):
+    """Prefer to stop forks that haven't drawn anything for a while."""
+
+    def __init__(self, idle_frames: int = default_idle_frames):
+        self.idle_frames = idle_frames
+        self.frame = 0
+        # When each fork last drew something
+        self._last_drew: Dict[int, int] = {}
+
+    def observe(self, programs, strokes):
+        self.frame += 1
+        for (prog, _), stroke in zip(programs, strokes):
+            if stroke is not None or prog.fork_id not in self._last_drew:
+                self._last_drew[prog.fork_id] = self.frame
+
+    def unwanted(self, fork_id: int) -> bool:
+        return (
+            self.frame - self._last_drew.get(fork_id, self.frame) >=
+            self.idle_frames
+        )
+
+    def forget(self, fork_id: int):
+        self._last_drew.pop(fork_id, None)
+
+
+class DropRepeating(DropIdle):
+    """
+    Prefer to stop forks that have only drawn over lines that were
+    already there (which the StrokeOptimiser elides) for a while.
+    Only the last max_strokes different strokes count as already there,
+    since older ones will have been taken off the screen.
+    """
+
+    def __init__(
+            self,
+            idle_frames: int = default_idle_frames,
+            max_strokes: int = default_max_strokes,
+    ):
+        super().__init__(idle_frames)
+        self.max_strokes = max_strokes
+        self._seen: OrderedDict = OrderedDict()
+
+    def observe(self, programs, strokes):
+        new_strokes = []
+        for stroke in strokes:
+            if stroke is not None:
+                stroke = round_stroke(stroke)
+                if stroke in self._seen:
+                    self._seen.move_to_end(stroke)
+                    stroke = None
+                else:
+                    self._seen[stroke] = None
+                    if len(self._seen) > self.max_strokes:
+                        self._seen.popitem(last=False)
+            new_strokes.append(stroke)
+        super().observe(programs, new_strokes)
+
+
+class DropOffscreen(_DropUnwanted):
+    """
+    Prefer to stop forks that have wandered outside the area drawn in
+    the first lookahead_steps frames, which is the area the animation
+    initially zooms to show.
+    """
+
+    def __init__(self, lookahead_steps: int):
+        self.lookahead_steps = lookahead_steps
+        self.frame = 0
+        self.extents = Extents()
+        self._offscreen: Set[int] = set()
+
+    def observe(self, programs, strokes):
+        self.frame += 1
+        training = self.frame <= self.lookahead_steps
+        for (prog, _), stroke in zip(programs, strokes):
+            pos = _pos(stroke)
+            if pos is None:
+                continue
+            if training:
+                self.extents.add_cmd(stroke)
+            elif self._outside(pos):
+                self._offscreen.add(prog.fork_id)
+            else:
+                self._offscreen.discard(prog.fork_id)
+
+    def _outside(self, pos) -> bool:
+        cx, cy = self.extents.centre()
+        w, h = self.extents.size()
+        if w < 0 or h < 0:  # Nothing was drawn while training
+            return False
+        return abs(pos.x - cx) > w / 2 or abs(pos.y - cy) > h / 2
+
+    def unwanted(self, fork_id: int) -> bool:
+        return fork_id in self._offscreen
+
+    def forget(self, fork_id: int):
+        self._offscreen.discard(fork_id)
+
+
+eviction_policies = ["oldest", "idle", "repeating", "offscreen"]
+
+
+def make_eviction_policy(name: str, lookahead_steps: int):
+    if name == "idle":
+        return DropIdle()
+    elif name == "repeating":
+        return DropRepeating()
+    elif name == "offscreen":
+        return DropOffscreen(lookahead_steps)
+    else:
+        return DropOldest()
@@ -0,0 +1,162 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from graftlib.numbervalue import NumberValue
+
+
+# A fork's position: (fork ID, x, y)
+Position = Tuple[float, float, float]
+
+
+class ForkGrid:
+    """
+    The positions of all the forks, sorted into a grid of square cells
+    about one fork wide, so we can find the forks near a point by only
+    looking in the cells around it, instead of at every fork.
+    """
+
+    def __init__(self, positions: List[Position]):
+        self.positions = positions
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        if not positions:
+            return
+        xs = [x for _, x, _ in positions]
+        ys = [y for _, _, y in positions]
+        self._min_x = min(xs)
+        self._min_y = min(ys)
+        size = max(max(xs) - self._min_x, max(ys) - self._min_y)
+        self._cell_size = size / math.sqrt(len(positions)) or 1.0
+        # How many cells wide and high the grid is
+        self._span = int(size / self._cell_size) + 1
+        for i, (_, x, y) in enumerate(positions):
+            self._cells.setdefault(self._cell(x, y), []).append(i)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (
+            math.floor((x - self._min_x) / self._cell_size),
+            math.floor((y - self._min_y) / self._cell_size),
+        )
+
+    def _ring(self, ci: int, cj: int, ring: int):
+        """The indices of the forks in the cells ring cells from ci, cj."""
+        if ring == 0:
+            yield from self._cells.get((ci, cj), ())
+            return
+        for i in range(ci - ring, ci + ring + 1):
+            yield from self._cells.get((i, cj - ring), ())
+            yield from self._cells.get((i, cj + ring), ())
+        for j in range(cj - ring + 1, cj + ring):
+            yield from self._cells.get((ci - ring, j), ())
+            yield from self._cells.get((ci + ring, j), ())
+
+    def nearest(self, x: float, y: float, exclude) -> Optional[Position]:
+        """
+        The position of the fork nearest to x, y, not counting the one
+        whose ID is exclude, or None if there are no others.
+        """
+        if not self.positions:
+            return None
+        ci, cj = self._cell(x, y)
+        # Beyond this many rings, we have looked in every cell
+        max_ring = max(
+            abs(ci), abs(cj), abs(ci - self._span), abs(cj - self._span))
+        best = None
+        best_dist2 = math.inf
+        for ring in range(max_ring + 1):
+            for i in self._ring(ci, cj, ring):
+                fork_id, fx, fy = self.positions[i]
+                if fork_id == exclude:
+                    continue
+                dist2 = (fx - x) ** 2 + (fy - y) ** 2
+                if dist2 < best_dist2 or (dist2 == best_dist2 and i < best):
+                    best = i
+                    best_dist2 = dist2
+            # Forks in the next ring out are at least this far away
+            if best is not None and best_dist2 <= (
+                    ring * self._cell_size) ** 2:
+                break
+        return None if best is None else self.positions[best]
+
+    def within(
+            self, x: float, y: float, radius: float, exclude
+    ) -> List[Position]:
+        """
+        The positions of the forks no more than radius from x, y, not
+        counting the one whose ID is exclude, oldest first.
+        """
+        if not self.positions:
+            return []
+        min_i, min_j = self._cell(x - radius, y - radius)
+        max_i, max_j = self._cell(x + radius, y + radius)
+        if (max_i - min_i + 1) * (max_j - min_j + 1) > len(self._cells):
+            # The circle covers most of the grid: just look at every fork
+            candidates = range(len(self.positions))
+        else:
+            candidates = [
+                i
+                for ci in range(min_i, max_i + 1)
+                for cj in range(min_j, max_j + 1)
+                for i in self._cells.get((ci, cj), ())
+            ]
+        radius2 = radius * radius
+        ret = []
+        for i in sorted(candidates):
+            fork_id, fx, fy = self.positions[i]
+            if (
+                fork_id != exclude and
+                (fx - x) ** 2 + (fy - y) ** 2 <= radius2
+            ):
+                ret.append(self.positions[i])
+        return ret
+
+    def centre(self) -> Optional[Tuple[float, float]]:
+        """The average position of all the forks, or None if none."""
+        if not self.positions:
+            return None
+        return (
+            sum(x for _, x, _ in self.positions) / len(self.positions),
+            sum(y for _, _, y in self.positions) / len(self.positions),
+        )
+
+
+def _positions(programs) -> List[Position]:
+    """
+    Where the forks in programs (a list of (RunningProgram, queue)) are,
+    leaving out any whose f, x or y is not a number.
+    """
+    ret = []
+    for prog, _ in programs:
+        turtle = prog.env.turtle()
+        f = turtle.f
+        x = turtle.x
+        y = turtle.y
+        if (
+            type(f) == NumberValue and
+            type(x) == NumberValue and
+            type(y) == NumberValue
+        ):
+            ret.append((f.value, x.value, y.value))
+    return ret
+
+
+class ForkPositions:
+    """
+    Where all the running forks are, shared by all of them.
+    MultipleRunningPrograms tells us which forks are running at the
+    start of each frame, and the first time in that frame a fork asks
+    about the others, we find out where they are and build a ForkGrid.
+    Programs that never ask don't pay for any of this.
+    """
+
+    def __init__(self):
+        self._programs: List = []
+        self._grid: Optional[ForkGrid] = None
+
+    def update(self, programs):
+        self._programs = programs
+        self._grid = None
+
+    def grid(self) -> ForkGrid:
+        if self._grid is None:
+            self._grid = ForkGrid(_positions(self._programs))
+        return self._grid
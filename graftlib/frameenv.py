@@ -0,0 +1,89 @@
+from graftlib.turtlestate import EnvTurtleState, turtle_names
+
+
+class FrameEnv:
+    """
+    The variables of one call to a user-defined function inside a
+    ProgramEnv.  Calls happen thousands of times a frame, so this is a
+    single small object holding the call's own variables, with strokes,
+    random numbers and forking handed on to program, the ProgramEnv
+    we are running in.
+    """
+
+    __slots__ = ("_parent", "_items", "program")
+
+    def __init__(self, parent, program, items):
+        self._parent = parent
+        self._items = items
+        self.program = program
+
+    @property
+    def rand(self):
+        return self.program.rand
+
+    @property
+    def fork_callback(self):
+        return self.program.fork_callback
+
+    @property
+    def eval_expr(self):
+        return self.program.eval_expr
+
+    @property
+    def forks(self):
+        return self.program.forks
+
+    def parent(self):
+        return self._parent
+
+    def make_child(self, items=None):
+        return FrameEnv(self, self.program, {} if items is None else items)
+
+    def get(self, name):
+        items = self._items
+        if name in items:
+            return items[name]
+        return self._parent.get(name)
+
+    def _try_update(self, name, value):
+        if name in self._items:
+            self._items[name] = value
+            return True
+        return self._parent._try_update(name, value)
+
+    def _set(self, name, value):
+        if not self._try_update(name, value):
+            self._items[name] = value
+
+    def set(self, name, value):
+        # x and y are magic variables that remember their previous values
+        if name == "x":
+            self._set("xprev", self.get("x"))
+        elif name == "y":
+            self._set("yprev", self.get("y"))
+        self._set(name, value)
+
+    def set_new(self, name, value):
+        self._items[name] = value
+
+    def contains(self, name):
+        return name in self._items
+
+    def local_items(self):
+        return self._items
+
+    def turtle(self):
+        """See ProgramEnv.turtle()."""
+        if turtle_names.isdisjoint(self._items):
+            return self._parent.turtle()
+        return EnvTurtleState(self)
+
+    def stroke(self, st):
+        self.program.stroke(st)
+
+    def __str__(self):
+        ret = ""
+        for k, v in self._items.items():
+            ret += "%s=%s\n" % (k, v)
+        ret += ".\n" + str(self._parent)
+        return ret
@@ -3,105 +3,154 @@ import math
 import attr
 from typing import Tuple
 
+from graftlib.arrayvalue import ArrayValue
 from graftlib.dot import Dot
+from graftlib.forkgrid import ForkGrid
 from graftlib.line import Line
+from graftlib.numberarray import NumberArray
 from graftlib.numbervalue import NumberValue
 from graftlib.pt import Pt
 
 
-def _calc_step(env):
-    th = theta(env)
-    s = step_size(env)
-    old_pos = pos(env)
-    new_pos = Pt(
-        old_pos.x + s * math.sin(th),
-        old_pos.y + s * math.cos(th),
+def _calc_step(turtle):
+    th = theta(turtle)
+    s = turtle.s.value
+    old_x = turtle.x.value
+    old_y = turtle.y.value
+    return (
+        old_x,
+        old_y,
+        old_x + s * math.sin(th),
+        old_y + s * math.cos(th),
     )
-    return old_pos, new_pos
 
 
 def step(env):
-    old_pos, new_pos = _calc_step(env)
-    set_pos(env, new_pos)
+    turtle = env.turtle()
+    old_x, old_y, new_x, new_y = _calc_step(turtle)
+    set_pos(turtle, new_x, new_y)
     env.stroke(
         Line(
-            old_pos,
-            new_pos,
-            color=color(env),
-            size=brush_size(env)
+            Pt(old_x, old_y),
+            Pt(new_x, new_y),
+            color=color(turtle),
+            size=turtle.z.value,
         )
     )
 
 
 def dot(env):
+    turtle = env.turtle()
     env.stroke(
         Dot(
-            pos(env),
-            color(env),
-            brush_size(env)
+            Pt(turtle.x.value, turtle.y.value),
+            color(turtle),
+            turtle.z.value,
         )
     )
 
 
 def line_to(env):
+    turtle = env.turtle()
     env.stroke(
         Line(
-            prev_pos(env),
-            pos(env),
-            color=color(env),
-            size=brush_size(env),
+            prev_pos(turtle),
+            Pt(turtle.x.value, turtle.y.value),
+            color=color(turtle),
+            size=turtle.z.value,
         )
     )
 
 
 def jump(env):
-    _, new_pos = _calc_step(env)
-    set_pos(env, new_pos)
+    turtle = env.turtle()
+    _, _, new_x, new_y = _calc_step(turtle)
+    set_pos(turtle, new_x, new_y)
 
 
 def random(env):
-    return NumberValue(float(env.rand.__call__(-10, 10)))
+    """Unboxed: returns a plain float"""
+    return float(env.rand.__call__(-10, 10))
 
 
 def fork(env):
     return env.fork_callback.__call__()
 
 
-def theta(self) -> float:
-    """Angle we are facing in radians"""
-    return 2 * math.pi * (self.env.get("d").value / 360.0)
+# Nearest, Within and Centre ask where the other forks were when the
+# first of them was called in this frame (see graftlib.forkgrid).
 
+def _fork_grid(env) -> ForkGrid:
+    forks = env.forks
+    return ForkGrid([]) if forks is None else forks.grid()
 
-def prev_pos(self) -> Pt:
-    return Pt(self.env.get("xprev").value, self.env.get("yprev").value)
 
+def _point(x: float, y: float) -> ArrayValue:
+    return ArrayValue(NumberArray([x, y]))
 
-def pos(self) -> Pt:
-    return Pt(self.env.get("x").value, self.env.get("y").value)
 
+def _fork_id(turtle):
+    """Our fork ID, or None if f is not a number, so we are not counted."""
+    return turtle.f.value if type(turtle.f) == NumberValue else None
 
-def set_pos(self, pos: Pt):
-    self.env.set("xprev", self.env.get("x"))
-    self.env.set("yprev", self.env.get("y"))
-    self.env.set("x", NumberValue(pos.x))
-    self.env.set("y", NumberValue(pos.y))
 
+def nearest(env):
+    """[x, y] of the nearest other fork, or [] if there are none."""
+    turtle = env.turtle()
+    pos = _fork_grid(env).nearest(
+        turtle.x.value, turtle.y.value, _fork_id(turtle))
+    return ArrayValue([]) if pos is None else _point(pos[1], pos[2])
 
-def step_size(self) -> float:
-    return self.env.get("s").value
 
+def within(env, radius):
+    """[[x, y], ...] of the other forks no more than radius away."""
+    turtle = env.turtle()
+    return ArrayValue([
+        _point(x, y)
+        for _, x, y in _fork_grid(env).within(
+            turtle.x.value, turtle.y.value, radius.value, _fork_id(turtle))
+    ])
 
-def color(self) -> Tuple[float, float, float, float]:
-    return (
-        self.env.get("r").value,
-        self.env.get("g").value,
-        self.env.get("b").value,
-        self.env.get("a").value,
+
+def centre(env):
+    """[x, y] of the average position of all the forks."""
+    turtle = env.turtle()
+    pos = _fork_grid(env).centre()
+    if pos is None:
+        return _point(turtle.x.value, turtle.y.value)
+    return _point(*pos)
+
+
+# These take a TurtleState (see ProgramEnv.turtle()).
+
+def theta(turtle) -> float:
+    """Angle we are facing in radians"""
+    return 2 * math.pi * (turtle.d.value / 360.0)
+
+
+def prev_pos(turtle) -> Pt:
+    xprev = turtle.xprev
+    yprev = turtle.yprev
+    return Pt(
+        0.0 if xprev is None else xprev.value,
+        0.0 if yprev is None else yprev.value,
     )
 
 
-def brush_size(self) -> float:
-    return self.env.get("z").value
+def set_pos(turtle, x: float, y: float):
+    turtle.xprev = turtle.x
+    turtle.yprev = turtle.y
+    turtle.x = NumberValue(x)
+    turtle.y = NumberValue(y)
+
+
+def color(turtle) -> Tuple[float, float, float, float]:
+    return (
+        turtle.r.value,
+        turtle.g.value,
+        turtle.b.value,
+        turtle.a.value,
+    )
 
 
 def set_fork_id(self, new_id):
@@ -1,30 +1,48 @@
-from typing import Iterable, List, Optional
+from collections import deque
+import inspect
+import itertools
+from typing import Iterable, List, Optional, Sequence
 
 import attr
 
-from graftlib import functions
+from graftlib import functions, randomstream
+from graftlib.budget import Budget
+from graftlib.cycles import CycleDetector
 from graftlib.dot import Dot
+from graftlib.eviction import DropOldest
+from graftlib.forkgrid import ForkPositions
 from graftlib.labeltree import LabelTree
 from graftlib.line import Line
 from graftlib.make_graft_env import make_graft_env
+from graftlib.memory import approx_bytes
+from graftlib.nativefunctionvalue import NativeFunctionValue
+from graftlib.profiler import Profiler
 from graftlib.programenv import ProgramEnv
+from graftlib.userfunctionvalue import UserFunctionValue
 
 
 class RunningProgram:
     def __init__(
             self,
-            program: List,
+            program: Sequence,
             rand,
             fork_callback,
             env,
             eval_expr,
             pc=None,
             label=None,
+            fork_id=0,
+            can_pause=False,
+            forks=None,
     ):
-        self.program: List = program
+        self.program: Sequence = program
+        self.fork_id = fork_id
+        self.can_pause = can_pause
+        # The statement we are part way through, if eval_expr can pause
+        self.execution = None
         self.rand = rand
         self.fork_callback = fork_callback
-        self.env = ProgramEnv(env, rand, self.fork, eval_expr)
+        self.env = ProgramEnv(env, rand, self.fork, eval_expr, forks)
         self.eval_expr = eval_expr
 
         """
@@ -38,6 +56,18 @@ class RunningProgram:
         self.label = self.pc
 
     def next(self) -> List:
+        """
+        Run the next statement and return the strokes it drew.  If
+        eval_expr can pause, stop after the first stroke, and carry on
+        from there next time.  If the statement we carry on with draws
+        nothing more, run the next statement too, as we would have done
+        if we hadn't paused.
+        """
+        if self.execution is not None:
+            self._resume()
+            strokes = self.env.clear_strokes()
+            if strokes or self.execution is not None:
+                return strokes
         if self.pc >= len(self.program):
             self.pc = self.label
         statement = self.program[self.pc]
@@ -49,75 +79,194 @@ class RunningProgram:
         stmt_type = type(statement)
         if stmt_type == LabelTree:
             self.set_label()
+        elif self.can_pause:
+            self.execution = self.eval_expr(self.env, statement, pause=True)
+            self._resume()
         else:
             self.eval_expr(self.env, statement)
 
+    def _resume(self):
+        if self.execution.resume():
+            self.execution = None
+
     def fork(self):
         return self.fork_callback.__call__(
             RunningProgram(
-                list(self.program),
-                self.rand,
+                self.program,
+                randomstream.split(self.rand),
                 self.fork_callback,
-                self.env.clone(),
+                # Clone the Env inside our ProgramEnv, since the new
+                # RunningProgram wraps it in a ProgramEnv of its own.
+                self.env.env.clone(),
                 self.eval_expr,
                 self.pc,
                 self.label,
+                can_pause=self.can_pause,
+                forks=self.env.forks,
             )
         )
 
 
-def empty(queue: List) -> bool:
-    return len(queue) == 0
+def _can_pause(eval_expr) -> bool:
+    """
+    Can eval_expr run a statement a stroke at a time, like eval_cell
+    with pause=True?
+    """
+    try:
+        return "pause" in inspect.signature(eval_expr).parameters
+    except (TypeError, ValueError):
+        return False
 
 
 class MultipleRunningPrograms:
-    def __init__(self, program: List, rand, max_forks: int, eval_expr):
-        # programs is a list of (RunningProgram, queue)
-        # where queue is a list of commands already returned by that program,
-        # waiting to be returned.
+    def __init__(
+            self,
+            program: Iterable,
+            rand,
+            max_forks: int,
+            eval_expr,
+            profiler: Optional[Profiler] = None,
+            budget: Optional[Budget] = None,
+            detect_cycles: bool = False,
+            eviction=None,
+    ):
+        """
+        If detect_cycles is True, watch for the program repeating itself,
+        and when it does, replay the frames it drew the first time round
+        instead of running it again.  The envs returned with each stroke
+        are then None.
+
+        When there are more than max_forks forks, eviction (one of the
+        policies in graftlib.eviction, by default DropOldest) chooses
+        which ones to stop running.
+        """
+        # The program is never modified, so all the forks share it.
+        program = tuple(program)
+        # Where the forks are, for Nearest, Within and Centre
+        self.forks = ForkPositions()
+        # programs is a deque of (RunningProgram, queue), oldest first,
+        # where queue is a deque of commands already returned by that
+        # program, waiting to be returned.
+        initial_env = make_graft_env()
         initial_program = RunningProgram(
             program,
             rand,
             self.fork,
-            make_graft_env(),
+            initial_env,
             eval_expr,
+            can_pause=_can_pause(eval_expr),
+            forks=self.forks,
         )
-        self.programs = [(initial_program, [])]
+        self.programs = deque([(initial_program, deque())])
         self.max_forks = max_forks
+        self.eviction = DropOldest() if eviction is None else eviction
         self.new_programs = []
         self._fork_id_counter = 0
+        self.profiler = profiler
+        self.budget = budget
+        if budget is not None:
+            budget.roots = self._memory_roots
+        self.cycles = None
+        if detect_cycles:
+            self.cycles = CycleDetector(
+                program,
+                builtins={
+                    name: value
+                    for name, value in initial_env.local_items().items()
+                    if type(value) in (NativeFunctionValue, UserFunctionValue)
+                },
+            )
+        self._replay = None
+
+    def _memory_roots(self):
+        ret = []
+        for prog, queue in itertools.chain(
+                self.programs, self.new_programs):
+            ret.append(prog.env)
+            ret.append(queue)
+            if prog.execution is not None:
+                ret.extend(prog.execution.roots())
+        return ret
 
     def next_fork_id(self):
         self._fork_id_counter += 1
         return self._fork_id_counter
 
     def next(self):
-        # Ensure each queue has at least 1 thing in it
-
-        for prog, queue in self.programs:
-            if empty(queue):
-                queue.extend(prog.next())
-            if empty(queue):
-                queue.append(None)
-
+        if self._replay is not None:
+            return self._next_replayed()
+
+        cycles = self.cycles
+        if cycles is not None and cycles.enabled:
+            repeating = cycles.check(cycles.state(self.programs))
+            if repeating is not None:
+                self._replay = itertools.cycle(repeating)
+                self.programs = deque()
+                self.cycles = None
+                return self._next_replayed()
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin("interpret")
+
+        self.forks.update(self.programs)
+
+        # Take a stroke (or None) from each queue, refilling it first
+        # if it is empty.
         ret = []
         for prog, queue in self.programs:
+            if not queue:
+                queue.extend(prog.next())
+                if profiler is not None:
+                    profiler.statement(prog.fork_id)
             # Note: return a reference to env.  In eval_debug we
             # will copy it if needed.
-            ret.append((queue.pop(0), prog.env))
+            ret.append((queue.popleft() if queue else None, prog.env))
+
+        self.eviction.observe(self.programs, [stroke for stroke, _ in ret])
 
         self.programs.extend(self.new_programs)
         self.new_programs = []
         if len(self.programs) > self.max_forks:
-            self.programs = self.programs[
-                len(self.programs) - self.max_forks:
-            ]
+            evicted = len(self.programs) - self.max_forks
+            self.programs = self.eviction.evict(self.programs, evicted)
+            if profiler is not None:
+                profiler.forks_were_evicted(evicted)
+
+        if profiler is not None:
+            profiler.frame(sum(1 for stroke, _ in ret if stroke is not None))
+            profiler.end()
+
+        if cycles is not None and cycles.enabled:
+            cycles.record([stroke for stroke, _ in ret])
 
         return ret
 
+    def replaying(self) -> bool:
+        """Have we noticed the program repeating, and started replaying?"""
+        return self._replay is not None
+
+    def _next_replayed(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin("replay")
+        strokes = next(self._replay)
+        if profiler is not None:
+            profiler.frame(sum(1 for stroke in strokes if stroke is not None))
+            profiler.end()
+        return [(stroke, None) for stroke in strokes]
+
     def fork(self, cloned_running_program: RunningProgram):
-        functions.set_fork_id(cloned_running_program.env, self.next_fork_id())
-        self.new_programs.append((cloned_running_program, []))
+        budget = self.budget
+        if budget is not None and budget.max_bytes is not None:
+            if budget.allocate(approx_bytes([cloned_running_program.env])):
+                budget.measure()
+        fork_id = self.next_fork_id()
+        cloned_running_program.fork_id = fork_id
+        functions.set_fork_id(cloned_running_program.env, fork_id)
+        self.new_programs.append((cloned_running_program, deque()))
+        if self.profiler is not None:
+            self.profiler.fork_created()
 
 
 @attr.s
@@ -147,8 +296,26 @@ class FramesCounter:
             raise StopIteration()
 
 
-def _run_program(program: Iterable, rand, max_forks, eval_expr) -> Iterable:
-    progs = MultipleRunningPrograms(list(program), rand, max_forks, eval_expr)
+def _run_program(
+        program: Iterable,
+        rand,
+        max_forks,
+        eval_expr,
+        profiler=None,
+        budget=None,
+        detect_cycles=False,
+        eviction=None,
+) -> Iterable:
+    progs = MultipleRunningPrograms(
+        program,
+        rand,
+        max_forks,
+        eval_expr,
+        profiler,
+        budget,
+        detect_cycles,
+        eviction,
+    )
     while True:
         # Run a line of code, and get back the animation frame(s) that result
         yield progs.next()
@@ -171,7 +338,10 @@ def graftrun_debug(
     frames_counter = FramesCounter(n)
     for parallel_commands in _run_program(program, rand, max_forks, eval_expr):
         yield copy_envs(parallel_commands)
-        frames_counter.next_frame(parallel_commands)
+        try:
+            frames_counter.next_frame(parallel_commands)
+        except StopIteration:
+            return
 
 
 #: Iterable[Tree], n -> Iterable[Command]
@@ -180,15 +350,37 @@ def graftrun(
     n: Optional[int],
     rand,
     max_forks,
-    eval_expr
+    eval_expr,
+    profiler: Optional[Profiler] = None,
+    budget: Optional[Budget] = None,
+    detect_cycles: bool = False,
+    eviction=None,
 ) -> Iterable:
     """
     Run the supplied program for n steps, or forever if n is None.
+    If profiler is supplied, record what happens in it.  If budget is
+    supplied, it should be the same Budget given to eval_expr: we tell it
+    about the memory used by forks.  If detect_cycles is True, once the
+    program starts repeating itself, we replay what it drew instead of
+    running it.  eviction is the policy (see graftlib.eviction) that
+    chooses which forks to stop when there are more than max_forks.
     """
 
     frames_counter = FramesCounter(n)
-    for cmds_envs in _run_program(program, rand, max_forks, eval_expr):
+    for cmds_envs in _run_program(
+            program,
+            rand,
+            max_forks,
+            eval_expr,
+            profiler,
+            budget,
+            detect_cycles,
+            eviction,
+    ):
         commands = [x[0] for x in cmds_envs]
         if any(commands):
             yield commands
-        frames_counter.next_frame(cmds_envs)
+        try:
+            frames_counter.next_frame(cmds_envs)
+        except StopIteration:
+            return
@@ -1,6 +1,9 @@
+from typing import Optional
 import attr
 
+from graftlib.sourcepos import SourcePos
+
 
 @attr.s
 class LabelTree:
-    pass
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
@@ -1,11 +1,15 @@
 import re
+from typing import Optional
 import attr
 
 from graftlib.peekablestream import PeekableStream
+from graftlib.sourcepos import SourcePos
 
 
 @attr.s
 class AssignmentToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "="
@@ -13,6 +17,8 @@ class AssignmentToken:
 
 @attr.s
 class EndArrayToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "]"
@@ -20,6 +26,8 @@ class EndArrayToken:
 
 @attr.s
 class EndFunctionDefToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "}"
@@ -27,6 +35,8 @@ class EndFunctionDefToken:
 
 @attr.s
 class EndParamListToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return ")"
@@ -34,6 +44,8 @@ class EndParamListToken:
 
 @attr.s
 class LabelToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "^"
@@ -41,6 +53,8 @@ class LabelToken:
 
 @attr.s
 class ListSeparatorToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return ","
@@ -49,6 +63,7 @@ class ListSeparatorToken:
 @attr.s
 class ModifyToken:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
     def code(self):
         return self.value
@@ -57,6 +72,7 @@ class ModifyToken:
 @attr.s
 class NumberToken:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
     def code(self):
         return self.value
@@ -65,6 +81,7 @@ class NumberToken:
 @attr.s
 class OperatorToken:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
     def code(self):
         return self.value
@@ -72,6 +89,8 @@ class OperatorToken:
 
 @attr.s
 class ParamListPreludeToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return ":"
@@ -79,6 +98,8 @@ class ParamListPreludeToken:
 
 @attr.s
 class StartArrayToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "["
@@ -86,6 +107,8 @@ class StartArrayToken:
 
 @attr.s
 class StartFunctionDefToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "{"
@@ -93,6 +116,8 @@ class StartFunctionDefToken:
 
 @attr.s
 class StartParamListToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return "("
@@ -100,6 +125,8 @@ class StartParamListToken:
 
 @attr.s
 class StatementSeparatorToken:
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
     @staticmethod
     def code():
         return " "
@@ -108,6 +135,7 @@ class StatementSeparatorToken:
 @attr.s
 class StringToken:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
     def code(self):
         return '"%s"' % self.value
@@ -116,6 +144,7 @@ class StringToken:
 @attr.s
 class SymbolToken:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
     def code(self):
         return self.value
@@ -148,66 +177,89 @@ def _is_whitespace(c):
         return c in " \n"
 
 
+class _Chars(PeekableStream):
+    """A PeekableStream of characters that knows where the next one is."""
+
+    def __init__(self, iterator):
+        super().__init__(iterator)
+        self.line = 1
+        self.column = 1
+
+    def move_next(self):
+        ret = super().move_next()
+        if ret == "\n":
+            self.line += 1
+            self.column = 1
+        else:
+            self.column += 1
+        return ret
+
+    def pos(self) -> SourcePos:
+        return SourcePos(self.line, self.column)
+
+
 def lex_cell(chars_iter):
-    chars = PeekableStream(chars_iter)
+    chars = _Chars(chars_iter)
 
     while True:
         if _is_whitespace(chars.next):
+            pos = chars.pos()
             chars.move_next()
-            yield StatementSeparatorToken()
+            yield StatementSeparatorToken(pos)
             while _is_whitespace(chars.next):
                 chars.move_next()
 
         if chars.next is None:
             break
 
+        pos = chars.pos()
         c = chars.move_next()
 
         if c == "(":
-            yield StartParamListToken()
+            yield StartParamListToken(pos)
         elif c == ")":
-            yield EndParamListToken()
+            yield EndParamListToken(pos)
         elif c == "{":
-            yield StartFunctionDefToken()
+            yield StartFunctionDefToken(pos)
         elif c == "}":
-            yield EndFunctionDefToken()
+            yield EndFunctionDefToken(pos)
         elif c == "[":
-            yield StartArrayToken()
+            yield StartArrayToken(pos)
         elif c == "]":
-            yield EndArrayToken()
+            yield EndArrayToken(pos)
         elif c == ",":
-            yield ListSeparatorToken()
+            yield ListSeparatorToken(pos)
         elif c == ":":
-            yield ParamListPreludeToken()
+            yield ParamListPreludeToken(pos)
         elif c == "=":
             nc = chars.next
             if nc == "=":
                 chars.move_next()
-                yield OperatorToken(c + nc)
+                yield OperatorToken(c + nc, pos)
             else:
-                yield AssignmentToken()
+                yield AssignmentToken(pos)
         elif c == "^":
-            yield LabelToken()
+            yield LabelToken(pos)
 
         elif c in "+-*/<>":
             nc = chars.next
             if nc == "=":
                 chars.move_next()
                 if c in "+-*/":
-                    yield ModifyToken(c + nc)
+                    yield ModifyToken(c + nc, pos)
                 else:
-                    yield OperatorToken(c + nc)
+                    yield OperatorToken(c + nc, pos)
             else:
-                yield OperatorToken(c)
+                yield OperatorToken(c, pos)
 
         elif c in ("'", '"'):
-            yield StringToken(_scan_string(c, chars))
+            yield StringToken(_scan_string(c, chars), pos)
 
         elif re.match("[.0-9]", c):
-            yield NumberToken(_scan(c, chars, "[.0-9]"))
+            yield NumberToken(_scan(c, chars, "[.0-9]"), pos)
 
         elif re.match("[_a-zA-Z]", c):
-            yield SymbolToken(_scan(c, chars, "[_a-zA-Z0-9]"))
+            yield SymbolToken(_scan(c, chars, "[_a-zA-Z0-9]"), pos)
 
         elif c == "\t":
             raise Exception("Tab characters are not allowed in Graft.")
@@ -102,6 +102,5 @@ def _next_token(c: str, it: Iterable[str]):
 
 def lex_v1(chars: Iterable[str]):
     it = Peekable(iter(chars))
-    while True:
-        c = next(it)
+    for c in it:
         yield _next_token(c, it)
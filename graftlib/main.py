@@ -1,49 +1,44 @@
 from typing import Optional, Tuple
 from argparse import ArgumentParser
+import functools
 
 from graftlib.animation import Animation
+from graftlib.budget import Budget
+from graftlib.compile_cell import compile_cell
+from graftlib.compile_v1 import compile_v1
+from graftlib.defaults import (
+    default_height,
+    default_lookahead_steps,
+    default_max_forks,
+    default_max_strokes,
+    default_width,
+    dot_size,
+)
 from graftlib.env import Env
 from graftlib.eval_cell import eval_cell
-from graftlib.eval_v1 import eval_v1
+from graftlib.eviction import eviction_policies, make_eviction_policy
 from graftlib.graftrun import graftrun
 from graftlib.lex_cell import lex_cell
 from graftlib.lex_v1 import lex_v1
+from graftlib.memo import Memo, default_max_entries
 from graftlib.strokeoptimiser import StrokeOptimiser
 from graftlib.parse_cell import parse_cell
 from graftlib.parse_v1 import parse_v1
+from graftlib.profiler import Profiler, iterate
+from graftlib.programprofiler import ProgramProfiler
+from graftlib.randomstream import RandomStream
 from graftlib.world import World
 from graftlib.ui.gtk3ui import Gtk3Ui
 from graftlib.ui.gifui import GifUi
 
 
-# How many strokes we are allowed before we start deleting old ones.
-default_max_strokes = 200
-
-
-# Size of the dot indicating where we are.
-dot_size = 5
-
-
-# Default screen size in pixels if not overridden by --width, --height
-default_width = 200
-default_height = 200
-
-
-# Default number of parallel forks if not overridden by --max-forks
-default_max_forks = 20
-
-
-# How far to run the animation initially to decide what
-# our initial zoom level should be.
-default_lookahead_steps = 80
-
-
 def main_gif(
         animation: Animation,
         frames: Optional[int],
         filename: str,
         world: World,
         image_size: Tuple[int, int],
+        profiler: Optional[Profiler],
 ) -> int:
     if frames is None:
         world.stderr.write(
@@ -52,11 +47,15 @@ def main_gif(
         )
         return 3
 
-    return GifUi(animation, filename, world, image_size).run()
+    return GifUi(animation, filename, world, image_size, profiler).run()
 
 
-def main_gtk3(animation: Animation, image_size: Tuple[int, int]) -> int:
-    return Gtk3Ui(animation, image_size).run()
+def main_gtk3(
+        animation: Animation,
+        image_size: Tuple[int, int],
+        profiler: Optional[Profiler],
+) -> int:
+    return Gtk3Ui(animation, image_size, profiler).run()
 
 
 def make_animation(
@@ -64,6 +63,7 @@ def make_animation(
         frames: Optional[int],
         lookahead_steps: int,
         max_strokes: int,
+        profiler: Optional[Profiler] = None,
 ):
     """
     Given the values from evaluating a program, return an iterator that
@@ -73,7 +73,13 @@ def make_animation(
     opt = StrokeOptimiser(program_values)
     frames = lookahead_steps if frames is None else frames
     lookahead = min(frames, lookahead_steps)
-    return Animation(opt, opt, lookahead, max_strokes, dot_size)
+    return Animation(
+        iterate(profiler, "optimise", opt),
+        opt,
+        lookahead,
+        max_strokes,
+        dot_size,
+    )
 
 
 def main(world: World) -> int:
@@ -116,6 +122,17 @@ def main(world: World) -> int:
         type=int,
         help="The number of forked lines that can run in parallel.",
     )
+    argparser.add_argument(
+        '--evict',
+        choices=eviction_policies,
+        default="oldest",
+        help=(
+            "Which forks to stop when there are more than --max-forks: " +
+            "the oldest, ones that have stopped drawing (idle), ones " +
+            "that only draw over lines already drawn (repeating), or " +
+            "ones that have left the area shown at the start (offscreen)."
+        ),
+    )
     argparser.add_argument(
         '--max-strokes',
         default=default_max_strokes,
@@ -139,6 +156,76 @@ def main(world: World) -> int:
             "see SYNTAX_V1.md in the source repository."
         ),
     )
+    argparser.add_argument(
+        '--seed',
+        type=int,
+        help=(
+            "Seed for the random numbers returned by R(), so that the " +
+            "program draws the same thing every time it is run.  Each " +
+            "fork gets its own random numbers, made from this seed."
+        ),
+    )
+    argparser.add_argument(
+        '--max-steps',
+        type=int,
+        help=(
+            "Stop with an error if the program makes more than this many " +
+            "function calls, loop iterations, arrays and functions in total."
+        ),
+    )
+    argparser.add_argument(
+        '--max-seconds',
+        type=float,
+        help="Stop with an error if the program runs for longer than this.",
+    )
+    argparser.add_argument(
+        '--max-memory',
+        metavar="MEGABYTES",
+        type=float,
+        help=(
+            "Stop with an error if the program's arrays, functions, " +
+            "variables and forks use roughly more than this much memory."
+        ),
+    )
+    argparser.add_argument(
+        '--memo-entries',
+        type=int,
+        default=default_max_entries,
+        help=(
+            "Remember the results of up to this many calls to pure " +
+            "functions (ones that only do maths on their arguments), " +
+            "so calling them again is instant.  0 means never remember."
+        ),
+    )
+    argparser.add_argument(
+        '--profile',
+        metavar="PROFILE_FILENAME",
+        help=(
+            "Record how long is spent running, optimising, animating, " +
+            "drawing and saving the animation, how many statements each " +
+            "fork ran and how many strokes each frame drew, and write it " +
+            "to this file when we finish."
+        ),
+    )
+    argparser.add_argument(
+        '--profile-format',
+        choices=["json", "trace"],
+        default="json",
+        help=(
+            "The format of the --profile file: a JSON summary, or a " +
+            "Chrome trace event file that can be loaded into " +
+            "chrome://tracing or Perfetto."
+        ),
+    )
+    argparser.add_argument(
+        '--profile-program',
+        action="store_true",
+        help=(
+            "When we finish, print how many times each function and " +
+            "top-level statement in the program ran, and how long they " +
+            "took, slowest first."
+        ),
+    )
     argparser.add_argument(
         'program',
         help=(
@@ -154,29 +241,69 @@ def main(world: World) -> int:
     if args.syntax == "v1":
         lex = lex_v1
         parse = parse_v1
-        eval_expr = eval_v1
+        compile_ = compile_v1
     else:
         lex = lex_cell
         parse = parse_cell
-        eval_expr = eval_cell
+        compile_ = compile_cell
+
+    memo = Memo(args.memo_entries) if args.memo_entries > 0 else None
+    eval_expr = functools.partial(eval_cell, memo=memo)
+    budget = None
+    if (
+        args.max_steps is not None or
+        args.max_seconds is not None or
+        args.max_memory is not None
+    ):
+        max_bytes = (
+            None if args.max_memory is None
+            else int(args.max_memory * 1024 * 1024)
+        )
+        budget = Budget(args.max_steps, args.max_seconds, max_bytes)
+        eval_expr = functools.partial(eval_cell, budget=budget, memo=memo)
+
+    profiler = Profiler() if args.profile else None
+    program_profiler = ProgramProfiler() if args.profile_program else None
+    if program_profiler is not None:
+        eval_expr = program_profiler.eval_expr(eval_expr)
+
+    seed = (
+        world.random.randrange(2 ** 64) if args.seed is None else args.seed)
 
     program_values = graftrun(
-        parse(lex(args.program)),
+        compile_(parse(lex(args.program))),
         frames,
-        world.random.uniform,
+        RandomStream(seed),
         args.max_forks,
         eval_expr,
+        profiler,
+        budget,
+        detect_cycles=True,
+        eviction=make_eviction_policy(args.evict, args.lookahead_steps),
     )
 
     animation = make_animation(
         program_values,
         frames,
         args.lookahead_steps,
-        args.max_strokes
+        args.max_strokes,
+        profiler,
     )
     image_size = (args.width, args.height)
 
     if args.gif:
-        return main_gif(animation, frames, args.gif, world, image_size)
+        ret = main_gif(
+            animation, frames, args.gif, world, image_size, profiler)
     else:
-        return main_gtk3(animation, image_size)
+        ret = main_gtk3(animation, image_size, profiler)
+
+    if profiler is not None:
+        world.fs.write_file(
+            args.profile, profiler.to_json(args.profile_format))
+
+    if program_profiler is not None:
+        world.stdout.write(program_profiler.report())
+        if memo is not None:
+            world.stdout.write(memo.report())
+
+    return ret
@@ -3,57 +3,106 @@ import math
 from graftlib import cellfunctions
 from graftlib import cellstdlib
 from graftlib import functions
+from graftlib import memory
+from graftlib.arrayvalue import ArrayValue
 from graftlib.env import Env
 from graftlib.endofloopvalue import EndOfLoopValue
 from graftlib.eval_cell import eval_cell_list
 from graftlib.lex_cell import lex_cell
 from graftlib.nativefunctionvalue import NativeFunctionValue
-from graftlib.numbervalue import NumberValue
+from graftlib.numberarray import apply, numbers
 from graftlib.parse_cell import parse_cell
+from graftlib.turtlestate import TurtleEnv
 
 
 def exec_cell(code, env):
     eval_cell_list(parse_cell(lex_cell(code)), env)
 
 
+# The maths functions take and return plain floats (see eval_cell), so
+# calling them does not allocate any NumberValues.  Given arrays instead,
+# they work on every number in them at once, returning a new array.
+
+def _numbers(arg):
+    return numbers(arg.value) if type(arg) == ArrayValue else arg
+
+
+def _math_fn(impl):
+    return NativeFunctionValue(
+        impl,
+        unboxed=True,
+        allocates=memory.number_array,
+        pure=True,
+    )
+
+
 def wrap_math(fn):
     def impl(env, num):
-        return NumberValue(fn(num.value))
-    return NativeFunctionValue(impl)
+        if type(num) == ArrayValue:
+            return ArrayValue(apply(fn, numbers(num.value)))
+        return fn(num)
+    return _math_fn(impl)
 
 
 def wrap_math_radinp(fn):
+    def radinp(num):
+        return fn(math.radians(num))
+
     def impl(env, num):
-        return NumberValue(fn(math.radians(num.value)))
-    return NativeFunctionValue(impl)
+        if type(num) == ArrayValue:
+            return ArrayValue(apply(radinp, numbers(num.value)))
+        return fn(math.radians(num))
+    return _math_fn(impl)
 
 
 def wrap_math_radout(fn):
+    def radout(num):
+        return math.degrees(fn(num))
+
     def impl(env, num):
-        return NumberValue(math.degrees(fn(num.value)))
-    return NativeFunctionValue(impl)
+        if type(num) == ArrayValue:
+            return ArrayValue(apply(radout, numbers(num.value)))
+        return math.degrees(fn(num))
+    return _math_fn(impl)
 
 
 def wrap_math2_radout(fn):
+    def radout(num1, num2):
+        return math.degrees(fn(num1, num2))
+
     def impl(env, num1, num2):
-        return NumberValue(math.degrees(fn(num1.value, num2.value)))
-    return NativeFunctionValue(impl)
+        if type(num1) == ArrayValue or type(num2) == ArrayValue:
+            return ArrayValue(apply(radout, _numbers(num1), _numbers(num2)))
+        return math.degrees(fn(num1, num2))
+    return _math_fn(impl)
 
 
 def wrap_math2(fn):
     def impl(env, num1, num2):
-        return NumberValue(fn(num1.value, num2.value))
-    return NativeFunctionValue(impl)
+        if type(num1) == ArrayValue or type(num2) == ArrayValue:
+            return ArrayValue(apply(fn, _numbers(num1), _numbers(num2)))
+        return fn(num1, num2)
+    return _math_fn(impl)
 
 
 def add_cell_symbols(env: Env):
     env.set("endofloop", EndOfLoopValue)
-    env.set("Add", NativeFunctionValue(cellfunctions.add))
-    env.set("Get", NativeFunctionValue(cellfunctions.get))
-    env.set("For", NativeFunctionValue(cellfunctions.for_))
-    env.set("If", NativeFunctionValue(cellfunctions.if_))
-    env.set("Len", NativeFunctionValue(cellfunctions.len_))
-    env.set("T", NativeFunctionValue(cellfunctions.times))
+    env.set(
+        "Add",
+        NativeFunctionValue(
+            cellfunctions.add,
+            allocates=memory.add_to_array,
+        )
+    )
+    env.set("Get", NativeFunctionValue(cellfunctions.get, pure=True))
+    env.set("For", NativeFunctionValue(cellfunctions.for_, pure=True))
+    env.set("If", NativeFunctionValue(cellfunctions.if_, pure=True))
+    env.set("Len", NativeFunctionValue(cellfunctions.len_, pure=True))
+    env.set("Range", NativeFunctionValue(cellfunctions.range_, pure=True))
+    env.set("Sum", NativeFunctionValue(cellfunctions.sum_, pure=True))
+    env.set("Min", NativeFunctionValue(cellfunctions.min_, pure=True))
+    env.set("Max", NativeFunctionValue(cellfunctions.max_, pure=True))
+    env.set("T", NativeFunctionValue(cellfunctions.times, pure=True))
     env.set("Sin", wrap_math_radinp(math.sin))
     env.set("Cos", wrap_math_radinp(math.cos))
     env.set("Tan", wrap_math_radinp(math.tan))
@@ -69,28 +118,52 @@ def add_cell_symbols(env: Env):
 
 
 def _add_graft_symbols(env: Env):
-    env.set("f", NumberValue(0))      # Fork ID
-    env.set("x", NumberValue(0.0))    # x coord
-    env.set("y", NumberValue(0.0))    # y coord
-    env.set("d", NumberValue(0.0))    # direction in degrees
-    env.set("s", NumberValue(10.0))   # step size
-    env.set("r", NumberValue(0.0))    # red   0-100 (and 0 to -100)
-    env.set("g", NumberValue(0.0))    # green 0-100 (and 0 to -100)
-    env.set("b", NumberValue(0.0))    # blue  0-100 (and 0 to -100)
-    env.set("a", NumberValue(100.0))  # alpha 0-100 (and 0 to -100)
-    env.set("z", NumberValue(5.0))    # brush size
-    env.set("D", NativeFunctionValue(functions.dot))
+    # The graft variables (x, y, d etc.) are in env's TurtleState.
+    env.set(
+        "D",
+        NativeFunctionValue(
+            functions.dot,
+            allocates=memory.one_stroke,
+            draws=True,
+        )
+    )
+    env.set(
+        "Centre",
+        NativeFunctionValue(functions.centre, allocates=memory.one_point),
+    )
     env.set("F", NativeFunctionValue(functions.fork))
     env.set("J", NativeFunctionValue(functions.jump))
-    env.set("L", NativeFunctionValue(functions.line_to))
-    env.set("R", NativeFunctionValue(functions.random))
-    env.set("S", NativeFunctionValue(functions.step))
+    env.set(
+        "L",
+        NativeFunctionValue(
+            functions.line_to,
+            allocates=memory.one_stroke,
+            draws=True,
+        )
+    )
+    env.set(
+        "Nearest",
+        NativeFunctionValue(functions.nearest, allocates=memory.one_point),
+    )
+    env.set("R", NativeFunctionValue(functions.random, unboxed=True))
+    env.set(
+        "S",
+        NativeFunctionValue(
+            functions.step,
+            allocates=memory.one_stroke,
+            draws=True,
+        )
+    )
+    env.set(
+        "Within",
+        NativeFunctionValue(functions.within, allocates=memory.fork_points),
+    )
 
 
 def make_graft_env() -> Env:
     """Create an environment with all the default Graft values"""
 
-    ret = Env()
+    ret = TurtleEnv()
     add_cell_symbols(ret)
     _add_graft_symbols(ret)
 
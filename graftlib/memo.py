@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from graftlib.compile_cell import (
+    CONST,
+    LABEL,
+    LOAD,
+    MAKE_CLOSURE,
+    MODIFY,
+    STORE,
+    Code,
+)
+from graftlib.endofloopvalue import EndOfLoopValue
+from graftlib.nativefunctionvalue import NativeFunctionValue
+from graftlib.turtlestate import turtle_names
+from graftlib.userfunctionvalue import UserFunctionValue
+
+
+# How many results we remember by default
+default_max_entries = 10000
+
+# Names that a pure function can never use: the turtle's variables, and
+# the functions that draw, move, fork or return random numbers.
+_impure_names = turtle_names | {"D", "F", "J", "L", "R", "S"}
+
+_number_types = (float, int)
+
+
+def _analyse(code: Code, bound: frozenset, free: set, stored: set) -> bool:
+    """
+    Add the names code loads that are not in bound to free, and the names
+    it assigns to that are not in bound to stored, looking inside the
+    functions it defines too.  Return False if code can never be pure.
+    """
+    for i in range(0, len(code.ops), 2):
+        op = code.ops[i]
+        arg = code.ops[i + 1]
+        if op == LOAD:
+            if arg not in bound:
+                free.add(arg)
+        elif op == STORE:
+            if arg not in bound:
+                stored.add(arg)
+        elif op == MODIFY:
+            if arg[1] not in bound:
+                stored.add(arg[1])
+        elif op == MAKE_CLOSURE:
+            inner_bound = bound | frozenset(arg.param_names)
+            if not _analyse(arg.code, inner_bound, free, stored):
+                return False
+        elif op == CONST and type(arg) in (
+                UserFunctionValue, NativeFunctionValue):
+            return False
+        elif op == LABEL:
+            return False
+    return True
+
+
+def analyse(fn: UserFunctionValue) -> Optional[Tuple[tuple, tuple]]:
+    """
+    Return None if fn can never be pure, or otherwise the names it uses
+    from outside, and the names of the local variables it makes.  fn is
+    pure if, when it is called, the names it uses from outside are all
+    pure functions, and none of its local variables already exist
+    outside (because then it would be assigning to those instead).
+    """
+    free = set()
+    stored = set()
+    if not _analyse(fn.code, frozenset(fn.param_names), free, stored):
+        return None
+    free -= stored  # Loading a local variable after assigning it
+    if not _impure_names.isdisjoint(free | stored):
+        return None
+    return tuple(sorted(free)), tuple(sorted(stored))
+
+
+def _lookup(env, name):
+    """The value of name in env, or None, without creating it."""
+    while env is not None:
+        if env.contains(name):
+            return env.get(name)
+        env = env.parent()
+    return None
+
+
+# Stands for the function being called in Memo._purity's lookups
+_itself = object()
+
+
+def _same_lookups(fn: UserFunctionValue, lookups: list) -> bool:
+    """
+    Whether looking up the names in lookups (see Memo.key) would find the
+    same values now, if the function they were looked up for is fn.
+    """
+    for owner, name, value in lookups:
+        env = fn.env if owner is None else owner.env
+        found = _lookup(env, name)
+        if found is not (fn if value is _itself else value):
+            return False
+    return True
+
+
+class Memo:
+    """
+    Remembers the results of calls to pure user-defined functions with
+    numbers as arguments, so calling them again with the same arguments
+    doesn't run them again (see eval_cell).  A function is pure if it
+    only uses its arguments, its own local variables, and other pure
+    functions, e.g. Sin or itself.  The names it uses may have been
+    reassigned since it was last called, so each time it is called we
+    check they still refer to the same things as when we last worked out
+    whether it was pure, and if not, work it out again.
+
+    At most max_entries results are remembered, and the ones used least
+    recently are forgotten first.
+    """
+
+    def __init__(self, max_entries: int = default_max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._results: OrderedDict = OrderedDict()
+        # The analysis of each function's Code, keyed on id(code).  We
+        # keep the Code too, so that its id is not reused.
+        self._analyses: Dict[int, Tuple[Code, Optional[tuple]]] = {}
+        # Whether a function with each Code was pure when it was last
+        # called, keyed on id(code): (code, lookups, fns), where lookups
+        # is the names we looked up to decide, and fns the part of the key
+        # for the functions it calls, or None if it was not pure.
+        self._purity: Dict[int, Tuple[Code, list, Optional[tuple]]] = {}
+
+    def key(self, fn: UserFunctionValue, args) -> Optional[tuple]:
+        """
+        Return the key to remember the result of calling fn with args
+        under, or None if it can't be remembered.  The key includes the
+        functions fn calls, so that if they are replaced, it changes.
+        """
+        for arg in args:
+            if type(arg) not in _number_types:
+                return None
+        code = fn.code
+        entry = self._purity.get(id(code))
+        if entry is None or not _same_lookups(fn, entry[1]):
+            lookups = []
+            fns = [id(code)]
+            pure = self._pure(fn, {id(fn)}, fns, lookups)
+            # Don't keep fn (and so its Env) alive: the next function with
+            # this Code can stand in for it.
+            lookups = [
+                (
+                    None if owner is fn else owner,
+                    name,
+                    _itself if value is fn else value,
+                )
+                for owner, name, value in lookups
+            ]
+            entry = (code, lookups, tuple(fns) if pure else None)
+            self._purity[id(code)] = entry
+        fns = entry[2]
+        if fns is None:
+            return None
+        return fns + tuple(args)
+
+    def _analysis(self, fn: UserFunctionValue) -> Optional[tuple]:
+        code = fn.code
+        entry = self._analyses.get(id(code))
+        if entry is None:
+            entry = (code, analyse(fn))
+            self._analyses[id(code)] = entry
+        return entry[1]
+
+    def _pure(
+            self,
+            fn: UserFunctionValue,
+            checking: set,
+            fns: list,
+            lookups: list,
+    ) -> bool:
+        """
+        Return whether fn is pure, adding the ids of the functions it
+        calls to fns, and (function, name, value) to lookups for each
+        name we look up in a function's Env.  checking holds the
+        functions we have already seen.
+        """
+        analysis = self._analysis(fn)
+        if analysis is None:
+            return False
+        free, stored = analysis
+        env = fn.env
+        for name in stored:
+            value = _lookup(env, name)
+            lookups.append((fn, name, value))
+            if value is not None:
+                return False
+        for name in free:
+            value = _lookup(env, name)
+            lookups.append((fn, name, value))
+            typ = type(value)
+            if typ == NativeFunctionValue:
+                if not value.pure:
+                    return False
+                fns.append(id(value.py_fn))
+            elif typ == UserFunctionValue:
+                if id(value) not in checking:
+                    checking.add(id(value))
+                    fns.append(id(value.code))
+                    if not self._pure(value, checking, fns, lookups):
+                        return False
+            elif value is not EndOfLoopValue:
+                return False
+        return True
+
+    def get(self, key: tuple):
+        """The remembered result for key, or None."""
+        ret = self._results.get(key)
+        if ret is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(key)
+        return ret
+
+    def add(self, key: tuple, value):
+        if type(value) not in _number_types:
+            return
+        self._results[key] = value
+        if len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    def report(self) -> str:
+        return (
+            "Remembered results of pure functions: %d hits, %d misses " +
+            "(%.0f%% hit rate), %d remembered\n"
+        ) % (
+            self.hits,
+            self.misses,
+            self.hit_rate() * 100,
+            len(self._results),
+        )
@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Iterable
+
+from graftlib.arrayvalue import ArrayValue
+from graftlib.dot import Dot
+from graftlib.env import Env
+from graftlib.frameenv import FrameEnv
+from graftlib.line import Line
+from graftlib.numberarray import NumberArray
+from graftlib.numberrange import NumberRange
+from graftlib.numbervalue import NumberValue
+from graftlib.programenv import ProgramEnv
+from graftlib.stringvalue import StringValue
+from graftlib.turtlestate import TurtleEnv
+from graftlib.userfunctionvalue import UserFunctionValue
+
+
+# Rough sizes in bytes of the things a program can make, on 64-bit
+# CPython.  These only need to be good enough to stop a program before
+# it uses up all the memory on the machine.
+
+number_bytes = 72       # A NumberValue holding a float
+slot_bytes = 8          # Each item in a list or tuple
+packed_bytes = 8        # Each number in a NumberArray
+array_bytes = 120       # An ArrayValue holding an empty list
+string_bytes = 100      # A StringValue, plus 1 per character
+env_bytes = 400         # An Env, plus env_item_bytes per variable
+env_item_bytes = 100
+closure_bytes = 100     # A UserFunctionValue
+stroke_bytes = 300      # A Line or Dot, including its Pts
+
+
+def approx_bytes(roots: Iterable) -> int:
+    """
+    Return roughly how many bytes are used by the values, Envs, strokes,
+    and lists, tuples and deques of these (e.g. evaluator stacks) in
+    roots, and everything they refer to.  Anything referred to more than
+    once is only counted once.  Native functions and code are not
+    counted, since they are shared by every program.
+    """
+    ret = 0
+    seen = set()
+    todo = list(roots)
+    while todo:
+        obj = todo.pop()
+        typ = type(obj)
+        if typ in (float, int):
+            pass
+        elif typ == NumberValue:
+            ret += number_bytes
+        elif id(obj) in seen:
+            pass
+        else:
+            seen.add(id(obj))
+            if typ in (list, tuple, deque):
+                ret += slot_bytes * len(obj)
+                todo.extend(obj)
+            elif typ == ArrayValue:
+                ret += array_bytes
+                if type(obj.value) == NumberRange:
+                    ret += number_bytes
+                elif type(obj.value) == NumberArray:
+                    ret += packed_bytes * len(obj.value)
+                else:
+                    todo.append(obj.value)
+            elif typ == StringValue:
+                ret += string_bytes + len(obj.value)
+            elif typ == UserFunctionValue:
+                ret += closure_bytes
+                todo.append(obj.env)
+            elif typ == ProgramEnv:
+                todo.append(obj.env)
+                todo.append(obj.strokes())
+            elif typ in (Env, TurtleEnv, FrameEnv):
+                items = obj.local_items()
+                ret += env_bytes + env_item_bytes * len(items)
+                todo.extend(items.values())
+                if obj.parent() is not None:
+                    todo.append(obj.parent())
+            elif typ in (Line, Dot):
+                ret += stroke_bytes
+    return ret
+
+
+def one_stroke(_env, _args) -> int:
+    """The memory allocated by a native function that draws a stroke."""
+    return stroke_bytes
+
+
+def add_to_array(_env, args) -> int:
+    """
+    The memory allocated by Add: one more item, or the whole array if it
+    was a Range that has to be turned into a list first.
+    """
+    array = args[0]
+    if type(array) == ArrayValue and type(array.value) == NumberRange:
+        return (slot_bytes + number_bytes) * (len(array.value) + 1)
+    elif type(array) == ArrayValue and type(array.value) == NumberArray:
+        return packed_bytes
+    else:
+        return slot_bytes + number_bytes
+
+
+def number_array(_env, args) -> int:
+    """
+    The memory allocated by a maths function: an array of results as
+    long as the longest array it was given, if any.
+    """
+    return max(
+        (
+            array_bytes + packed_bytes * len(arg.value)
+            for arg in args
+            if type(arg) == ArrayValue
+        ),
+        default=0,
+    )
+
+
+# An [x, y] made by Nearest, Centre or Within
+point_bytes = array_bytes + 2 * packed_bytes
+
+
+def one_point(_env, _args) -> int:
+    """The memory allocated by Nearest or Centre: an [x, y]."""
+    return point_bytes
+
+
+def fork_points(env, _args) -> int:
+    """
+    The memory allocated by Within: at most an [x, y] for every fork.
+    """
+    forks = env.forks
+    num = 0 if forks is None else len(forks.grid().positions)
+    return array_bytes + (slot_bytes + point_bytes) * num
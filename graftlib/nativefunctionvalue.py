@@ -1,6 +1,36 @@
+import inspect
+from typing import Callable, List, Optional
+
 import attr
 
 
 @attr.s
 class NativeFunctionValue:
+    """
+    A function written in Python.  It is called with the env, followed by
+    its arguments.  If unboxed is True, numbers are passed to it (and may
+    be returned from it) as plain floats instead of NumberValues.
+
+    If it may allocate a lot of memory, allocates is a function that takes
+    the env and the list of arguments and returns roughly how many bytes
+    a call with them will allocate (see graftlib.memory).
+
+    If draws is True, it adds a stroke to the env, so the evaluator may
+    pause after calling it (see eval_cell.Execution).
+
+    If pure is True, what it does depends only on its arguments, and it
+    changes nothing (not even the arguments), so user functions that call
+    it may have their results remembered (see graftlib.memo).
+
+    params is the names of py_fn's arguments after the env, worked out
+    once here rather than on every call.
+    """
     py_fn = attr.ib()
+    unboxed: bool = attr.ib(default=False)
+    allocates: Optional[Callable] = attr.ib(default=None)
+    draws: bool = attr.ib(default=False)
+    pure: bool = attr.ib(default=False)
+    params: List[str] = attr.ib(init=False, cmp=False, repr=False)
+
+    def __attrs_post_init__(self):
+        self.params = inspect.getfullargspec(self.py_fn).args[1:]
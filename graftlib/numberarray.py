@@ -0,0 +1,80 @@
+from array import array
+from itertools import repeat
+
+from graftlib.numbervalue import NumberValue
+
+
+class NumberArray:
+    """
+    A sequence of NumberValues, stored packed as plain floats in an
+    array('d').  Arithmetic on arrays and the maths functions make these,
+    working on all the numbers at once instead of boxing each one.
+    """
+
+    def __init__(self, values=()):
+        if type(values) != array:
+            values = array("d", values)
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return NumberValue(self.values[index])
+
+    def __iter__(self):
+        return map(NumberValue, self.values)
+
+    def append(self, item: NumberValue):
+        self.values.append(item.value)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "NumberArray(%s)" % list(self.values)
+
+
+def numbers(seq) -> array:
+    """
+    The numbers in seq (an ArrayValue's value) as an array('d'), or an
+    error if it contains anything else.
+    """
+    if type(seq) == NumberArray:
+        return seq.values
+    try:
+        return array("d", (item.value for item in seq))
+    except (AttributeError, TypeError):
+        raise Exception(
+            "Expected an array of numbers, but got: %s." % (seq,))
+
+
+def apply(fn, *args) -> NumberArray:
+    """
+    Call fn with each set of corresponding numbers in args, which may be
+    array('d')s, all the same length, or single numbers that are passed
+    every time, and return a NumberArray of the results.  The loop runs
+    inside map(), so it is much faster than a For loop in Graft code.
+    """
+    length = None
+    for arg in args:
+        if type(arg) == array:
+            if length is None:
+                length = len(arg)
+            elif len(arg) != length:
+                raise Exception(
+                    "Expected arrays of the same length, but got " +
+                    "lengths %d and %d." % (length, len(arg))
+                )
+    return NumberArray(
+        array(
+            "d",
+            map(
+                fn,
+                *(
+                    arg if type(arg) == array else repeat(arg, length)
+                    for arg in args
+                )
+            )
+        )
+    )
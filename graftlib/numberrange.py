@@ -0,0 +1,29 @@
+import math
+
+from graftlib.numbervalue import NumberValue
+
+
+class NumberRange:
+    """
+    A read-only sequence of the NumberValues 0, 1, 2... up to (but not
+    including) stop.  The values are made on demand, so a long Range
+    takes up no more memory than a short one.
+    """
+
+    def __init__(self, stop: float):
+        self._range = range(max(0, math.ceil(stop)))
+
+    def __len__(self):
+        return len(self._range)
+
+    def __getitem__(self, index):
+        return NumberValue(float(self._range[index]))
+
+    def __iter__(self):
+        return (NumberValue(float(i)) for i in self._range)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "NumberRange(%d)" % len(self._range)
@@ -1,7 +1,8 @@
-from typing import List
+from typing import List, Optional
 import attr
 
 from graftlib.peekablestream import PeekableStream
+from graftlib.sourcepos import SourcePos
 from graftlib.labeltree import LabelTree
 from graftlib.lex_cell import (
     AssignmentToken,
@@ -26,12 +27,14 @@ from graftlib.lex_cell import (
 @attr.s
 class ArrayTree:
     value: List = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class AssignmentTree:
     symbol = attr.ib()
     value = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
@@ -39,28 +42,33 @@ class ModifyTree:
     operation: str = attr.ib()
     symbol = attr.ib()
     value = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class NegativeTree:
     value = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class NumberTree:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class FunctionCallTree:
     fn = attr.ib()
     args: List = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class FunctionDefTree:
     params: List = attr.ib()
     body: List = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
@@ -68,16 +76,24 @@ class OperationTree:
     operation: str = attr.ib()
     left = attr.ib()
     right = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class StringTree:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
 
 
 @attr.s
 class SymbolTree:
     value: str = attr.ib()
+    pos: Optional[SourcePos] = attr.ib(default=None, cmp=False, repr=False)
+
+
+def _pos(prev, tok):
+    """The position of an expression that starts with prev, if any."""
+    return tok.pos if prev is None else prev.pos
 
 
 class _Parser:
@@ -96,37 +112,39 @@ class _Parser:
             return prev
         self.tokens.move_next()
         if typ == NumberToken and prev is None:
-            return self.next_expression(NumberTree(tok.value))
+            return self.next_expression(NumberTree(tok.value, tok.pos))
         elif typ == StringToken and prev is None:
-            return self.next_expression(StringTree(tok.value))
+            return self.next_expression(StringTree(tok.value, tok.pos))
         elif typ == SymbolToken and prev is None:
-            return self.next_expression(SymbolTree(tok.value))
+            return self.next_expression(SymbolTree(tok.value, tok.pos))
         elif typ == OperatorToken:
             nxt = self.next_expression(None)
             if prev is None and tok.value == "-":
-                return self.next_expression(NegativeTree(nxt))
-            return self.next_expression(OperationTree(tok.value, prev, nxt))
+                return self.next_expression(NegativeTree(nxt, tok.pos))
+            return self.next_expression(
+                OperationTree(tok.value, prev, nxt, _pos(prev, tok)))
         elif typ == LabelToken:
-            return self.next_expression(LabelTree())
+            return self.next_expression(LabelTree(tok.pos))
         elif typ == StartParamListToken:
             args = self.multiple_expressions(
                 ListSeparatorToken, EndParamListToken)
-            return self.next_expression(FunctionCallTree(prev, args))
+            return self.next_expression(
+                FunctionCallTree(prev, args, _pos(prev, tok)))
         elif typ == StartFunctionDefToken:
             params = self.parameters_list()
             body = self.multiple_expressions(
                 StatementSeparatorToken, EndFunctionDefToken)
-            return self.next_expression(FunctionDefTree(params, body))
+            return self.next_expression(FunctionDefTree(params, body, tok.pos))
         elif typ == StartArrayToken:
             contents = self.multiple_expressions(
                 ListSeparatorToken, EndArrayToken)
-            return self.next_expression(ArrayTree(contents))
+            return self.next_expression(ArrayTree(contents, tok.pos))
         elif typ == AssignmentToken:
             if type(prev) != SymbolTree:
                 raise Exception(
                     "You can't assign to anything except a symbol.")
             nxt = self.next_expression(None)
-            return self.next_expression(AssignmentTree(prev, nxt))
+            return self.next_expression(AssignmentTree(prev, nxt, prev.pos))
         elif typ == ModifyToken:
             if type(prev) != SymbolTree:
                 raise Exception(
@@ -135,7 +153,8 @@ class _Parser:
                     )
                 )
             nxt = self.next_expression(None)
-            return self.next_expression(ModifyTree(tok.value, prev, nxt))
+            return self.next_expression(
+                ModifyTree(tok.value, prev, nxt, prev.pos))
         elif typ == StatementSeparatorToken:
             # Ignore whitespace anywhere it wasn't expected
             return self.next_expression(prev)
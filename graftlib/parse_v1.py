@@ -45,7 +45,7 @@ class Number:
 class Modify:
     sym: str = attr.ib()
     op: str = attr.ib()
-    value = attr.ib(None, convert=lambda x: Number("10") if x is None else x)
+    value = attr.ib(None, converter=lambda x: Number("10") if x is None else x)
 
 
 @attr.s
@@ -235,4 +235,8 @@ def parse_v1(tokens):
 
 def _parse_peekable(it: Peekable, end_tok_type):
     while True:
-        yield _Parser(it, end_tok_type, False).next_tree()
+        try:
+            tree = _Parser(it, end_tok_type, False).next_tree()
+        except StopIteration:
+            return
+        yield tree
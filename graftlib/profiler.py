@@ -0,0 +1,152 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+class Profiler:
+    """
+    Records where time goes while a program runs and is drawn.
+
+    Time is divided into named stages (e.g. "interpret", "optimise",
+    "animate", "rasterise", "encode").  Stages may be nested, e.g. the
+    optimiser asks the interpreter for the next frame, and each stage's
+    summary time excludes the time spent in stages nested inside it.
+
+    We also count statements run by each fork, forks created and
+    evicted, and strokes drawn in each frame.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.start_time = clock()
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+        self.stage_calls: Dict[str, int] = defaultdict(int)
+        self.fork_statements: Dict[int, int] = defaultdict(int)
+        self.forks_created = 0
+        self.forks_evicted = 0
+        self.frame_strokes: List[int] = []
+        self.frame_times: List[float] = []
+        # (name, start, duration) of each stage run, for the trace
+        self.events: List = []
+        # [name, start, time spent in nested stages] for each open stage
+        self._open: List = []
+
+    def begin(self, name: str):
+        self._open.append([name, self.clock(), 0.0])
+
+    def end(self):
+        name, start, nested = self._open.pop()
+        duration = self.clock() - start
+        self.stage_seconds[name] += duration - nested
+        self.stage_calls[name] += 1
+        self.events.append((name, start, duration))
+        if self._open:
+            self._open[-1][2] += duration
+
+    @contextmanager
+    def stage(self, name: str):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterable:
+        """Yield the items of iterable, timing each one as stage name."""
+        it = iter(iterable)
+        while True:
+            self.begin(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.end()
+            yield item
+
+    def statement(self, fork_id: int):
+        self.fork_statements[fork_id] += 1
+
+    def fork_created(self):
+        self.forks_created += 1
+
+    def forks_were_evicted(self, num: int):
+        self.forks_evicted += num
+
+    def frame(self, num_strokes: int):
+        self.frame_strokes.append(num_strokes)
+        self.frame_times.append(self.clock())
+
+    def summary(self) -> dict:
+        return {
+            "stages": {
+                name: {
+                    "seconds": self.stage_seconds[name],
+                    "calls": self.stage_calls[name],
+                }
+                for name in self.stage_seconds
+            },
+            "fork_statements": dict(self.fork_statements),
+            "forks_created": self.forks_created,
+            "forks_evicted": self.forks_evicted,
+            "frames": len(self.frame_strokes),
+            "strokes": sum(self.frame_strokes),
+            "frame_strokes": self.frame_strokes,
+        }
+
+    def trace(self) -> dict:
+        """
+        Return the stages and stroke counts in Chrome's trace event
+        format, which can be loaded into chrome://tracing or Perfetto.
+        """
+        def micros(t):
+            return (t - self.start_time) * 1000000
+
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": micros(start),
+                "dur": duration * 1000000,
+                "pid": 0,
+                "tid": 0,
+            }
+            for name, start, duration in self.events
+        ]
+        events.extend(
+            {
+                "name": "strokes",
+                "ph": "C",
+                "ts": micros(t),
+                "pid": 0,
+                "args": {"strokes": strokes},
+            }
+            for t, strokes in zip(self.frame_times, self.frame_strokes)
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_json(self, profile_format: str) -> str:
+        if profile_format == "trace":
+            return json.dumps(self.trace())
+        else:
+            return json.dumps(self.summary(), indent=4, sort_keys=True)
+
+
+def stage(profiler: Optional[Profiler], name: str):
+    """
+    Return a context manager timing name with profiler, or doing nothing
+    if profiler is None.
+    """
+    if profiler is None:
+        return nullcontext()
+    else:
+        return profiler.stage(name)
+
+
+def iterate(profiler: Optional[Profiler], name: str, iterable: Iterable):
+    if profiler is None:
+        return iterable
+    else:
+        return profiler.iterate(name, iterable)
@@ -1,5 +1,8 @@
 import attr
 
+from graftlib.frameenv import FrameEnv
+from graftlib.turtlestate import EnvTurtleState, turtle_names
+
 
 @attr.s
 class ProgramEnv:
@@ -10,12 +13,16 @@ class ProgramEnv:
     syntax.
 
     Allows adding strokes to the output by calling stroke().
+
+    forks is the ForkPositions (see graftlib.forkgrid) telling us where
+    the other forks are, or None if we are not running alongside any.
     """
 
     env = attr.ib()
     rand = attr.ib()
     fork_callback = attr.ib()
     eval_expr = attr.ib()
+    forks = attr.ib(default=None)
     _strokes = attr.ib(default=attr.Factory(list))
 
     def parent(self):
@@ -27,20 +34,35 @@ class ProgramEnv:
             self.rand,
             self.fork_callback,
             self.eval_expr,
+            self.forks,
         )
 
-    def make_child(self):
-        return ProgramEnv(
-            self.env.make_child(),
-            self.rand,
-            self.fork_callback,
-            self.eval_expr,
-            self._strokes,
-        )
+    def make_child(self, items=None):
+        return FrameEnv(self, self, {} if items is None else items)
+
+    def turtle(self):
+        """
+        The TurtleState holding our graft variables, or, if they are
+        hidden by a function's parameters or local variables, something
+        that looks like one but reads and writes them through the Envs.
+        """
+        env = self.env
+        while env.parent() is not None:
+            if not turtle_names.isdisjoint(env.local_items()):
+                return EnvTurtleState(self.env)
+            env = env.parent()
+        while type(env) == ProgramEnv:
+            env = env.env
+        turtle = getattr(env, "turtle", None)
+        return EnvTurtleState(self.env) if turtle is None else turtle
 
     def stroke(self, st):
         self._strokes.append(st)
 
+    def strokes(self):
+        """The strokes added since clear_strokes was last called."""
+        return self._strokes
+
     def clear_strokes(self):
         """
         Returns the collected strokes and clears
@@ -61,6 +83,9 @@ class ProgramEnv:
             self.env.set("yprev", self.env.get("y"))
         return self.env.set(name, value)
 
+    def _try_update(self, name, value):
+        return self.env._try_update(name, value)
+
     def set_new(self, name, value):
         return self.env.set_new(name, value)
 
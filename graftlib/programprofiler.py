@@ -0,0 +1,125 @@
+from collections import defaultdict
+import time
+from typing import Dict, List, Optional
+
+from graftlib.compile_cell import Code
+
+
+class ProgramProfiler:
+    """
+    Counts calls to, and time spent in, each of a Graft program's own
+    functions and top-level statements, so that people can find out which
+    parts of their program are slow.
+
+    The evaluator tells us when it enters and leaves each frame.  Frames
+    for the loops inside T and For are entered with code=None, and the
+    time spent in them outside the functions they call is counted as part
+    of the function that called T or For.
+
+    When the evaluator pauses a statement to let another fork run, it
+    suspends the statement's frames, and the time until it unsuspends
+    them is not counted as part of them.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # Everything is keyed on id(code), since different functions may
+        # have identical Code.
+        self.codes: Dict[int, Code] = {}
+        self.calls: Dict[int, int] = defaultdict(int)
+        self.self_seconds: Dict[int, float] = defaultdict(float)
+        self.total_seconds: Dict[int, float] = defaultdict(float)
+        # How many times each Code is on the stack, so that time inside
+        # recursive calls is only counted once in total_seconds.
+        self._active: Dict[int, int] = defaultdict(int)
+        # [code id, start, time spent in nested frames] for each open frame
+        self._open: List = []
+
+    def enter(self, code: Optional[Code]):
+        if code is None:
+            key = None
+        else:
+            key = id(code)
+            self.codes[key] = code
+            self._active[key] += 1
+        self._open.append([key, self.clock(), 0.0])
+
+    def leave(self):
+        key, start, nested = self._open.pop()
+        duration = self.clock() - start
+        if key is None:
+            nested_in_parent = nested
+        else:
+            self.calls[key] += 1
+            self.self_seconds[key] += duration - nested
+            self._active[key] -= 1
+            if self._active[key] == 0:
+                self.total_seconds[key] += duration
+            nested_in_parent = duration
+        if self._open:
+            self._open[-1][2] += nested_in_parent
+
+    def depth(self) -> int:
+        """How many frames are open."""
+        return len(self._open)
+
+    def unwind(self, depth: int):
+        """
+        Leave frames until only depth are open, e.g. after an error
+        inside some functions.
+        """
+        while len(self._open) > depth:
+            self.leave()
+
+    def suspend(self, depth: int) -> List:
+        """
+        Close all but depth frames without finishing them, returning
+        them so they can be passed to unsuspend() later.
+        """
+        now = self.clock()
+        ret = self._open[depth:]
+        del self._open[depth:]
+        for rec in ret:
+            rec[1] = now - rec[1]  # Time spent so far
+            if rec[0] is not None:
+                self._active[rec[0]] -= 1
+        return ret
+
+    def unsuspend(self, records: List):
+        now = self.clock()
+        for rec in records:
+            rec[1] = now - rec[1]  # Pretend we started that long ago
+            if rec[0] is not None:
+                self._active[rec[0]] += 1
+        self._open.extend(records)
+
+    def eval_expr(self, eval_expr):
+        """
+        Wrap eval_expr (e.g. eval_cell), returning a function that runs
+        top-level statements while recording what they do.
+        """
+        def profiled_eval_expr(env, code, pause=False):
+            if pause:
+                return eval_expr(env, code, self, pause=True)
+            else:
+                return eval_expr(env, code, self)
+        return profiled_eval_expr
+
+    def report(self, limit: Optional[int] = None) -> str:
+        """
+        Describe the functions and statements we saw, the ones that
+        took the most time (excluding functions they called) first.
+        """
+        keys = sorted(
+            self.calls, key=lambda k: self.self_seconds[k], reverse=True)
+        if limit is not None:
+            keys = keys[:limit]
+        ret = "%10s %10s %8s  %s\n" % ("self ms", "total ms", "calls", "code")
+        for key in keys:
+            ret += "%10.2f %10.2f %8d  %s\n" % (
+                self.self_seconds[key] * 1000,
+                self.total_seconds[key] * 1000,
+                self.calls[key],
+                self.codes[key].description(),
+            )
+        return ret
@@ -0,0 +1,33 @@
+import random
+
+
+class RandomStream:
+    """
+    A random number generator for one fork of a program, called like
+    random.uniform.  When the fork forks, the new fork gets its own
+    stream from split(), so each fork's random numbers depend only on
+    the seed and on what that fork did, and not on how many numbers
+    other forks used before it.
+    """
+
+    def __init__(self, seed: int):
+        self._random = random.Random(seed)
+
+    def __call__(self, a: float, b: float) -> float:
+        return self._random.uniform(a, b)
+
+    def split(self) -> "RandomStream":
+        """Return a new stream, seeded from this one."""
+        return RandomStream(self._random.getrandbits(64))
+
+
+def split(rand):
+    """
+    Return the random number generator for a new fork of a program
+    using rand.  Generators that can't be split (e.g. random.uniform)
+    are shared with the new fork.
+    """
+    if type(rand) == RandomStream:
+        return rand.split()
+    else:
+        return rand
@@ -0,0 +1,11 @@
+import attr
+
+
+@attr.s(cmp=True, frozen=True)
+class SourcePos:
+    """A position in a program's source code.  Both start at 1."""
+    line: int = attr.ib()
+    column: int = attr.ib()
+
+    def __str__(self):
+        return "line %d, column %d" % (self.line, self.column)
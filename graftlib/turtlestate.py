@@ -0,0 +1,126 @@
+from graftlib.env import Env
+from graftlib.numbervalue import NumberValue
+
+
+class TurtleState:
+    """
+    The graft variables that say where a fork's turtle is and how it
+    draws.  Drawing a stroke reads and writes these fields directly,
+    instead of looking each variable up in the Env.
+
+    xprev and yprev are None until x or y is first changed.
+    """
+
+    __slots__ = (
+        "f",      # Fork ID
+        "x",      # x coord
+        "y",      # y coord
+        "d",      # direction in degrees
+        "s",      # step size
+        "r",      # red   0-100 (and 0 to -100)
+        "g",      # green 0-100 (and 0 to -100)
+        "b",      # blue  0-100 (and 0 to -100)
+        "a",      # alpha 0-100 (and 0 to -100)
+        "z",      # brush size
+        "xprev",  # x before it last changed
+        "yprev",  # y before it last changed
+    )
+
+    def __init__(self):
+        self.f = NumberValue(0)
+        self.x = NumberValue(0.0)
+        self.y = NumberValue(0.0)
+        self.d = NumberValue(0.0)
+        self.s = NumberValue(10.0)
+        self.r = NumberValue(0.0)
+        self.g = NumberValue(0.0)
+        self.b = NumberValue(0.0)
+        self.a = NumberValue(100.0)
+        self.z = NumberValue(5.0)
+        self.xprev = None
+        self.yprev = None
+
+    def clone(self):
+        ret = TurtleState()
+        for name in TurtleState.__slots__:
+            setattr(ret, name, getattr(self, name))
+        return ret
+
+
+turtle_names = frozenset(TurtleState.__slots__)
+
+
+class TurtleEnv(Env):
+    """
+    The outermost Env of a graft program.  The graft variables live in
+    a TurtleState, and get() and set() etc. are views onto it, so Graft
+    code sees them like any other variable.
+    """
+
+    def __init__(self, stdin=None, stdout=None, stderr=None, turtle=None):
+        super().__init__(stdin=stdin, stdout=stdout, stderr=stderr)
+        self.turtle = TurtleState() if turtle is None else turtle
+
+    def clone(self):
+        ret = TurtleEnv(
+            stdin=self.stdin,
+            stdout=self.stdout,
+            stderr=self.stderr,
+            turtle=self.turtle.clone(),
+        )
+        for k, v in self._items.items():
+            ret.set_new(k, v)
+        return ret
+
+    def get(self, name):
+        if name in turtle_names:
+            value = getattr(self.turtle, name)
+            if value is None:
+                value = NumberValue(0.0)
+                setattr(self.turtle, name, value)
+            return value
+        return super().get(name)
+
+    def _try_update(self, name, value):
+        if name in turtle_names:
+            setattr(self.turtle, name, value)
+            return True
+        return super()._try_update(name, value)
+
+    def set_new(self, name, value):
+        if name in turtle_names:
+            setattr(self.turtle, name, value)
+        else:
+            super().set_new(name, value)
+
+    def contains(self, name):
+        if name in turtle_names:
+            return getattr(self.turtle, name) is not None
+        return super().contains(name)
+
+    def local_items(self):
+        ret = dict(self._items)
+        for name in TurtleState.__slots__:
+            value = getattr(self.turtle, name)
+            if value is not None:
+                ret[name] = value
+        return ret
+
+
+class EnvTurtleState:
+    """
+    Looks like a TurtleState, but reads and writes the graft variables
+    in env.  Used when a function has a parameter or local variable with
+    the same name as one of them, which hides the fork's own.
+    """
+
+    __slots__ = ("_env",)
+
+    def __init__(self, env):
+        object.__setattr__(self, "_env", env)
+
+    def __getattr__(self, name):
+        return self._env.get(name)
+
+    def __setattr__(self, name, value):
+        self._env.set(name, value)
@@ -1,8 +1,9 @@
 import subprocess
-from typing import Tuple
+from typing import Optional, Tuple
 import cairo
 
 from graftlib.animation import Animation
+from graftlib.profiler import Profiler, stage
 from graftlib.world import World
 from graftlib.ui.cairo_draw import cairo_draw
 
@@ -14,20 +15,26 @@ class GifUi:
             filename: str,
             world: World,
             image_size: Tuple[int, int],
+            profiler: Optional[Profiler] = None,
     ):
         self.animation = animation
         self.filename = filename
         self.world = world
         self.image_size = image_size
+        self.profiler = profiler
+
+    def _step(self):
+        with stage(self.profiler, "animate"):
+            return self.animation.step()
 
     def run(self):
         with self.world.fs.tmpdir() as tmpdir:
             n = 0
-            more_frames = self.animation.step()
+            more_frames = self._step()
             while more_frames:
                 n += 1
                 self._draw_frame(n, tmpdir)
-                more_frames = self.animation.step()
+                more_frames = self._step()
 
             # Copy the frame images so we can examine them
             # args = [
@@ -60,7 +67,8 @@ class GifUi:
                 self.filename
             ]
             # self.world.stdout.write("$ %s\n" % (" ".join(args)))
-            subprocess.run(args)
+            with stage(self.profiler, "encode"):
+                subprocess.run(args)
 
     def _draw_frame(self, frame_number, tmpdir):
         ims = cairo.ImageSurface(
@@ -68,14 +76,16 @@ class GifUi:
 
         cairo_cr = cairo.Context(ims)
 
-        cairo_draw(
-            self.animation,
-            cairo_cr,
-            ims.get_width(),
-            ims.get_height(),
-        )
+        with stage(self.profiler, "rasterise"):
+            cairo_draw(
+                self.animation,
+                cairo_cr,
+                ims.get_width(),
+                ims.get_height(),
+            )
 
         ret = "{dir_}/frame_{num:04}.png".format(dir_=tmpdir, num=frame_number)
 
-        ims.write_to_png(ret)
+        with stage(self.profiler, "encode"):
+            ims.write_to_png(ret)
         return ret
@@ -6,6 +6,7 @@ from gi.repository import Gtk, GObject
 from typing import Optional, Tuple
 
 from graftlib.animation import Animation
+from graftlib.profiler import Profiler, stage
 from graftlib.ui.cairo_draw import cairo_draw
 
 
@@ -13,7 +14,12 @@ ms_per_frame = 50
 
 
 class Gtk3Ui:
-    def __init__(self, animation: Animation, image_size: Tuple[int, int]):
+    def __init__(
+            self,
+            animation: Animation,
+            image_size: Tuple[int, int],
+            profiler: Optional[Profiler] = None,
+    ):
         self.win = Gtk.Window(resizable=True)
         self.canvas = Gtk.DrawingArea()
         self.canvas.set_size_request(*image_size)
@@ -23,6 +29,7 @@ class Gtk3Ui:
         self.timeout_id = GObject.timeout_add(
             ms_per_frame, self.on_timeout, None)
         self.animation = animation
+        self.profiler = profiler
 
     def run(self):
         self.win.show_all()
@@ -30,15 +37,17 @@ class Gtk3Ui:
         return 0
 
     def on_draw(self, _win, cr, _user_data: Optional):
-        cairo_draw(
-            self.animation,
-            cr,
-            self.canvas.get_allocated_width(),
-            self.canvas.get_allocated_height(),
-        )
+        with stage(self.profiler, "rasterise"):
+            cairo_draw(
+                self.animation,
+                cr,
+                self.canvas.get_allocated_width(),
+                self.canvas.get_allocated_height(),
+            )
 
     def on_timeout(self, _user_data):
-        more_frames = self.animation.step()
+        with stage(self.profiler, "animate"):
+            more_frames = self.animation.step()
         self.canvas.queue_draw()
         while Gtk.events_pending():
             Gtk.main_iteration_do(True)
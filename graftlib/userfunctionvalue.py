@@ -0,0 +1,18 @@
+from typing import List, Tuple
+
+import attr
+
+
+@attr.s
+class UserFunctionValue:
+    params: List = attr.ib()
+    code = attr.ib()
+    env = attr.ib()
+    # The names of params, which calls bind the arguments to
+    param_names: Tuple[str, ...] = attr.ib(
+        default=attr.Factory(
+            lambda self: tuple(p.value for p in self.params),
+            takes_self=True,
+        ),
+        cmp=False,
+    )
@@ -0,0 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import os
+from typing import Callable, Optional
+
+
+def _warm_up(module_name: str):
+    """
+    Run in each worker process when it starts, so that imports (GTK,
+    Cairo etc.) happen once per worker, not once for every job.
+    """
+    importlib.import_module(module_name)
+
+
+def warm_pool(
+        num_workers: Optional[int],
+        fn: Callable,
+) -> ProcessPoolExecutor:
+    """
+    A pool of num_workers processes (default: one per CPU) for running
+    fn, each of which imports the module fn is defined in as soon as it
+    starts, instead of when it is given its first job.
+    """
+    return ProcessPoolExecutor(
+        max_workers=num_workers or os.cpu_count(),
+        initializer=_warm_up,
+        initargs=(fn.__module__,),
+    )
@@ -0,0 +1,11 @@
+class FakeFs:
+    """Pretends to be a RealFs, keeping files in a dict of name: contents."""
+
+    def __init__(self, files=None):
+        self.files = {} if files is None else files
+
+    def read_file_or_none(self, file_name):
+        return self.files.get(file_name)
+
+    def write_file(self, file_name, file_contents):
+        self.files[file_name] = file_contents
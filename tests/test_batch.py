@@ -0,0 +1,81 @@
+from io import StringIO
+
+import pytest
+
+from graftlib.batch import (
+    BatchJob,
+    JobResult,
+    job_argv,
+    load_manifest,
+    main,
+    run_batch,
+)
+from graftlib.world import World
+
+from tests.fakefs import FakeFs
+
+
+def fake_render(job):
+    if "bad" in job.program:
+        return JobResult(job.gif, 0.5, 1, "Unknown symbol 'bad'")
+    return JobResult(job.gif, 0.25, 0)
+
+
+def test_Manifest_jobs_get_default_settings():
+    assert (
+        load_manifest(
+            '[{"program": "S()", "gif": "a.gif"},' +
+            ' {"program": "S()", "gif": "b.gif", "frames": 3, "seed": 2}]'
+        ) ==
+        [
+            BatchJob("S()", "a.gif"),
+            BatchJob("S()", "b.gif", frames=3, seed=2),
+        ]
+    )
+
+
+def test_Unknown_manifest_settings_are_an_error():
+    with pytest.raises(ValueError, match="Job 0"):
+        load_manifest('[{"program": "S()", "gif": "a.gif", "speed": 3}]')
+
+
+def test_Job_argv_includes_every_setting():
+    assert job_argv(BatchJob("-S()", "a.gif", seed=4)) == [
+        "./graft",
+        "--gif", "a.gif",
+        "--frames", "100",
+        "--width", "200",
+        "--height", "200",
+        "--syntax", "cell",
+        "--max-forks", "20",
+        "--seed", "4",
+        "--", "-S()",
+    ]
+
+
+def test_Batch_results_come_back_in_job_order():
+    jobs = [BatchJob("S()", "%d.gif" % i) for i in range(5)]
+    results = run_batch(jobs, 2, fake_render)
+    assert [result.gif for result in results] == [job.gif for job in jobs]
+
+
+def test_Failed_jobs_are_reported_and_fail_the_batch():
+    fs = FakeFs({
+        "manifest.json": (
+            '[{"program": "S()", "gif": "a.gif"},' +
+            ' {"program": "bad()", "gif": "b.gif"}]'
+        ),
+    })
+    world = World(
+        ["graft-batch", "--report", "report.json", "manifest.json"],
+        None,
+        StringIO(),
+        StringIO(),
+        None,
+        fs,
+    )
+    assert main(world, fake_render) == 1
+
+    assert "2 jobs, 1 failed" in world.stdout.getvalue()
+    assert "b.gif:\nUnknown symbol 'bad'" in world.stderr.getvalue()
+    assert '"status": 1' in fs.files["report.json"]
@@ -0,0 +1,72 @@
+from graftlib.bench import (
+    BenchProgram,
+    StageResult,
+    bench_program,
+    compare_to_baseline,
+    parse_animation_script,
+    results_from_json,
+    results_to_json,
+)
+
+
+def test_Animation_script_program_and_options_are_read():
+    script = (
+        "./graft '\ndd=0\n^\nT(11,F)\n' --max-forks=10000 --frames=40 " +
+        '"$@"\n'
+    )
+    assert (
+        parse_animation_script("explosion", script) ==
+        BenchProgram(
+            "explosion", "\ndd=0\n^\nT(11,F)\n", frames=40, max_forks=10000)
+    )
+
+
+def test_Animation_script_program_may_come_after_double_dash():
+    script = './graft \\\n    "$@" \\\n    --frames=20 \\\n    -- \'S()\'\n'
+    assert (
+        parse_animation_script("windmill", script) ==
+        BenchProgram("windmill", "S()", frames=20)
+    )
+
+
+def test_Every_stage_is_measured():
+    results = bench_program(BenchProgram("c", "S() d+=10", frames=5), 1, 0)
+    assert list(results)[:6] == [
+        "lex", "parse", "compile", "run", "optimise", "animate"
+    ]
+    assert results["run"].items == 5
+    assert results["run"].strokes == 5
+    assert results["lex"].items == 7
+    assert results["lex"].allocations >= 7
+
+
+def test_Results_survive_being_saved_as_json():
+    results = {"c": {"lex": StageResult(0.5, 7, 0, 1024, 30)}}
+    assert results_from_json(results_to_json(results)) == results
+
+
+def test_Baselines_saved_without_allocations_can_be_read():
+    results = results_from_json(
+        '{"c": {"lex": {"seconds": 0.5, "items": 7, "strokes": 0, ' +
+        '"peak_bytes": 1024}}}'
+    )
+    assert results == {"c": {"lex": StageResult(0.5, 7, 0, 1024, 0)}}
+
+
+def test_Slower_or_bigger_stages_are_regressions():
+    baseline = {"c": {
+        "lex": StageResult(1.0, 7, 0, 1000, 10),
+        "run": StageResult(1.0, 7, 0, 1000, 10),
+    }}
+    results = {
+        "c": {
+            "lex": StageResult(1.05, 7, 0, 1000, 11),
+            "run": StageResult(2.0, 7, 0, 2000, 20),
+        },
+        "new": {"lex": StageResult(9.0, 7, 0, 9000)},
+    }
+    assert compare_to_baseline(results, baseline, 0.1) == [
+        "c run: 2000.00ms is slower than baseline 1000.00ms",
+        "c run: peak 2000 bytes is more than baseline 1000 bytes",
+        "c run: 20 allocations is more than baseline 10",
+    ]
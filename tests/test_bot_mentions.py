@@ -0,0 +1,267 @@
+import asyncio
+from io import StringIO
+import time
+
+from graftbot.mentions import MentionAnswerer
+from graftbot.render_cache import RenderCache
+from graftbot.render_pool import RenderPool
+from graftlib.world import World
+
+from tests.fakefs import FakeFs
+
+
+def fake_render(program, gif_file):
+    if "bad" in program:
+        raise Exception("Unknown symbol 'bad'")
+    if "slow" in program:
+        time.sleep(0.5)
+    with open(gif_file, "w") as f:
+        f.write("GIF of " + program)
+    return gif_file
+
+
+class FakeMastodon:
+    """
+    Pretends to be the Mastodon API.  Fails the first failures calls, and
+    the first status_failures calls to status_post, refuses to attach
+    media to more than one toot if reuse_media is False, and refuses to
+    post error messages if refuse_errors is True.
+    """
+
+    def __init__(
+            self,
+            notifs,
+            failures=0,
+            status_failures=0,
+            reuse_media=True,
+            refuse_errors=False,
+    ):
+        self.notifs = notifs
+        self.failures = failures
+        self.status_failures = status_failures
+        self.reuse_media = reuse_media
+        self.refuse_errors = refuse_errors
+        self.since_ids = []
+        self.followed = []
+        self.media = []
+        self.statuses = []
+
+    def _maybe_fail(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise Exception("502 Bad Gateway")
+
+    def notifications(self, since_id):
+        self._maybe_fail()
+        self.since_ids.append(since_id)
+        return [
+            n for n in self.notifs
+            if since_id is None or int(n["id"]) > int(since_id)
+        ]
+
+    def account_follow(self, id_):
+        self._maybe_fail()
+        self.followed.append(id_)
+
+    def media_post(self, gif_file, description):
+        self._maybe_fail()
+        self.media.append(gif_file)
+        return {"id": "media%d" % len(self.media)}
+
+    def status_post(self, status, in_reply_to_id, media_ids=None):
+        self._maybe_fail()
+        if self.status_failures > 0:
+            self.status_failures -= 1
+            raise Exception("504 Gateway Timeout")
+        if not self.reuse_media and media_ids and any(
+                media_ids == s[2] for s in self.statuses):
+            # What Mastodon.py raises for an HTTP error
+            raise Exception(
+                "Mastodon API returned error", 422, "Unprocessable Entity",
+                "Media already attached")
+        if self.refuse_errors and "Error:" in status:
+            raise Exception("500 Internal Server Error")
+        self.statuses.append((in_reply_to_id, status, media_ids))
+        return {"id": "new%d" % len(self.statuses)}
+
+
+def _mention(id_, program, note=""):
+    return {
+        "id": id_,
+        "type": "mention",
+        "account": {"id": "acct" + id_, "acct": "user" + id_, "note": note},
+        "status": {"id": "status" + id_, "content": "@graft " + program},
+    }
+
+
+def _world():
+    return World([], None, StringIO(), StringIO(), None, FakeFs())
+
+
+def _poll(world, mastodon, cache, times=1, between=None):
+    """
+    Poll times times, calling between() after the mentions from each poll
+    have been answered.
+    """
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    async def run():
+        with RenderPool(2, fake_render) as pool:
+            answerer = MentionAnswerer(
+                world, mastodon, pool, cache, sleep=fake_sleep)
+            for _ in range(times):
+                await answerer.poll()
+                await answerer.finish()
+                if between is not None:
+                    between()
+
+    asyncio.run(run())
+    return sleeps
+
+
+def test_All_mentions_are_answered(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([
+        _mention("12", "S()"),
+        {"id": "11", "type": "favourite"},
+        _mention("10", "d+=10 S()"),
+    ])
+    _poll(world, mastodon, RenderCache(str(tmp_path)))
+
+    assert sorted(mastodon.followed) == ["acct10", "acct12"]
+    assert sorted(s[0] for s in mastodon.statuses) == [
+        "status10", "status12"]
+    assert len(mastodon.media) == 2
+    assert list(world.fs.files.values()) == ["12"]
+
+
+def test_Mentions_already_seen_are_not_answered_again(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([_mention("1", "S()"), _mention("2", "S()")])
+    _poll(world, mastodon, RenderCache(str(tmp_path)), times=2)
+
+    assert mastodon.since_ids == [None, "2"]
+    assert len(mastodon.statuses) == 2
+
+
+def test_Errors_are_tooted_back_and_do_not_stop_other_mentions(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([_mention("1", "bad()"), _mention("2", "S()")])
+    _poll(world, mastodon, RenderCache(str(tmp_path)))
+
+    statuses = dict((s[0], s) for s in mastodon.statuses)
+    assert statuses["status1"] == (
+        "status1",
+        "@user1 Error: 'Unknown symbol 'bad'' in program ' bad()'",
+        None,
+    )
+    assert statuses["status2"][2] == ["media1"]
+
+
+def test_Failed_api_calls_are_retried_with_backoff(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([_mention("1", "S()")], failures=3)
+    sleeps = _poll(world, mastodon, RenderCache(str(tmp_path)))
+
+    assert sleeps == [1.0, 2.0, 4.0]
+    assert [s[0] for s in mastodon.statuses] == ["status1"]
+    assert world.fs.files[list(world.fs.files)[0]] == "1"
+
+
+def test_Accounts_with_nobot_are_not_followed(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([_mention("1", "S()", "I am #nobot")])
+    _poll(world, mastodon, RenderCache(str(tmp_path)))
+
+    assert mastodon.followed == []
+    assert mastodon.statuses[0][0] == "status1"
+
+
+def test_The_same_program_is_rendered_and_uploaded_once(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([_mention("1", "S()"), _mention("2", "S()")])
+    cache = RenderCache(str(tmp_path))
+    _poll(world, mastodon, cache)
+
+    assert len(mastodon.media) == 1
+    assert [s[2] for s in mastodon.statuses] == [["media1"], ["media1"]]
+    assert len(list(tmp_path.glob("*.gif"))) == 1
+
+
+def test_Media_is_uploaded_again_if_it_cant_be_reused(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon(
+        [_mention("1", "S()"), _mention("2", "S()")], reuse_media=False)
+    cache = RenderCache(str(tmp_path))
+    _poll(world, mastodon, cache)
+
+    assert len(mastodon.media) == 2
+    assert sorted(s[2][0] for s in mastodon.statuses) == ["media1", "media2"]
+
+
+def test_Toots_that_fail_for_other_reasons_are_retried(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon(
+        [_mention("1", "S()")], status_failures=2, reuse_media=False)
+    _poll(world, mastodon, RenderCache(str(tmp_path)))
+
+    assert len(mastodon.media) == 1
+    assert mastodon.statuses == [
+        ("status1", "' S()' by @user1", ["media1"])]
+
+
+def test_Replies_are_posted_oldest_first(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon([
+        _mention("1", "slow S()"),
+        _mention("2", "bad()"),
+        _mention("3", "S()"),
+    ])
+    _poll(world, mastodon, RenderCache(str(tmp_path)))
+
+    assert [s[0] for s in mastodon.statuses] == [
+        "status1", "status2", "status3"]
+
+
+def test_Mentions_we_could_not_reply_to_are_tried_again(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon(
+        [_mention("1", "S()"), _mention("2", "bad()"), _mention("3", "S()")],
+        refuse_errors=True,
+    )
+    last_notifs = []
+
+    def between():
+        last_notifs.append(list(world.fs.files.values()))
+        mastodon.refuse_errors = False
+
+    _poll(world, mastodon, RenderCache(str(tmp_path)), 2, between)
+
+    assert [s[0] for s in mastodon.statuses] == [
+        "status1", "status3", "status2"]
+    assert last_notifs == [["1"], ["3"]]
+
+
+def test_Mentions_we_can_never_reply_to_are_given_up_on(tmp_path):
+    world = _world()
+    mastodon = FakeMastodon(
+        [_mention("1", "S()"), _mention("2", "bad()"), _mention("3", "S()")],
+        refuse_errors=True,
+    )
+    last_notifs = []
+
+    def between():
+        last_notifs.append(list(world.fs.files.values()))
+
+    cache = RenderCache(str(tmp_path))
+    _poll(world, mastodon, cache, 5, between)
+    # Start again, as if the bot was restarted
+    _poll(world, mastodon, cache)
+
+    # Tried on polls 1, 2 and 4
+    assert last_notifs == [["1"], ["1"], ["1"], ["3"], ["3"]]
+    assert [s[0] for s in mastodon.statuses] == ["status1", "status3"]
+    assert mastodon.since_ids[-1] == "3"
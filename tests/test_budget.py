@@ -0,0 +1,124 @@
+import functools
+
+import pytest
+
+from graftlib.budget import Budget, BudgetExceeded
+from graftlib.compile_cell import compile_cell
+from graftlib.compile_v1 import compile_v1
+from graftlib.eval_cell import eval_cell
+from graftlib.graftrun import graftrun
+from graftlib.lex_cell import lex_cell
+from graftlib.lex_v1 import lex_v1
+from graftlib.make_graft_env import make_graft_env
+from graftlib.parse_cell import parse_cell
+from graftlib.parse_v1 import parse_v1
+
+
+def run(program, budget):
+    env = make_graft_env()
+    for code in compile_cell(parse_cell(lex_cell(program))):
+        eval_cell(env, code, budget=budget)
+    return env
+
+
+def test_Calls_and_making_functions_use_up_steps():
+    budget = Budget(4, None)
+    run("f={} f() f() f()", budget)
+    with pytest.raises(BudgetExceeded, match="more than 4 steps"):
+        run("f()", budget)
+
+
+def test_Every_iteration_of_a_loop_uses_up_steps():
+    budget = Budget(2000, None)
+    with pytest.raises(BudgetExceeded):
+        run("T(1000,{})", budget)
+
+
+def test_A_huge_loop_that_never_draws_a_frame_is_stopped():
+    with pytest.raises(BudgetExceeded):
+        run("T(1000000000,{d+=1})", Budget(100000, None))
+
+
+def test_v1_loops_use_up_steps():
+    budget = Budget(10, None)
+    env = make_graft_env()
+    [code] = compile_v1(parse_v1(lex_v1("100:{+d}")))
+    with pytest.raises(BudgetExceeded):
+        eval_cell(env, code, budget=budget)
+
+
+def test_Running_past_the_deadline_is_an_error():
+    now = [0.0]
+    budget = Budget(None, 5, clock=lambda: now[0])
+    run("T(2000,{})", budget)
+    now[0] = 6.0
+    with pytest.raises(BudgetExceeded, match="more than 5 seconds"):
+        run("T(2000,{})", budget)
+
+
+def test_No_limits_means_no_errors():
+    run("T(5000,{})", Budget(None, None))
+
+
+def test_Growing_an_array_forever_runs_out_of_memory():
+    with pytest.raises(BudgetExceeded, match="more than 100000 bytes"):
+        run("a=[] T(1000000,{Add(a,1)})", Budget(None, None, 100000))
+
+
+def test_Adding_to_a_huge_range_fails_before_making_the_list():
+    with pytest.raises(BudgetExceeded, match="memory"):
+        run("Add(Range(1000000000),1)", Budget(None, None, 100000))
+
+
+def test_For_building_a_huge_array_runs_out_of_memory():
+    with pytest.raises(BudgetExceeded, match="memory"):
+        run("x=For(Range(100000),{:(i) i})", Budget(None, None, 100000))
+
+
+def test_Arithmetic_making_a_huge_array_runs_out_of_memory():
+    for program in ("q=Range(3000000)*2", "q=Range(3000000) q*=2"):
+        with pytest.raises(BudgetExceeded, match="memory"):
+            run(program, Budget(None, None, 1024 * 1024))
+
+
+def test_Arithmetic_on_small_arrays_fits_in_memory():
+    run("q=-Range(100)/2 q+=1", Budget(None, None, 1024 * 1024))
+
+
+def test_Memory_that_is_no_longer_used_does_not_count():
+    budget = Budget(None, None, 100000)
+    run("T(10000,{[1,2,3]})", budget)
+    assert budget.held_bytes < 100000
+
+
+def test_Forks_use_memory():
+    budget = Budget(None, None, 1000000)
+    with pytest.raises(BudgetExceeded, match="memory"):
+        list(
+            graftrun(
+                compile_cell(parse_cell(lex_cell("^ F()"))),
+                100,
+                lambda a, b: 0,
+                1000,
+                functools.partial(eval_cell, budget=budget),
+                None,
+                budget,
+            )
+        )
+
+
+def test_Finding_where_other_forks_are_uses_memory():
+    budget = Budget(None, None, 2000000)
+    with pytest.raises(BudgetExceeded, match="memory"):
+        list(
+            graftrun(
+                compile_cell(parse_cell(lex_cell(
+                    "T(200,F) ^ w=Within(1000000) S()"))),
+                10,
+                lambda a, b: 0,
+                1000,
+                functools.partial(eval_cell, budget=budget),
+                None,
+                budget,
+            )
+        )
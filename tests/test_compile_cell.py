@@ -0,0 +1,164 @@
+import pickle
+
+from graftlib.compile_cell import (
+    ADD,
+    CALL,
+    CONST,
+    LABEL,
+    LOAD,
+    MAKE_ARRAY,
+    MAKE_CLOSURE,
+    MODIFY,
+    NEG,
+    POP,
+    STORE,
+    CallSite,
+    Code,
+    FunctionCode,
+    compile_cell,
+    compile_expr,
+)
+from graftlib.labeltree import LabelTree
+from graftlib.lex_cell import lex_cell
+from graftlib.parse_cell import SymbolTree, parse_cell
+from graftlib.sourcepos import SourcePos
+from graftlib.stringvalue import StringValue
+
+
+# --- Utils ---
+
+
+def compiled(inp):
+    return list(compile_cell(parse_cell(lex_cell(inp))))
+
+
+def parse_one(inp):
+    [tree] = parse_cell(lex_cell(inp))
+    return tree
+
+
+def ops(inp):
+    return compile_expr(parse_one(inp)).ops
+
+
+# --- Compiling ---
+
+
+def test_Empty_program_compiles_to_nothing():
+    assert compiled("") == []
+
+
+def test_Number_compiles_to_a_constant():
+    assert ops("3") == (CONST, 3.0)
+
+
+def test_Negative_number_is_folded_into_a_constant():
+    assert ops("-3") == (CONST, -3.0)
+
+
+def test_Negative_expression_is_negated_at_runtime():
+    assert ops("-x") == (LOAD, "x", NEG, None)
+
+
+def test_String_compiles_to_a_constant():
+    assert ops("'foo'") == (CONST, StringValue("foo"))
+
+
+def test_Operation_pushes_both_sides_then_operates():
+    assert ops("x+2") == (LOAD, "x", CONST, 2.0, ADD, None)
+
+
+def test_Assignment_stores_the_value():
+    assert ops("x=2") == (CONST, 2.0, STORE, "x")
+
+
+def test_Modify_stores_the_operation_and_name():
+    assert ops("x+=2") == (CONST, 2.0, MODIFY, ("+=", "x"))
+
+
+def test_Function_call_pushes_function_then_args():
+    assert (
+        ops("f(1,x)") ==
+        (
+            LOAD, "f",
+            CONST, 1.0,
+            LOAD, "x",
+            CALL, CallSite(2, SymbolTree("f"), False),
+        )
+    )
+
+
+def test_Function_definition_makes_a_closure_of_compiled_body():
+    assert (
+        ops("{:(a) a 3}") ==
+        (
+            MAKE_CLOSURE,
+            FunctionCode(
+                [SymbolTree("a")],
+                Code((LOAD, "a", POP, None, CONST, 3.0)),
+            ),
+        )
+    )
+
+
+def test_Array_pushes_items_then_makes_array():
+    assert (
+        ops("[1,2]") ==
+        (
+            CONST, 1.0,
+            CONST, 2.0,
+            MAKE_ARRAY, 2,
+        )
+    )
+
+
+def test_Top_level_statements_discard_their_values():
+    [code] = compiled("x=2")
+    assert code.ops == (CONST, 2.0, STORE, "x", POP, None)
+
+
+def test_Calls_whose_results_are_discarded_are_marked():
+    assert (
+        ops("{f() g()}")[1].code.ops ==
+        (
+            LOAD, "f",
+            CALL, CallSite(0, SymbolTree("f"), True),
+            POP, None,
+            LOAD, "g",
+            CALL, CallSite(0, SymbolTree("g"), False),
+        )
+    )
+
+
+def test_Top_level_labels_are_left_for_the_running_program():
+    assert compiled("x=1 ^ S()")[1] == LabelTree()
+
+
+def test_Labels_inside_functions_compile_to_label_opcode():
+    fn_code = ops("{^}")[1]
+    assert fn_code.code.ops == (LABEL, None)
+
+
+def test_Disassembling_shows_opcode_names():
+    assert (
+        compile_expr(parse_one("x=-y")).disassemble() ==
+        [("LOAD", "y"), ("NEG", None), ("STORE", "x")]
+    )
+
+
+def test_Compiled_code_can_be_serialised():
+    code = compiled("x={:(a) a*2} x(3)")
+    assert pickle.loads(pickle.dumps(code)) == code
+
+
+def test_Functions_are_named_after_the_variable_they_are_assigned_to():
+    [_, code] = compiled("x=3\n sq={:(a) a*a}")
+    fn_code = code.ops[1].code
+    assert fn_code.name == "sq"
+    assert fn_code.pos == SourcePos(2, 5)
+    assert fn_code.description() == "sq (line 2, column 5)"
+
+
+def test_Top_level_statements_know_where_they_are():
+    [_, code] = compiled("x=3\n  f(x)")
+    assert code.description() == "statement (line 2, column 3)"
@@ -0,0 +1,102 @@
+from graftlib.compile_cell import (
+    CALL,
+    CONST,
+    COUNT_DOWN,
+    JUMP,
+    LOAD,
+    MODIFY,
+    POP,
+    STORE,
+    CallSite,
+)
+from graftlib.compile_v1 import compile_v1
+from graftlib.labeltree import LabelTree
+from graftlib.lex_v1 import lex_v1
+from graftlib.parse_v1 import Symbol, parse_v1
+
+
+# --- Utils ---
+
+
+def compiled(inp):
+    return list(compile_v1(parse_v1(lex_v1(inp))))
+
+
+def ops(inp):
+    [code] = compiled(inp)
+    return code.ops
+
+
+# --- Compiling ---
+
+
+def test_Calling_a_function_discards_its_result():
+    assert ops(":S") == (
+        LOAD, "S", CALL, CallSite(0, Symbol("S"), True), POP, None)
+
+
+def test_Plus_becomes_a_modify():
+    assert (
+        ops("+d") ==
+        (CONST, 10.0, MODIFY, ("+=", "d"), POP, None)
+    )
+
+
+def test_Implicit_multiply_becomes_a_modify():
+    assert (
+        ops("2d") ==
+        (CONST, 2.0, MODIFY, ("*=", "d"), POP, None)
+    )
+
+
+def test_Equals_becomes_a_store():
+    assert ops("-2=d") == (CONST, -2.0, STORE, "d", POP, None)
+
+
+def test_Function_result_can_be_used_as_a_value():
+    assert (
+        ops(":R~+d") ==
+        (
+            LOAD, "R",
+            CALL, CallSite(0, Symbol("R"), False),
+            MODIFY, ("+=", "d"),
+            POP, None,
+        )
+    )
+
+
+def test_Repeated_call_becomes_a_loop():
+    assert (
+        ops("3:S") ==
+        (
+            CONST, 3,
+            COUNT_DOWN, 12,
+            LOAD, "S",
+            CALL, CallSite(0, Symbol("S"), True),
+            POP, None,
+            JUMP, 2,
+        )
+    )
+
+
+def test_Function_bodies_are_inlined():
+    assert (
+        ops(":{:S+d}") ==
+        (
+            LOAD, "S",
+            CALL, CallSite(0, Symbol("S"), True),
+            POP, None,
+            CONST, 10.0,
+            MODIFY, ("+=", "d"),
+            POP, None,
+        )
+    )
+
+
+def test_Symbols_and_numbers_on_their_own_do_nothing():
+    assert ops("s") == ()
+    assert ops("3") == ()
+
+
+def test_Top_level_labels_are_left_for_the_running_program():
+    assert compiled("+d^:S")[1] == LabelTree()
@@ -0,0 +1,93 @@
+from graftlib.compile_cell import compile_cell
+from graftlib.cycles import CycleDetector
+from graftlib.eval_cell import eval_cell
+from graftlib.graftrun import MultipleRunningPrograms, graftrun
+from graftlib.lex_cell import lex_cell
+from graftlib.parse_cell import parse_cell
+from graftlib.randomstream import RandomStream
+from graftlib.round_ import round_stroke
+
+
+def compiled(program):
+    return list(compile_cell(parse_cell(lex_cell(program))))
+
+
+def run(program, n, detect_cycles):
+    return [
+        [round_stroke(stroke) for stroke in frame]
+        for frame in graftrun(
+            compiled(program), n, None, 10, eval_cell,
+            detect_cycles=detect_cycles)
+    ]
+
+
+def frames_until_replaying(program, max_frames=1000):
+    progs = MultipleRunningPrograms(
+        compiled(program),
+        RandomStream(1),
+        10,
+        eval_cell,
+        detect_cycles=True,
+    )
+    for i in range(max_frames):
+        if progs.replaying():
+            return i
+        progs.next()
+    return None
+
+
+def test_Replaying_a_circle_draws_the_same_as_running_it():
+    assert frames_until_replaying("d+=10 S()") is not None
+    assert run("d+=10 S()", 200, True) == run("d+=10 S()", 200, False)
+
+
+def test_Cycles_are_found_inside_paused_loops():
+    program = "x=0 y=0 d=0 ^ T(4,{d+=90 S()})"
+    assert frames_until_replaying(program) is not None
+    assert run(program, 50, True) == run(program, 50, False)
+
+
+def test_Programs_using_random_numbers_are_not_checked():
+    assert not CycleDetector(compiled("d+=R() S()")).enabled
+    assert frames_until_replaying("d+=R() S()", 100) is None
+
+
+def test_Direction_is_only_an_angle_if_nothing_reads_it():
+    assert "d" in CycleDetector(compiled("d+=10 S()"))._drawing_only
+    assert "d" not in CycleDetector(compiled("d+=10 S() s=d"))._drawing_only
+    assert "d" not in CycleDetector(compiled("d*=2 S()"))._drawing_only
+
+
+def test_Position_is_not_rounded_if_forks_can_see_it():
+    assert "x" in CycleDetector(compiled("d+=10 S()"))._drawing_only
+    assert "x" not in CycleDetector(
+        compiled("d+=10 S() n=Nearest()"))._drawing_only
+
+
+def test_Tiny_changes_to_variables_are_not_treated_as_repeating():
+    # a changes by much less than we round positions by, but d magnifies
+    # it, so the program never repeats.
+    program = (
+        "a=0 ^ a+=0.00000001 d=a*1000000000 S() " +
+        "d=0 x=0 y=0 xprev=0 yprev=0"
+    )
+    assert frames_until_replaying(program, 100) is None
+    assert run(program, 40, True) == run(program, 40, False)
+
+
+def test_Programs_that_fork_are_replayed():
+    for program in ("F() d=f*180 ^ d+=10 S()", "T(3,F) d=30*f ^ d+=10 S()"):
+        assert frames_until_replaying(program) is not None
+        assert run(program, 200, True) == run(program, 200, False)
+
+
+def test_Programs_that_never_repeat_are_not_replayed():
+    # d keeps growing, and s can see it
+    assert frames_until_replaying("d+=10 s=d/10 S()", 200) is None
+
+
+def test_We_give_up_after_max_frames():
+    detector = CycleDetector(compiled("s+=1 S()"), max_frames=10)
+    for _ in range(10):
+        detector.record([None])
+    assert not detector.enabled
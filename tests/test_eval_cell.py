@@ -2,15 +2,21 @@ import itertools
 
 from typing import Iterable, List, Optional, Tuple, Union
 
+from graftlib.compile_cell import compile_cell
 from graftlib.dot import Dot
 from graftlib.env import Env
-from graftlib.graftrun import graftrun, graftrun_debug
+from graftlib.graftrun import (
+    MultipleRunningPrograms,
+    graftrun,
+    graftrun_debug,
+)
 from graftlib.eval_cell import eval_cell
 from graftlib.lex_cell import lex_cell
 from graftlib.line import Line
 from graftlib.make_graft_env import make_graft_env
 from graftlib.numbervalue import NumberValue
 from graftlib.pt import Pt
+from graftlib.randomstream import RandomStream
 from graftlib.parse_cell import parse_cell
 from graftlib.round_ import round_float, round_stroke
 
@@ -729,3 +735,108 @@ def test_For_myrange():
             [Dot(Pt(40.0, 0.0))],
         ]
     )
+
+
+def test_precompiled_program_gives_the_same_strokes():
+    program = "dd=0 ^ T(3,F) d=30*f d+=dd T(2,S) dd+=1"
+    assert (
+        list(
+            round_strokes(
+                graftrun(
+                    compile_cell(parse_cell(lex_cell(program))),
+                    10,
+                    None,
+                    10,
+                    eval_cell,
+                )
+            )
+        ) ==
+        do_eval(program, 10)
+    )
+
+
+def test_Forks_draw_from_their_own_random_streams():
+    # The first fork (f=0) uses up a random number in the second program,
+    # but this doesn't change the numbers the second fork (f=1) gets.
+    plain = do_eval("F() d=R()*9 S()", n=1, rand=RandomStream(2))
+    extra = do_eval(
+        "F() T(1-f,{R()}) d=R()*9 S()", n=1, rand=RandomStream(2))
+    assert extra[0][0] != plain[0][0]
+    assert extra[0][1] == plain[0][1]
+
+
+def test_Strokes_come_out_of_long_loops_one_at_a_time():
+    # If we ran the whole statement before drawing anything, this would
+    # take forever.
+    assert do_eval("T(1000000000,{S()})", n=3) == [
+        [Line(Pt(0, 0), Pt(0, 10))],
+        [Line(Pt(0, 10), Pt(0, 20))],
+        [Line(Pt(0, 20), Pt(0, 30))],
+    ]
+
+
+def test_Forks_take_turns_inside_loops_without_queueing_strokes():
+    progs = MultipleRunningPrograms(
+        list(parse_cell(lex_cell("F() T(100,{S()})"))), None, 10, eval_cell)
+    for _ in range(5):
+        progs.next()
+    assert len(progs.programs) == 2
+    assert all(len(queue) == 0 for _, queue in progs.programs)
+    assert all(prog.execution is not None for prog, _ in progs.programs)
+
+
+def test_Paused_statements_carry_on_into_the_next_statement():
+    # After the last stroke of "T(2,S)", the rest of that statement and
+    # the whole of "d+=90" happen together, so no frame is blank.
+    assert do_eval("T(2,S) d+=90", n=4) == [
+        [Line(Pt(0, 0), Pt(0, 10))],
+        [Line(Pt(0, 10), Pt(0, 20))],
+        [Line(Pt(0, 20), Pt(10, 20))],
+        [Line(Pt(10, 20), Pt(20, 20))],
+    ]
+
+
+def test_Line_to_after_stepping_inside_a_function_starts_where_it_was():
+    assert do_eval("Q={S()} Q() Q() L()", n=3) == [
+        [Line(Pt(0, 0), Pt(0, 10))],
+        [Line(Pt(0, 10), Pt(0, 20))],
+        [Line(Pt(0, 10), Pt(0, 20))],
+    ]
+
+
+def test_Function_parameters_hide_the_fork_s_own_variables():
+    assert do_eval("P={:(s) S()} P(5) S()", n=2) == [
+        [Line(Pt(0, 0), Pt(0, 5))],
+        [Line(Pt(0, 5), Pt(0, 15))],
+    ]
+
+
+def test_Forks_can_find_where_the_other_forks_are():
+    assert do_eval(
+        "F() x=f*30 D() " +
+        "n=Nearest() x=Get(n,0)+1 D() " +
+        "c=Centre() x=Get(c,0) D() " +
+        "x=Len(Within(25)) D()",
+        n=4
+    ) == [
+        [Dot(Pt(0, 0)), Dot(Pt(30, 0))],
+        [Dot(Pt(31, 0)), Dot(Pt(1, 0))],
+        [Dot(Pt(16, 0)), Dot(Pt(16, 0))],
+        [Dot(Pt(1, 0)), Dot(Pt(1, 0))],
+    ]
+
+
+def test_A_fork_on_its_own_is_nearest_nothing():
+    assert do_eval("x=Len(Nearest())+Len(Within(99)) D()", n=1) == [
+        [Dot(Pt(0, 0))],
+    ]
+
+
+def test_Forks_whose_position_variables_are_not_numbers_still_run():
+    assert do_eval("f={:(n) n*2} s=f(5) S()", n=1) == [
+        [Line(Pt(0, 0), Pt(0, 10))],
+    ]
+    # A fork whose f is not a number is not counted
+    assert do_eval("F() x=f*30 f=If(f,{f},{Sin}) n=Nearest() D()", n=1) == [
+        [Dot(Pt(0, 0)), Dot(Pt(30, 0))],
+    ]
@@ -1,17 +1,22 @@
+import gc
+import weakref
+
 import pytest
+from graftlib.compile_cell import compile_statement
 from graftlib.env import Env
 from graftlib.eval_cell import (
     ArrayValue,
     NativeFunctionValue,
     NoneValue,
     NumberValue,
-    StringValue,
     eval_cell,
     eval_cell_list,
 )
 from graftlib.lex_cell import lex_cell
+from graftlib.numberarray import NumberArray
 from graftlib.parse_cell import FunctionCallTree, parse_cell
 from graftlib.programenv import ProgramEnv
+from graftlib.stringvalue import StringValue
 from graftlib import make_graft_env
 
 
@@ -24,6 +29,11 @@ def make_env():
     return ret
 
 
+def parse_one(inp):
+    [tree] = parse_cell(lex_cell(inp))
+    return tree
+
+
 def evald(inp, env=None):
     if env is None:
         env = make_env()
@@ -173,6 +183,55 @@ def test_A_symbol_within_a_function_has_the_local_value():
     )
 
 
+def test_Each_call_has_its_own_arguments():
+    assert (
+        evald(
+            """
+            make={:(n) {n}}
+            three=make(3)
+            four=make(4)
+            three()
+            """
+        ) ==
+        NumberValue(3)
+    )
+
+
+def test_Variables_first_set_inside_a_call_stay_inside_it():
+    assert evald("f={foo=5 foo} f()") == NumberValue(5)
+    assert evald("f={foo=5 foo} f() foo") == NumberValue(0)
+
+
+def test_Calling_different_functions_from_one_place_calls_each():
+    assert (
+        evald("For([{:(a) a},{:(a) a*2},Sqrt],{:(g) g(9)})") ==
+        ArrayValue([NumberValue(9), NumberValue(18), NumberValue(3)])
+    )
+
+
+def test_Calling_with_the_wrong_arguments_from_a_used_place_fails():
+    assert_prog_fails(
+        "For([{:(a) a},{2}],{:(g) g(9)})",
+        "1 arguments passed to function SymbolTree.value='g'.*" +
+        "requires 0 arguments."
+    )
+
+
+def test_Calling_a_closure_does_not_keep_it_alive():
+    kept = []
+
+    def keep(_env):
+        ret = ArrayValue([])
+        kept.append(weakref.ref(ret))
+        return ret
+
+    env = make_env()
+    env.set("Keep", NativeFunctionValue(keep))
+    evald("call={:(g) g()} make={k=Keep() {k}} call(make()) 0", env)
+    gc.collect()
+    assert kept[0]() is None
+
+
 def test_Native_function_gets_called():
     def native_fn(_env, x, y):
         return NumberValue(x.value + y.value)
@@ -426,3 +485,165 @@ def test_Maths_functions_give_correct_answers():
     assert r(evald("Sqrt(16)")) == evald("4")
     assert r(evald("Pow(2,3)")) == evald("8")
     assert r(evald("Hypot(3,4)")) == evald("5")
+
+
+def test_Range_is_an_array():
+    assert evald("Len(Range(4))") == NumberValue(4)
+    assert evald("Get(Range(4),2)") == NumberValue(2)
+    assert evald("Range(2.5)") == evald("[0,1,2]")
+    assert evald("Range(-1)") == evald("[]")
+
+
+def test_Adding_to_a_Range_makes_a_normal_array():
+    assert evald("Add(Range(2),7)") == evald("[0,1,7]")
+
+
+def test_Range_does_not_disturb_variables_called_i():
+    assert evald("i=7 For(Range(3),{:(j)j}) i") == NumberValue(7)
+
+
+def test_For_whose_result_is_unused_gives_none():
+    assert evald("{For([1,2],{:(i)i}) 3}()") == NumberValue(3)
+    code = compile_statement(parse_one("For([1],{:(i)i})"))
+    assert eval_cell(make_env(), code) == NoneValue()
+
+
+def test_For_whose_result_is_unused_still_runs_the_body():
+    assert evald("n=0 {For(Range(5),{:(i)n+=i}) 0}() n") == NumberValue(10)
+    assert (
+        evald("n=0 {For(Range(3),{:(i)n+=i}) For([4],{:(i)n+=i})}()") ==
+        evald("[7]")
+    )
+
+
+def test_For_over_a_native_function_calls_it_until_endofloop():
+    def countdown():
+        nums = [NumberValue(2), NumberValue(1)]
+        return NativeFunctionValue(
+            lambda _env: nums.pop(0) if nums else evald("endofloop"))
+    env = make_env()
+    env.set("countdown", countdown())
+    assert evald("For(countdown,{:(i)i*10})", env) == evald("[20,10]")
+
+
+def test_For_can_be_nested():
+    assert (
+        evald("For([1,2],{:(i) For([10,20],{:(j) i*j})})") ==
+        evald("[[10,20],[20,40]]")
+    )
+
+
+def test_T_returns_the_last_value():
+    assert evald("n=0 T(3,{n+=1})") == NumberValue(3)
+
+
+def test_T_with_zero_repetitions_does_nothing():
+    assert evald("n=0 T(0,{n+=1}) n") == NumberValue(0)
+
+
+def test_If_only_calls_the_chosen_function():
+    assert evald("n=0 If(1,{n+=1},{n+=100}) n") == NumberValue(1)
+    assert evald("n=0 If(0,{n+=1},{n+=100}) n") == NumberValue(100)
+
+
+def test_Wrong_number_of_arguments_to_a_loop_is_an_error():
+    assert_prog_fails(
+        "T(3)",
+        (
+            r"1 arguments passed to function SymbolTree\(value='T'\), " +
+            "but it requires 2 arguments."
+        ),
+    )
+    assert_prog_fails(
+        "For([1],{})",
+        "1 arguments passed to function given to For, " +
+        "but it requires 0 arguments."
+    )
+
+
+def test_For_over_something_else_is_an_error():
+    assert_prog_fails("For(3,{})", "Unexpected first argument to For")
+
+
+def test_Unboxed_native_function_gets_plain_numbers():
+    def native_fn(_env, x, y):
+        assert type(x) == float
+        return x + y
+    env = make_env()
+    env.set("native_fn", NativeFunctionValue(native_fn, unboxed=True))
+    assert evald("native_fn(2,8)", env) == NumberValue(10)
+
+
+def test_Values_stored_in_env_and_arrays_are_number_values():
+    env = make_env()
+    evald("x=3+4 y=[x*2]", env)
+    assert env.get("x") == NumberValue(7)
+    assert env.get("y") == ArrayValue([NumberValue(14)])
+
+
+def test_Tail_calls_do_not_grow_the_frame_stack():
+    frames = []
+
+    def depth(env):
+        frames.append(len(ex.frames))
+
+    env = make_env()
+    env.set("depth", NativeFunctionValue(depth, draws=True))
+    evald("f={:(n) If(n<1,{depth()},{f(n-1)})}", env)
+    ex = eval_cell(env, parse_one("f(1000)"), pause=True)
+    ex.resume(pause=True)
+    assert frames == [1]
+
+
+def test_Deep_tail_recursion_and_ordinary_recursion_both_work():
+    env = make_env()
+    evald(
+        "sum={:(n,tot) If(n<1,{tot},{sum(n-1,tot+n)})} " +
+        "fact={:(n) If(n<2,{1},{n*fact(n-1)})}",
+        env
+    )
+    assert evald("sum(20000,0)", env) == NumberValue(200010000)
+    assert evald("fact(10)", env) == NumberValue(3628800)
+
+
+def test_Arithmetic_on_arrays_works_on_each_number():
+    assert evald("[1,2,3]*2") == evald("[2,4,6]")
+    assert evald("10-[1,2]") == evald("[9,8]")
+    assert evald("[1,2]+[10,20]") == evald("[11,22]")
+    assert evald("-Range(3)/2") == evald("[0,-0.5,-1]")
+    assert evald("a=[1,2] a*=3 a") == evald("[3,6]")
+    assert type(evald("[1,2]*2").value) == NumberArray
+
+
+def test_Arithmetic_on_arrays_of_different_lengths_is_an_error():
+    assert_prog_fails("[1,2]+[1,2,3]", "same length")
+    assert_prog_fails("[1,'a']*2", "array of numbers")
+
+
+def test_Maths_functions_work_on_each_number_in_an_array():
+    def r(arr):
+        return [round(n.value) for n in arr.value]
+    assert r(evald("Sin([0,90,30])*2")) == [0, 2, 1]
+    assert r(evald("Sqrt(Range(3)*Range(3))")) == [0, 1, 2]
+    assert r(evald("Hypot([3,5],4)")) == [5, 6]
+    assert r(evald("Hypot([3,5],[4,12])")) == [5, 13]
+    assert r(evald("ATan2(1,[1,0])")) == [45, 90]
+
+
+def test_Number_arrays_work_with_the_array_functions():
+    env = make_env()
+    evald("a=Range(3)+1", env)
+    assert evald("Get(a,1)", env) == NumberValue(2)
+    assert evald("Len(a)", env) == NumberValue(3)
+    assert evald("For(a,{:(n) n*10})", env) == evald("[10,20,30]")
+    assert evald("Add(a,7)", env) == evald("[1,2,3,7]")
+    assert type(env.get("a").value) == NumberArray
+    assert evald("Add(a,'x')", env) == evald("[1,2,3,7,'x']")
+
+
+def test_Sum_Min_and_Max_reduce_arrays_of_numbers():
+    assert evald("Sum(Range(5)*2)") == NumberValue(20)
+    assert evald("Sum([])") == NumberValue(0)
+    assert evald("Min([3,-1,2])") == NumberValue(-1)
+    assert evald("Max(Range(4))") == NumberValue(3)
+    assert_prog_fails("Max([])", "Max of an empty array")
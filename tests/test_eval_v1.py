@@ -2,8 +2,10 @@ import itertools
 
 from typing import Iterable, List, Optional, Tuple, Union
 
+from graftlib.compile_v1 import compile_v1
 from graftlib.dot import Dot
 from graftlib.env import Env
+from graftlib.eval_cell import eval_cell
 from graftlib.graftrun import (
     graftrun,
     graftrun_debug,
@@ -507,3 +509,21 @@ def test_strokes_inside_functions_work():
         do_eval(":{:S}", n=1) ==
         [[Line(Pt(0.0, 0.0), Pt(0.0, 10.0))]]
     )
+
+
+def test_precompiled_program_gives_the_same_strokes():
+    program = "3:{:S90+d}20:F^:S+d"
+    assert (
+        list(
+            round_strokes(
+                graftrun(
+                    compile_v1(parse_v1(lex_v1(program))),
+                    10,
+                    None,
+                    10,
+                    eval_cell,
+                )
+            )
+        ) ==
+        do_eval(program, 10)
+    )
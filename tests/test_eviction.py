@@ -0,0 +1,114 @@
+from collections import deque
+
+import attr
+
+from graftlib.compile_cell import compile_cell
+from graftlib.dot import Dot
+from graftlib.eval_cell import eval_cell
+from graftlib.eviction import (
+    DropIdle,
+    DropOffscreen,
+    DropOldest,
+    DropRepeating,
+)
+from graftlib.graftrun import MultipleRunningPrograms
+from graftlib.lex_cell import lex_cell
+from graftlib.line import Line
+from graftlib.parse_cell import parse_cell
+from graftlib.pt import Pt
+from graftlib.randomstream import RandomStream
+
+
+@attr.s
+class FakeProgram:
+    fork_id: int = attr.ib()
+
+
+def forks(*fork_ids):
+    return deque((FakeProgram(fork_id), deque()) for fork_id in fork_ids)
+
+
+def fork_ids(programs):
+    return [prog.fork_id for prog, _ in programs]
+
+
+def line(x1, y1, x2, y2):
+    return Line(Pt(x1, y1), Pt(x2, y2))
+
+
+def test_DropOldest_stops_the_first_forks():
+    policy = DropOldest()
+    programs = forks(0, 1, 2, 3)
+    policy.observe(programs, [None, None, None, None])
+    assert fork_ids(policy.evict(programs, 2)) == [2, 3]
+
+
+def test_DropIdle_stops_forks_that_stopped_drawing_first():
+    policy = DropIdle(idle_frames=2)
+    programs = forks(0, 1, 2, 3)
+    for _ in range(3):
+        policy.observe(
+            programs, [line(0, 0, 1, 1), None, line(0, 0, 1, 1), None])
+    assert fork_ids(policy.evict(programs, 2)) == [0, 2]
+
+
+def test_DropIdle_falls_back_to_the_oldest_forks():
+    policy = DropIdle(idle_frames=2)
+    programs = forks(0, 1, 2, 3)
+    for _ in range(3):
+        policy.observe(
+            programs, [line(0, 0, 1, 1), None, line(0, 0, 1, 1), None])
+    assert fork_ids(policy.evict(programs, 3)) == [2]
+
+
+def test_DropIdle_does_not_stop_new_forks_that_have_not_drawn_yet():
+    policy = DropIdle(idle_frames=2)
+    programs = forks(0)
+    for _ in range(3):
+        policy.observe(programs, [None])
+    programs.extend(forks(1))
+    policy.observe(programs, [None, None])
+    assert fork_ids(policy.evict(programs, 1)) == [1]
+
+
+def test_DropRepeating_stops_forks_that_draw_over_old_lines():
+    policy = DropRepeating(idle_frames=2)
+    programs = forks(0, 1)
+    for i in range(3):
+        policy.observe(programs, [line(0, 0, 1, 1), line(i, 0, i + 1, 0)])
+    assert fork_ids(policy.evict(programs, 1)) == [1]
+
+
+def test_DropRepeating_only_remembers_the_latest_strokes():
+    policy = DropRepeating(idle_frames=2, max_strokes=3)
+    programs = forks(0, 1)
+    for i in range(6):
+        # Fork 0 goes round 3 lines, but by the time it draws each one
+        # again, it has been forgotten.
+        policy.observe(
+            programs, [line(i % 3, 0, i % 3 + 1, 0), line(0, 5, 1, 5)])
+    assert len(policy._seen) == 3
+    assert fork_ids(policy.evict(programs, 1)) == [0]
+
+
+def test_DropOffscreen_stops_forks_outside_the_first_frames():
+    policy = DropOffscreen(lookahead_steps=2)
+    programs = forks(0, 1, 2)
+    policy.observe(programs, [line(0, 0, 10, 10), Dot(Pt(-10, -10)), None])
+    policy.observe(programs, [None, None, None])
+    policy.observe(
+        programs, [line(0, 0, 50, 0), Dot(Pt(5, 5)), line(0, 0, 1, 1)])
+    assert fork_ids(policy.evict(programs, 1)) == [1, 2]
+
+
+def test_Forks_are_evicted_by_the_chosen_policy():
+    # The first fork goes on drawing and making new forks that draw
+    # nothing, so DropIdle keeps it, where DropOldest would stop it.
+    program = list(compile_cell(parse_cell(lex_cell(
+        "^ If(f<1,{F() d+=10 S()},{})"))))
+    progs = MultipleRunningPrograms(
+        program, RandomStream(1), 4, eval_cell, eviction=DropIdle(2))
+    for _ in range(30):
+        progs.next()
+    assert fork_ids(progs.programs) == [0, 27, 28, 29]
+    assert all(type(queue) == deque for _, queue in progs.programs)
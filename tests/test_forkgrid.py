@@ -0,0 +1,102 @@
+import random
+
+from graftlib.arrayvalue import ArrayValue
+from graftlib.forkgrid import ForkGrid, ForkPositions
+from graftlib.numbervalue import NumberValue
+from graftlib.stringvalue import StringValue
+from graftlib.turtlestate import TurtleState
+
+
+def brute_force_nearest(positions, x, y, exclude):
+    others = [p for p in positions if p[0] != exclude]
+    if not others:
+        return None
+    return min(others, key=lambda p: (p[1] - x) ** 2 + (p[2] - y) ** 2)
+
+
+def random_positions(rand, num):
+    return [
+        (i, rand.uniform(-100, 100), rand.uniform(-50, 50))
+        for i in range(num)
+    ]
+
+
+def test_Nearest_fork_is_the_same_as_looking_at_every_fork():
+    rand = random.Random(4)
+    for num in (1, 2, 10, 200):
+        positions = random_positions(rand, num)
+        grid = ForkGrid(positions)
+        for _ in range(50):
+            x = rand.uniform(-150, 150)
+            y = rand.uniform(-150, 150)
+            exclude = rand.randrange(num)
+            assert (
+                grid.nearest(x, y, exclude) ==
+                brute_force_nearest(positions, x, y, exclude)
+            )
+
+
+def test_Forks_within_a_radius_are_the_same_as_looking_at_every_fork():
+    rand = random.Random(5)
+    positions = random_positions(rand, 200)
+    grid = ForkGrid(positions)
+    for radius in (0, 5, 30, 500):
+        x, y = rand.uniform(-100, 100), rand.uniform(-50, 50)
+        assert grid.within(x, y, radius, 3) == [
+            p for p in positions
+            if p[0] != 3 and (p[1] - x) ** 2 + (p[2] - y) ** 2 <= radius ** 2
+        ]
+
+
+def test_Forks_all_in_the_same_place_are_found():
+    grid = ForkGrid([(0, 5, 5), (1, 5, 5), (2, 5, 5)])
+    assert grid.nearest(0, 0, 0) == (1, 5, 5)
+    assert grid.within(5, 5, 0, 2) == [(0, 5, 5), (1, 5, 5)]
+    assert grid.centre() == (5, 5)
+
+
+def test_No_forks_means_nothing_is_found():
+    grid = ForkGrid([])
+    assert grid.nearest(0, 0, 0) is None
+    assert grid.within(0, 0, 10, 0) == []
+    assert grid.centre() is None
+
+
+class FakeEnv:
+    def __init__(self, turtle):
+        self._turtle = turtle
+
+    def turtle(self):
+        return self._turtle
+
+
+class FakeProgram:
+    def __init__(self, f, x, y):
+        turtle = TurtleState()
+        turtle.f = f
+        turtle.x = x
+        turtle.y = y
+        self.env = FakeEnv(turtle)
+
+
+def test_Positions_are_only_found_when_asked_for():
+    forks = ForkPositions()
+    prog = FakeProgram(NumberValue(0), NumberValue(1), NumberValue(2))
+    forks.update([(prog, None)])
+    prog.env.turtle().x = NumberValue(5)
+    grid = forks.grid()
+    assert grid.positions == [(0, 5, 2)]
+    prog.env.turtle().x = NumberValue(7)
+    assert forks.grid() is grid
+    forks.update([(prog, None)])
+    assert forks.grid().centre() == (7, 2)
+
+
+def test_Forks_whose_position_is_not_numbers_are_left_out():
+    forks = ForkPositions()
+    forks.update([
+        (FakeProgram(NumberValue(0), NumberValue(1), NumberValue(2)), None),
+        (FakeProgram(StringValue("a"), NumberValue(1), NumberValue(2)), None),
+        (FakeProgram(NumberValue(2), ArrayValue([]), NumberValue(2)), None),
+    ])
+    assert forks.grid().positions == [(0, 1, 2)]
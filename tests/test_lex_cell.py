@@ -18,6 +18,7 @@ from graftlib.lex_cell import (
     StringToken,
     SymbolToken,
 )
+from graftlib.sourcepos import SourcePos
 
 # --- Utils ---
 
@@ -248,3 +249,24 @@ def test_Square_brackets_produce_array_tokens():
             EndArrayToken(),
         ]
     )
+
+
+def test_Tokens_know_where_they_came_from():
+    assert (
+        [tok.pos for tok in lexed("x=3\n  f({})")] ==
+        [
+            SourcePos(1, 1),
+            SourcePos(1, 2),
+            SourcePos(1, 3),
+            SourcePos(1, 4),
+            SourcePos(2, 3),
+            SourcePos(2, 4),
+            SourcePos(2, 5),
+            SourcePos(2, 6),
+            SourcePos(2, 7),
+        ]
+    )
+
+
+def test_Positions_do_not_affect_equality():
+    assert SymbolToken("x", SourcePos(1, 1)) == SymbolToken("x")
@@ -0,0 +1,114 @@
+from graftlib.eval_cell import NumberValue, eval_cell
+from graftlib.lex_cell import lex_cell
+from graftlib.make_graft_env import make_graft_env
+from graftlib.memo import Memo
+from graftlib.parse_cell import parse_cell
+from graftlib.programenv import ProgramEnv
+from graftlib.randomstream import RandomStream
+
+
+def evald(inp, memo, env=None):
+    if env is None:
+        env = ProgramEnv(
+            make_graft_env(), RandomStream(3), None, eval_cell)
+    ret = None
+    for expr in parse_cell(lex_cell(inp)):
+        ret = eval_cell(env, expr, memo=memo)
+    return ret
+
+
+fib = "fib={:(n) If(n<2,{n},{fib(n-1)+fib(n-2)})} "
+
+
+def test_Pure_recursive_function_results_are_remembered():
+    memo = Memo()
+    env = ProgramEnv(make_graft_env(), RandomStream(3), None, eval_cell)
+    assert evald(fib + "fib(20)", memo, env) == NumberValue(6765)
+    assert memo.misses == 21
+    assert memo.hits == 18
+    assert evald("fib(20)", memo, env) == NumberValue(6765)
+    assert memo.hits == 19
+
+
+def test_Functions_using_pure_natives_and_helpers_are_remembered():
+    memo = Memo()
+    assert evald(
+        "sq={:(x) x*x} h={:(a) t=Sqrt(sq(a)) t+1} h(-3) h(-3)", memo
+    ) == NumberValue(4)
+    assert memo.hits == 1
+
+
+def test_Functions_that_draw_or_use_the_turtle_are_not_remembered():
+    memo = Memo()
+    evald("f={:(n) d+=n} f(1) f(1) h={:(n) S() n} h(1) h(1)", memo)
+    assert memo.hits == 0
+    assert memo.misses == 0
+
+
+def test_Functions_that_assign_to_outer_variables_are_not_remembered():
+    memo = Memo()
+    assert evald("c=0 f={:(n) c+=1 n} f(1) f(1) c", memo) == NumberValue(2)
+    assert memo.hits == 0
+
+
+def test_Functions_whose_helpers_are_replaced_are_run_again():
+    memo = Memo()
+    assert evald(
+        "sq={:(x) x*x} f={:(a) sq(a)} f(3) sq={:(x) x+x} f(3)", memo
+    ) == NumberValue(6)
+    assert memo.hits == 0
+    assert evald(
+        "sq={:(x) x*x} f={:(a) sq(a)} f(3) sq={:(x) S() x} f(3)", Memo()
+    ) == NumberValue(3)
+    assert evald(
+        "sq={:(x) x*x} g={:(a) sq(a)} f={:(a) g(a)} f(3) " +
+        "sq={:(x) x+x} f(3)",
+        Memo(),
+    ) == NumberValue(6)
+
+
+def test_Functions_that_add_to_arrays_are_not_remembered():
+    memo = Memo()
+    assert evald(
+        "f={:(n) a=[] Add(a,n) Len(a)} f(1) f(1)", memo) == NumberValue(1)
+    assert memo.hits == 0
+    assert memo.misses == 0
+
+
+def test_Purity_is_only_worked_out_again_when_names_change(monkeypatch):
+    checked = []
+    real_pure = Memo._pure
+
+    def pure(self, fn, *args):
+        checked.append(fn)
+        return real_pure(self, fn, *args)
+
+    monkeypatch.setattr(Memo, "_pure", pure)
+    memo = Memo()
+    evald("c=1 f={:(n) c+n} f(1) f(2) f(3) c=2 f(4)", memo)
+    assert len(checked) == 2
+    assert memo.misses == 0
+
+
+def test_Functions_called_with_non_numbers_are_not_remembered():
+    memo = Memo()
+    evald("f={:(a) Len(a)} f([1]) f([1])", memo)
+    assert memo.hits == 0
+
+
+def test_Least_recently_used_results_are_forgotten_first():
+    memo = Memo(max_entries=2)
+    evald("f={:(x) x*2} f(1) f(2) f(1) f(3) f(1) f(2)", memo)
+    assert memo.hits == 2
+    assert memo.misses == 4
+    assert "33% hit rate" in memo.report()
+
+
+def test_Tail_recursive_functions_remember_the_outermost_call():
+    memo = Memo()
+    env = ProgramEnv(make_graft_env(), RandomStream(3), None, eval_cell)
+    evald("sum={:(n,tot) If(n<1,{tot},{sum(n-1,tot+n)})}", memo, env)
+    assert evald("sum(100,0)", memo, env) == NumberValue(5050)
+    assert evald("sum(100,0)", memo, env) == NumberValue(5050)
+    assert memo.hits == 1
+    assert ", 1 remembered" in memo.report()
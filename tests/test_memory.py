@@ -0,0 +1,64 @@
+from graftlib import memory
+from graftlib.arrayvalue import ArrayValue
+from graftlib.env import Env
+from graftlib.numberarray import NumberArray
+from graftlib.numberrange import NumberRange
+from graftlib.numbervalue import NumberValue
+from graftlib.stringvalue import StringValue
+
+
+def test_Arrays_count_their_items():
+    assert (
+        memory.approx_bytes([ArrayValue([NumberValue(1), NumberValue(2)])]) ==
+        memory.array_bytes + 2 * (memory.slot_bytes + memory.number_bytes)
+    )
+
+
+def test_Ranges_are_small_until_they_are_turned_into_lists():
+    assert (
+        memory.approx_bytes([ArrayValue(NumberRange(1000000))]) ==
+        memory.array_bytes + memory.number_bytes
+    )
+
+
+def test_Number_arrays_count_packed_numbers():
+    assert (
+        memory.approx_bytes([ArrayValue(NumberArray([1, 2, 3]))]) ==
+        memory.array_bytes + 3 * memory.packed_bytes
+    )
+
+
+def test_Strings_count_their_characters():
+    assert (
+        memory.approx_bytes([StringValue("abc")]) ==
+        memory.string_bytes + 3
+    )
+
+
+def test_Things_referred_to_twice_are_counted_once():
+    arr = ArrayValue([])
+    env = Env()
+    env.set("a", arr)
+    env.set("b", arr)
+    assert (
+        memory.approx_bytes([env, arr]) ==
+        memory.env_bytes + 2 * memory.env_item_bytes + memory.array_bytes
+    )
+
+
+def test_Child_envs_include_their_parents():
+    parent = Env()
+    parent.set("a", NumberValue(1))
+    child = parent.make_child()
+    assert (
+        memory.approx_bytes([child]) ==
+        2 * memory.env_bytes + memory.env_item_bytes + memory.number_bytes
+    )
+
+
+def test_Adding_to_a_range_allocates_the_whole_range():
+    assert (
+        memory.add_to_array(
+            None, [ArrayValue(NumberRange(9)), NumberValue(1)]) ==
+        10 * (memory.slot_bytes + memory.number_bytes)
+    )
@@ -0,0 +1,95 @@
+import json
+
+from graftlib.compile_cell import compile_cell
+from graftlib.eval_cell import eval_cell
+from graftlib.graftrun import graftrun
+from graftlib.lex_cell import lex_cell
+from graftlib.parse_cell import parse_cell
+from graftlib.profiler import Profiler, iterate, stage
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        self.t += 1.0
+        return self.t
+
+
+def run(program, n, max_forks=10):
+    profiler = Profiler(FakeClock())
+    list(
+        graftrun(
+            compile_cell(parse_cell(lex_cell(program))),
+            n,
+            lambda a, b: 0,
+            max_forks,
+            eval_cell,
+            profiler,
+        )
+    )
+    return profiler
+
+
+def test_Nested_stages_do_not_include_each_others_time():
+    profiler = Profiler(FakeClock())
+    with profiler.stage("outer"):      # starts at 1
+        with profiler.stage("inner"):  # 2 to 3
+            pass
+    # outer ends at 4
+    assert profiler.stage_seconds == {"outer": 2.0, "inner": 1.0}
+    assert profiler.stage_calls == {"outer": 1, "inner": 1}
+
+
+def test_Iterating_times_each_item():
+    profiler = Profiler(FakeClock())
+    assert list(profiler.iterate("it", [1, 2])) == [1, 2]
+    assert profiler.stage_calls == {"it": 3}
+
+
+def test_No_profiler_means_no_timing():
+    with stage(None, "x"):
+        pass
+    items = [1, 2]
+    assert iterate(None, "it", items) is items
+
+
+def test_Strokes_in_each_frame_are_counted():
+    profiler = run("S() S() d+=10", 4)
+    assert profiler.frame_strokes == [1, 1, 0, 1, 1]
+
+
+def test_Statements_are_counted_per_fork():
+    profiler = run("F() ^ S()", 2)
+    assert profiler.forks_created == 1
+    assert profiler.fork_statements == {0: 4, 1: 3}
+
+
+def test_Evicted_forks_are_counted():
+    profiler = run("F() ^ F() S()", 4, max_forks=2)
+    assert profiler.forks_created == 9
+    assert profiler.forks_evicted == 8
+
+
+def test_Interpreting_is_timed_once_per_frame():
+    profiler = run("S()", 3)
+    assert profiler.stage_calls == {"interpret": 3}
+
+
+def test_Summary_and_trace_are_json():
+    profiler = run("S()", 2)
+    summary = json.loads(profiler.to_json("json"))
+    assert summary["frames"] == 2
+    assert summary["strokes"] == 2
+    assert summary["stages"]["interpret"]["calls"] == 2
+    trace = json.loads(profiler.to_json("trace"))
+    assert (
+        [(e["name"], e["ph"]) for e in trace["traceEvents"]] ==
+        [
+            ("interpret", "X"),
+            ("interpret", "X"),
+            ("strokes", "C"),
+            ("strokes", "C"),
+        ]
+    )
@@ -0,0 +1,101 @@
+from graftlib.compile_cell import compile_cell
+from graftlib.eval_cell import eval_cell
+from graftlib.lex_cell import lex_cell
+from graftlib.make_graft_env import make_graft_env
+from graftlib.parse_cell import parse_cell
+from graftlib.programenv import ProgramEnv
+from graftlib.programprofiler import ProgramProfiler
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        self.t += 1.0
+        return self.t
+
+
+def profile(program):
+    profiler = ProgramProfiler(FakeClock())
+    eval_expr = profiler.eval_expr(eval_cell)
+    env = make_graft_env()
+    for code in compile_cell(parse_cell(lex_cell(program))):
+        eval_expr(env, code)
+    return profiler
+
+
+def by_description(profiler):
+    return {
+        profiler.codes[key].description(): (
+            profiler.calls[key],
+            profiler.self_seconds[key],
+            profiler.total_seconds[key],
+        )
+        for key in profiler.calls
+    }
+
+
+def test_Statements_and_functions_are_counted_and_timed():
+    profiler = profile("f={:(x) x}\nf(1)")
+    assert by_description(profiler) == {
+        "statement (line 1, column 1)": (1, 1.0, 1.0),
+        "statement (line 2, column 1)": (1, 2.0, 3.0),
+        "f (line 1, column 3)": (1, 1.0, 1.0),
+    }
+
+
+def test_Loops_count_as_part_of_their_caller():
+    profiler = profile("T(2,{})")
+    assert by_description(profiler) == {
+        "statement (line 1, column 1)": (1, 5.0, 7.0),
+        "{...} (line 1, column 5)": (2, 2.0, 2.0),
+    }
+
+
+def test_Recursive_calls_are_only_counted_once_in_total():
+    profiler = profile(
+        "f={:(n) If(n>0,{f(n-1)},{0})}\nf(1)")
+    times = by_description(profiler)
+    calls, _, total = times["f (line 1, column 3)"]
+    assert calls == 2
+    # If the inner call were counted again, f would seem to take longer
+    # than the statement that called it.
+    assert total < times["statement (line 2, column 1)"][2]
+
+
+def test_Frames_are_closed_after_an_error():
+    profiler = ProgramProfiler(FakeClock())
+    eval_expr = profiler.eval_expr(eval_cell)
+    env = make_graft_env()
+    [define, call] = compile_cell(parse_cell(lex_cell("f={:(x) x()}\nf(3)")))
+    eval_expr(env, define)
+    try:
+        eval_expr(env, call)
+    except Exception:
+        pass
+    assert profiler._open == []
+
+
+def test_Report_lists_slowest_first():
+    report = profile("f={:(x) x}\nf(1)").report()
+    lines = report.splitlines()
+    assert lines[0].split() == ["self", "ms", "total", "ms", "calls", "code"]
+    assert lines[1].endswith("statement (line 2, column 1)")
+    assert len(lines) == 4
+
+
+def test_Time_while_a_statement_is_paused_is_not_counted():
+    def run(ticks_while_paused):
+        profiler = ProgramProfiler(FakeClock())
+        eval_expr = profiler.eval_expr(eval_cell)
+        env = ProgramEnv(make_graft_env(), None, None, eval_expr)
+        [code] = compile_cell(parse_cell(lex_cell("T(2,S)")))
+        execution = eval_expr(env, code, pause=True)
+        while not execution.resume():
+            for _ in range(ticks_while_paused):
+                profiler.clock()  # Other forks running
+        assert profiler._open == []
+        return by_description(profiler)
+
+    assert run(100) == run(0)
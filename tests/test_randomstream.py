@@ -0,0 +1,33 @@
+from graftlib.randomstream import RandomStream, split
+
+
+def _take(rand, n):
+    return [rand(-10, 10) for _ in range(n)]
+
+
+def test_Streams_with_the_same_seed_return_the_same_numbers():
+    assert _take(RandomStream(3), 5) == _take(RandomStream(3), 5)
+    assert _take(RandomStream(3), 5) != _take(RandomStream(4), 5)
+
+
+def test_Numbers_are_in_the_range_asked_for():
+    assert all(-10 <= x <= 10 for x in _take(RandomStream(1), 100))
+
+
+def test_Split_streams_do_not_depend_on_each_other():
+    parent1 = RandomStream(7)
+    child1 = parent1.split()
+    _take(parent1, 10)
+    from_child1 = _take(child1, 5)
+
+    parent2 = RandomStream(7)
+    child2 = parent2.split()
+    assert _take(child2, 5) == from_child1
+    assert _take(parent2, 5) != from_child1
+
+
+def test_Splitting_a_plain_function_shares_it():
+    def rand(_a, _b):
+        return 3
+    assert split(rand) is rand
+    assert type(split(RandomStream(1))) == RandomStream
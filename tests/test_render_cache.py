@@ -0,0 +1,73 @@
+import os
+
+from graftbot.render_cache import RenderCache, cache_key
+
+
+def _render(cache, key, size, mtime):
+    tmp_file = cache.tmp_path(key)
+    with open(tmp_file, "w") as f:
+        f.write("x" * size)
+    os.utime(tmp_file, (mtime, mtime))
+    return cache.add(key, tmp_file)
+
+
+def test_Cache_key_depends_on_every_setting():
+    key = cache_key("S()", "cell", 100, 227, 127, 0)
+    assert key == cache_key("S()", "cell", 100, 227, 127, 0)
+    assert key != cache_key("S() ", "cell", 100, 227, 127, 0)
+    assert key != cache_key("S()", "v1", 100, 227, 127, 0)
+    assert key != cache_key("S()", "cell", 101, 227, 127, 0)
+    assert key != cache_key("S()", "cell", 100, 228, 127, 0)
+    assert key != cache_key("S()", "cell", 100, 227, 128, 0)
+    assert key != cache_key("S()", "cell", 100, 227, 127, 1)
+
+
+def test_Added_gifs_can_be_got_again(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    assert cache.get("k") is None
+    path = _render(cache, "k", 10, 1000)
+    assert cache.get("k") == path
+    assert not os.path.exists(cache.tmp_path("k"))
+
+
+def test_Least_recently_used_gifs_are_deleted_when_too_big(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=25)
+    _render(cache, "a", 10, 1000)
+    _render(cache, "b", 10, 2000)
+    cache.set_media_id("a", "m1")
+    cache.get("a")  # a is now the most recently used
+
+    _render(cache, "c", 10, 3000000000)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.media_id("a") == "m1"
+
+
+def test_Pinned_gifs_are_not_deleted(tmp_path):
+    def kept():
+        return sorted(p.stem for p in tmp_path.glob("*.gif"))
+
+    cache = RenderCache(str(tmp_path), max_bytes=25)
+    _render(cache, "a", 10, 1000)
+    cache.pin("a")
+    cache.pin("a")
+    cache.pin("b")
+    _render(cache, "b", 10, 2000)
+    cache.unpin("a")
+    _render(cache, "c", 10, 3000)
+    assert kept() == ["a", "b", "c"]
+
+    cache.unpin("a")
+    cache.unpin("b")
+    _render(cache, "d", 10, 4000)
+    assert kept() == ["c", "d"]
+
+
+def test_Media_ids_are_remembered(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    cache.set_media_id("k", "m1")
+    assert RenderCache(str(tmp_path)).media_id("k") == "m1"
+    cache.set_media_id("k", None)
+    assert RenderCache(str(tmp_path)).media_id("k") is None
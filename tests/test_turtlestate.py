@@ -0,0 +1,35 @@
+from graftlib.numbervalue import NumberValue
+from graftlib.turtlestate import TurtleEnv
+
+
+def test_Graft_variables_have_their_defaults():
+    env = TurtleEnv()
+    assert env.get("s") == NumberValue(10.0)
+    assert env.get("a") == NumberValue(100.0)
+    assert env.turtle.z == NumberValue(5.0)
+
+
+def test_Setting_a_graft_variable_changes_the_turtle_state():
+    env = TurtleEnv()
+    child = env.make_child()
+    child.set("d", NumberValue(90.0))
+    assert env.turtle.d == NumberValue(90.0)
+    assert not child.contains("d")
+
+
+def test_Previous_position_appears_when_it_is_first_set():
+    env = TurtleEnv()
+    assert "xprev" not in env.local_items()
+    assert not env.contains("xprev")
+    env.turtle.xprev = NumberValue(3.0)
+    assert env.local_items()["xprev"] == NumberValue(3.0)
+
+
+def test_Cloned_TurtleEnvs_have_their_own_turtle_state():
+    env = TurtleEnv()
+    env.set("myvar", NumberValue(1.0))
+    clone = env.clone()
+    clone.set("x", NumberValue(7.0))
+    assert env.get("x") == NumberValue(0.0)
+    assert clone.get("x") == NumberValue(7.0)
+    assert clone.get("myvar") == NumberValue(1.0)